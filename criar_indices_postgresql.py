@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Cria os índices usados pelos filtros e pela paginação da API de licitações
+"""
+
+import psycopg2
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Índices trigram (pg_trgm) permitem que ILIKE '%texto%' use index scan
+# em vez de varrer a tabela inteira a cada busca paginada
+INDICES = [
+    ("tenders_title_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_title_trgm ON tenders USING gin (title gin_trgm_ops)"),
+    ("tenders_description_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_description_trgm ON tenders USING gin (description gin_trgm_ops)"),
+    ("tenders_organization_name_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_organization_name_trgm ON tenders USING gin (organization_name gin_trgm_ops)"),
+    ("tenders_municipality_name_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_municipality_name_trgm ON tenders USING gin (municipality_name gin_trgm_ops)"),
+    ("tenders_objeto_trgm",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_objeto_trgm ON tenders USING gin (objeto gin_trgm_ops)"),
+
+    # B-tree para o filtro por estado + ORDER BY
+    ("tenders_state_code_publication_date",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_state_code_publication_date ON tenders (state_code, publication_date DESC)"),
+
+    # B-tree para os agrupamentos de /cities e /states
+    ("tenders_state_code",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_state_code ON tenders (state_code)"),
+    ("tenders_municipality_name",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_municipality_name ON tenders (municipality_name)"),
+
+    # Ordenação da listagem com desempate por id (também serve à paginação por cursor);
+    # mesma expressão de _SORT_DATE em src/routes/tender.py, com as linhas sem data no fim
+    ("tenders_sort_date_id",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_sort_date_id ON tenders "
+     "((COALESCE(publication_date, '-infinity'::date)) DESC, id DESC)"),
+
+    # Unicidade de cadastro: o INSERT ... ON CONFLICT DO NOTHING de /register depende destes índices
+    ("users_username_key",
+     "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_username_key ON users (username)"),
+    ("users_email_key",
+     "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS users_email_key ON users (email)"),
+
+    # Cadastros recentes de usuários ativos (faixas de created_at de /user-stats)
+    ("users_created_at_active",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS users_created_at_active ON users (created_at) WHERE is_active"),
+
+    # Busca full-text no texto extraído dos PDFs (mesma expressão usada em search_in_pdf_content)
+    ("edital_files_extracted_text_fts",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS edital_files_extracted_text_fts ON edital_files "
+     "USING gin (to_tsvector('portuguese', extracted_text))"),
+]
+
+
+def criar_indices():
+    """Cria extensão pg_trgm e índices das tabelas tenders, users e edital_files"""
+
+    print("🔧 Criando índices no PostgreSQL...")
+
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('DB_HOST'),
+            port=os.getenv('DB_PORT', 5432),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            client_encoding='utf8'
+        )
+
+        # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+        conn.autocommit = True
+        cursor = conn.cursor()
+
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        print("✅ Extensão pg_trgm disponível")
+
+        for nome, sql in INDICES:
+            try:
+                cursor.execute(sql)
+                print(f"✅ Índice criado: {nome}")
+            except Exception as e:
+                print(f"❌ Erro ao criar índice {nome}: {e}")
+
+        cursor.execute("ANALYZE tenders")
+        cursor.execute("ANALYZE users")
+        cursor.execute("ANALYZE edital_files")
+
+        cursor.close()
+        conn.close()
+
+        print("🎉 Índices criados!")
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+
+
+if __name__ == "__main__":
+    criar_indices()
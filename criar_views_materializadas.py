@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Cria as views materializadas dos agregados de /cities e /states
+"""
+
+import psycopg2
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Agregados pré-calculados: as rotas leem O(cidades distintas) em vez de agrupar tenders a cada chamada
+VIEWS = [
+    ("mv_cities", """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_cities AS
+        SELECT municipality_name, state_code, municipality_ibge, COUNT(*) AS tender_count
+        FROM tenders
+        WHERE municipality_name IS NOT NULL AND municipality_name <> ''
+        GROUP BY 1, 2, 3
+    """),
+    ("mv_states", """
+        CREATE MATERIALIZED VIEW IF NOT EXISTS mv_states AS
+        SELECT state_code, COUNT(*) AS tender_count
+        FROM tenders
+        WHERE state_code IS NOT NULL AND state_code <> ''
+        GROUP BY 1
+    """),
+]
+
+# REFRESH ... CONCURRENTLY exige um índice único em cada view
+INDICES = [
+    ("mv_cities_unique",
+     "CREATE UNIQUE INDEX IF NOT EXISTS mv_cities_unique ON mv_cities (municipality_name, state_code, municipality_ibge)"),
+    ("mv_states_unique",
+     "CREATE UNIQUE INDEX IF NOT EXISTS mv_states_unique ON mv_states (state_code)"),
+]
+
+
+def atualizar_views(cursor):
+    """Recalcula as views sem bloquear leituras (chamar após gravar em tenders)"""
+    for nome, _ in VIEWS:
+        cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {nome}")
+
+
+def criar_views():
+    """Cria as views materializadas e seus índices únicos"""
+
+    print("🔧 Criando views materializadas no PostgreSQL...")
+
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('DB_HOST'),
+            port=os.getenv('DB_PORT', 5432),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            client_encoding='utf8'
+        )
+
+        conn.autocommit = True
+        cursor = conn.cursor()
+
+        for nome, sql in VIEWS:
+            try:
+                cursor.execute(sql)
+                print(f"✅ View criada: {nome}")
+            except Exception as e:
+                print(f"❌ Erro ao criar view {nome}: {e}")
+
+        for nome, sql in INDICES:
+            try:
+                cursor.execute(sql)
+                print(f"✅ Índice criado: {nome}")
+            except Exception as e:
+                print(f"❌ Erro ao criar índice {nome}: {e}")
+
+        cursor.close()
+        conn.close()
+
+        print("🎉 Views criadas!")
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+
+
+if __name__ == "__main__":
+    criar_views()
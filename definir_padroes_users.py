@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Define os valores padrão das colunas de controle da tabela users
+"""
+
+import psycopg2
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Padrões para INSERTs que omitem estas colunas (o /register as informa explicitamente)
+PADROES = [
+    ("is_active", "true"),
+    ("email_verified", "false"),
+    ("created_at", "now()"),
+    ("updated_at", "now()"),
+]
+
+
+def definir_padroes():
+    """Aplica DEFAULT às colunas is_active, email_verified, created_at e updated_at"""
+
+    print("🔧 Definindo valores padrão da tabela users...")
+
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('DB_HOST'),
+            port=os.getenv('DB_PORT', 5432),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            client_encoding='utf8'
+        )
+
+        conn.autocommit = True
+        cursor = conn.cursor()
+
+        for coluna, padrao in PADROES:
+            try:
+                cursor.execute(f"ALTER TABLE users ALTER COLUMN {coluna} SET DEFAULT {padrao}")
+                print(f"✅ {coluna} DEFAULT {padrao}")
+            except Exception as e:
+                print(f"❌ Erro ao alterar {coluna}: {e}")
+
+        cursor.close()
+        conn.close()
+
+        print("🎉 Padrões definidos!")
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+
+
+if __name__ == "__main__":
+    definir_padroes()
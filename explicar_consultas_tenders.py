@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Mostra o plano de execução (EXPLAIN ANALYZE, BUFFERS) das consultas de /tenders
+com filtros representativos e aponta ordenações que transbordam para o disco
+"""
+
+import psycopg2
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Importa o montador de consultas da própria API para analisar exatamente o SQL servido
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from src.routes.tender import TENDERS_WORK_MEM, _build_filters, _tenders_queries
+
+# (descrição, cidade, estado, palavra-chave)
+CENARIOS = [
+    ("Sem filtros", '', '', ''),
+    ("Estado", '', 'SP', ''),
+    ("Cidade", 'São Paulo', '', ''),
+    ("Palavra-chave", '', '', 'medicamentos'),
+    ("Estado + palavra-chave", '', 'MG', 'obras'),
+]
+
+POR_PAGINA = 10
+
+
+def explicar_consultas():
+    """Executa EXPLAIN ANALYZE para cada cenário e resume o método de ordenação"""
+
+    print("🔍 Analisando consultas de /tenders...")
+
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('DB_HOST'),
+            port=os.getenv('DB_PORT', 5432),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            client_encoding='utf8'
+        )
+        cursor = conn.cursor()
+
+        for descricao, cidade, estado, palavra in CENARIOS:
+            where_clause, params = _build_filters(cidade, estado, palavra)
+            list_query, _ = _tenders_queries(where_clause)
+
+            cursor.execute("SELECT set_config('work_mem', %s, true)", (TENDERS_WORK_MEM,))
+            cursor.execute(
+                "EXPLAIN (ANALYZE, BUFFERS) " + list_query,
+                params + [POR_PAGINA, 0]
+            )
+            plano = [linha[0] for linha in cursor.fetchall()]
+            conn.rollback()
+
+            print(f"\n📋 {descricao}")
+            for linha in plano:
+                print(f"   {linha}")
+
+            if any('external merge' in linha for linha in plano):
+                print("❌ Ordenação em disco: aumente TENDERS_WORK_MEM ou crie um índice para este filtro")
+            else:
+                print("✅ Sem ordenação em disco")
+
+        cursor.close()
+        conn.close()
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+
+
+if __name__ == "__main__":
+    explicar_consultas()
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+Configuração do gunicorn para produção
+"""
+
+import os
+
+# As rotas são I/O-bound (aguardam o PostgreSQL e devolvem JSON). Com workers
+# gevent cada processo atende centenas de requisições simultâneas em green
+# threads; GUNICORN_WORKER_CLASS=gthread volta para workers com threads
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 200))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+
+def post_fork(server, worker):
+    """Faz o psycopg2 ceder ao loop do gevent enquanto espera o banco"""
+    if worker_class == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -9,6 +9,8 @@ import os
 from datetime import datetime
 from dotenv import load_dotenv
 
+from criar_views_materializadas import atualizar_views
+
 load_dotenv()
 
 
@@ -141,6 +143,15 @@ def importar_dados_completos(json_file):
                 continue
 
         conn.commit()
+
+        # Recalcular os agregados de /cities e /states
+        try:
+            atualizar_views(cursor)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️ Views materializadas não atualizadas: {e}")
+
         conn.close()
 
         print(f"\\n🎉 Importação concluída!")
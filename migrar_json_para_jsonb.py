@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Converte as colunas JSON gravadas como TEXT (tenders e edital_files) para jsonb
+"""
+
+import psycopg2
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Textos vazios viram NULL; a API trata NULL como lista vazia (ou sem dados semânticos)
+COLUNAS_JSON = [
+    ('tenders', 'items_json'),
+    ('tenders', 'downloaded_files_json'),
+    ('edital_files', 'semantic_data'),
+]
+
+# Colunas jsonb novas (os dados extraídos dos PDFs deixam de ser anexados a editais.description)
+COLUNAS_NOVAS = [
+    ('editais', 'extracted_data'),
+]
+
+# jsonb_path_ops permite consultar os itens direto no servidor (ex.: items_json @> '[{...}]')
+INDICES_JSONB = [
+    ("tenders_items_json_gin",
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS tenders_items_json_gin ON tenders USING gin (items_json jsonb_path_ops)"),
+]
+
+
+def migrar_para_jsonb():
+    """Altera o tipo das colunas JSON, cria as colunas jsonb novas e o índice GIN dos itens"""
+
+    print("🔄 Migrando colunas JSON para jsonb...")
+
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('DB_HOST'),
+            port=os.getenv('DB_PORT', 5432),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            client_encoding='utf8'
+        )
+
+        # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+        conn.autocommit = True
+        cursor = conn.cursor()
+
+        for tabela, coluna in COLUNAS_JSON:
+            cursor.execute(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_name = %s AND column_name = %s",
+                (tabela, coluna)
+            )
+            row = cursor.fetchone()
+            if row and row[0] == 'jsonb':
+                print(f"⏭️  {tabela}.{coluna} já é jsonb")
+                continue
+
+            try:
+                cursor.execute(
+                    f"ALTER TABLE {tabela} ALTER COLUMN {coluna} TYPE jsonb "
+                    f"USING NULLIF({coluna}, '')::jsonb"
+                )
+                print(f"✅ Coluna convertida: {tabela}.{coluna}")
+            except Exception as e:
+                print(f"❌ Erro ao converter {tabela}.{coluna}: {e}")
+
+        for tabela, coluna in COLUNAS_NOVAS:
+            try:
+                cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN IF NOT EXISTS {coluna} jsonb")
+                print(f"✅ Coluna disponível: {tabela}.{coluna}")
+            except Exception as e:
+                print(f"❌ Erro ao criar {tabela}.{coluna}: {e}")
+
+        for nome, sql in INDICES_JSONB:
+            try:
+                cursor.execute(sql)
+                print(f"✅ Índice criado: {nome}")
+            except Exception as e:
+                print(f"❌ Erro ao criar índice {nome}: {e}")
+
+        cursor.execute("ANALYZE tenders")
+        cursor.execute("ANALYZE edital_files")
+
+        cursor.close()
+        conn.close()
+
+        print("🎉 Migração concluída!")
+
+    except Exception as e:
+        print(f"❌ Erro: {e}")
+
+
+if __name__ == "__main__":
+    migrar_para_jsonb()
@@ -15,6 +15,8 @@ import logging
 from pathlib import Path
 from dotenv import load_dotenv
 
+from criar_views_materializadas import atualizar_views
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
@@ -1211,6 +1213,15 @@ class PNCPScraperFinal:
                     continue
 
             conn.commit()
+
+            # Recalcular os agregados de /cities e /states
+            try:
+                atualizar_views(cursor)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.warning(f"⚠️ Views materializadas não atualizadas: {e}")
+
             conn.close()
 
             logger.info(f"✅ Banco atualizado:")
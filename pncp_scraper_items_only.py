@@ -65,17 +65,28 @@ class PNCPScraperItemsOnly:
             ]
         )
 
+        await self.open_page(self.browser)
+
+        logger.info("✅ Navegador iniciado com sucesso")
+
+    async def open_page(self, browser: Browser):
+        """Abre contexto e página próprios num navegador já iniciado (pode ser compartilhado)"""
         # Configurar contexto com downloads
-        context = await self.browser.new_context(
+        self.context = await browser.new_context(
             user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             viewport={'width': 1920, 'height': 1080},
             accept_downloads=True
         )
 
-        self.page = await context.new_page()
+        self.page = await self.context.new_page()
         self.page.set_default_timeout(60000)
 
-        logger.info("✅ Navegador iniciado com sucesso")
+    async def close_page(self):
+        """Fecha só o contexto aberto por open_page (o navegador continua)"""
+        if getattr(self, 'context', None):
+            await self.context.close()
+            self.context = None
+            self.page = None
 
     async def close(self):
         """Fecha o navegador"""
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de conexões PostgreSQL compartilhado pelos blueprints que usam psycopg2 direto
+"""
+
+from flask import g
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import logging
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+# Configuração do PostgreSQL lida do ambiente uma única vez (o .env é
+# carregado por src/main.py antes do import dos blueprints)
+_DB_CONFIG = MappingProxyType({
+    'host': os.getenv('DB_HOST'),
+    'port': int(os.getenv('DB_PORT', 5432)),
+    'dbname': os.getenv('DB_NAME'),
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'client_encoding': 'utf8'
+})
+
+_missing_db_vars = [name for name in ('DB_HOST', 'DB_NAME', 'DB_USER', 'DB_PASSWORD') if not os.getenv(name)]
+if _missing_db_vars:
+    logger.error(f"Variáveis de ambiente do banco ausentes: {', '.join(_missing_db_vars)}")
+
+# Pool de conexões do processo, criado sob demanda na primeira requisição
+DB_POOL_MIN_CONN = int(os.getenv('DB_POOL_MIN_CONN', 5))
+DB_POOL_MAX_CONN = int(os.getenv('DB_POOL_MAX_CONN', 50))
+_pool = None
+_pool_lock = threading.Lock()
+
+# Com o pool cheio, a requisição espera uma conexão ser devolvida (até este tempo, em
+# segundos) em vez de receber PoolError: um worker gevent roda até worker_connections
+# requisições simultâneas, bem mais que DB_POOL_MAX_CONN
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+_pool_slots = None
+
+# Desligar com DB_PREPARED_STATEMENTS=0 atrás de PgBouncer em modo transaction,
+# onde a sessão que recebeu o PREPARE não é garantida no EXECUTE seguinte
+DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', '1') != '0'
+
+class _PooledConnection(psycopg2.extensions.connection):
+    """Conexão do pool que lembra quais statements já foram preparados nela"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+def _get_pool():
+    """Retorna o pool de conexões, criando-o na primeira chamada"""
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Criado na primeira requisição, já no worker: sob gevent o threading está
+                # patcheado e a espera pelo semáforo só suspende a greenlet
+                _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX_CONN)
+                _pool = psycopg2.pool.ThreadedConnectionPool(
+                    DB_POOL_MIN_CONN, DB_POOL_MAX_CONN,
+                    connection_factory=_PooledConnection, **_DB_CONFIG
+                )
+    return _pool
+
+def get_db_connection():
+    """Obtém uma conexão do pool (esperando até DB_POOL_TIMEOUT) e a associa à requisição atual
+
+    Cada requisição guarda em g._db_conns todas as conexões que abriu: blocos db_conn()
+    aninhados recebem conexões distintas e cada uma volta ao pool no seu próprio fim.
+    """
+    try:
+        pool = _get_pool()
+    except Exception as e:
+        logger.error(f"Erro de conexão: {e}")
+        return None
+
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        logger.error(f"Pool de conexões esgotado: nenhuma conexão livre em {DB_POOL_TIMEOUT}s")
+        return None
+    try:
+        conn = pool.getconn()
+    except Exception as e:
+        _pool_slots.release()
+        logger.error(f"Erro de conexão: {e}")
+        return None
+    g.setdefault('_db_conns', []).append(conn)
+    return conn
+
+def put_db_connection(conn):
+    """Devolve a conexão ao pool (chamadas repetidas são ignoradas)"""
+    conns = g.get('_db_conns')
+    if not conns or not any(c is conn for c in conns):
+        return
+    conns[:] = [c for c in conns if c is not conn]
+    try:
+        # Encerrar a transação implícita aberta pelo psycopg2 antes de reutilizar
+        if not conn.closed:
+            conn.rollback()
+            conn.autocommit = False
+        _get_pool().putconn(conn, close=bool(conn.closed))
+    except Exception as e:
+        logger.error(f"Erro ao devolver conexão ao pool: {e}")
+    finally:
+        _pool_slots.release()
+
+@contextmanager
+def db_conn(autocommit=False):
+    """Conexão do pool; volta ao pool (com rollback do que não foi commitado) ao sair do bloco
+
+    autocommit=True é para rotas só de leitura: sem o BEGIN implícito do psycopg2
+    nem o rollback na devolução, cada consulta custa apenas o seu round trip.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise Exception("Erro de conexão com banco")
+
+    try:
+        if autocommit:
+            conn.autocommit = True
+        yield conn
+    finally:
+        put_db_connection(conn)
+
+@contextmanager
+def db_cursor(name=None, cursor_factory=None):
+    """Cursor de uma conexão do pool; cursor e conexão são liberados ao sair do bloco"""
+    with db_conn() as conn:
+        if name:
+            cursor = conn.cursor(name, cursor_factory=cursor_factory)
+        else:
+            cursor = conn.cursor(cursor_factory=cursor_factory)
+        with cursor:
+            yield cursor
+
+def release_request_connection(exc):
+    """Garante a devolução da conexão mesmo em retornos antecipados ou exceções"""
+    for conn in list(g.get('_db_conns') or ()):
+        put_db_connection(conn)
+
+def init_app(app):
+    """Registra a devolução automática da conexão ao fim de cada requisição"""
+    app.teardown_appcontext(release_request_connection)
+
+@lru_cache(maxsize=64)
+def _prepared_sql(query):
+    """PREPARE e EXECUTE equivalentes a uma query com placeholders %s"""
+    parts = query.split('%s')
+    name = f"stmt_{zlib.crc32(query.encode()):08x}"
+    body = ''.join(f"{part}${i}" for i, part in enumerate(parts[:-1], 1)) + parts[-1]
+    placeholders = ', '.join(['%s'] * (len(parts) - 1))
+    execute = f"EXECUTE {name} ({placeholders})" if placeholders else f"EXECUTE {name}"
+    return name, f"PREPARE {name} AS {body}", execute
+
+def execute_prepared(cursor, query, params=()):
+    """Executa a query como prepared statement, preparando-a uma vez por conexão"""
+    conn = cursor.connection
+    if not DB_PREPARED_STATEMENTS or not isinstance(conn, _PooledConnection):
+        cursor.execute(query, params)
+        return
+
+    name, prepare, execute = _prepared_sql(query)
+    if name not in conn.prepared:
+        # PREPARE não é transacional: sobrevive ao rollback feito na devolução ao pool
+        cursor.execute(prepare)
+        conn.prepared.add(name)
+    cursor.execute(execute, params)
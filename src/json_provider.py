@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+Provider JSON baseado em orjson para serialização rápida das respostas
+"""
+
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+# Chaves não-string (ex.: None em agrupamentos do banco) são aceitas como no json da stdlib
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _orjson_default(obj):
+    """Converte tipos que o orjson não serializa nativamente"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Tipo não serializável: {type(obj).__name__}")
+
+
+def dumps_bytes(obj):
+    """Serializa com as mesmas opções das respostas da API, direto em bytes"""
+    return orjson.dumps(obj, default=_orjson_default, option=ORJSON_OPTIONS)
+
+
+def raw_json(text):
+    """Embute um JSON já serializado na resposta, sem decodificar e recodificar"""
+    return orjson.Fragment(text)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Substitui o encoder padrão do Flask (json da stdlib) pelo orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """Entrega os bytes do orjson direto à resposta, sem passar por str"""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
@@ -9,6 +9,10 @@ os.environ['PYTHONUTF8'] = '1'
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+# Carregar .env antes dos blueprints, que leem a configuração do banco no import
+from dotenv import load_dotenv
+load_dotenv()
+
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
@@ -16,10 +20,8 @@ from src.models.tender import Tender, City
 from src.routes.user import user_bp
 from src.routes.mercadopago import mercadopago_bp
 from src.routes.tender import tender_bp
-import os
-from dotenv import load_dotenv
-
-from src.routes.user import user_bp
+from src.json_provider import OrjsonProvider
+from src import db_pool
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +32,16 @@ logging.basicConfig(
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 
+# Serialização JSON com orjson (mais rápido que o json da stdlib)
+app.json = OrjsonProvider(app)
+
+# Atrás de um proxy com suporte a X-Sendfile (Apache, lighttpd), send_file só
+# emite o header e o proxy entrega o arquivo; para nginx ver DOWNLOADS_ACCEL_PREFIX
+app.use_x_sendfile = os.getenv('USE_X_SENDFILE') == '1'
+
+# Conexões do pool psycopg2 devolvidas ao fim de cada requisição
+db_pool.init_app(app)
+
 # Enable CORS for all routes
 CORS(app)
 
@@ -38,8 +50,6 @@ app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(tender_bp, url_prefix='/api')
 app.register_blueprint(mercadopago_bp, url_prefix='/api')
 
-load_dotenv()
-
 # Database configuration com ENCODING FORÇADO
 if os.getenv('DB_HOST'):
     # PostgreSQL na nuvem com UTF-8 FORÇADO
@@ -50,6 +60,9 @@ if os.getenv('DB_HOST'):
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'pool_pre_ping': True,
         'pool_recycle': 300,
+        # INSERTs em lote (executemany) em VALUES de até 1000 linhas; UPDATE/DELETE via execute_batch
+        'executemany_mode': 'values_plus_batch',
+        'insertmanyvalues_page_size': 1000,
         'connect_args': {
             'client_encoding': 'utf8',
             'application_name': 'mvp_licitacoes',
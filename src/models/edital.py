@@ -1,4 +1,5 @@
 from src.models.user import db
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 from decimal import Decimal
 import json
@@ -41,6 +42,9 @@ class Edital(db.Model):
     has_items_tab = db.Column(db.Boolean, default=False)
     has_files_tab = db.Column(db.Boolean, default=False)
     
+    # Dados consolidados da análise dos PDFs (jsonb no PostgreSQL, ver migrar_json_para_jsonb.py)
+    extracted_data = db.Column(db.JSON().with_variant(JSONB, 'postgresql'))
+    
     # Relacionamentos
     items = db.relationship('EditalItem', backref='edital', lazy=True, cascade='all, delete-orphan')
     files = db.relationship('EditalFile', backref='edital', lazy=True, cascade='all, delete-orphan')
@@ -68,6 +72,7 @@ class Edital(db.Model):
             'has_access_button': self.has_access_button,
             'has_items_tab': self.has_items_tab,
             'has_files_tab': self.has_files_tab,
+            'extracted_data': self.extracted_data,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'items': [item.to_dict() for item in self.items],
             'files': [file.to_dict() for file in self.files]
@@ -118,7 +123,8 @@ class EditalFile(db.Model):
     
     # Análise semântica do PDF (será implementada na Fase 3)
     extracted_text = db.Column(db.Text)
-    semantic_data = db.Column(db.Text)  # JSON com dados extraídos
+    # Dados extraídos (dict); jsonb no PostgreSQL (migrar_json_para_jsonb.py), JSON no SQLite
+    semantic_data = db.Column(db.JSON().with_variant(JSONB, 'postgresql'))
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -131,7 +137,7 @@ class EditalFile(db.Model):
             'file_size': self.file_size,
             'file_type': self.file_type,
             'extracted_text': self.extracted_text,
-            'semantic_data': json.loads(self.semantic_data) if self.semantic_data else None,
+            'semantic_data': self.semantic_data,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -2,6 +2,9 @@ from src.models.user import db
 from datetime import datetime
 from decimal import Decimal
 
+# Troca separadores do formato en-US (1,234.56) para o brasileiro (1.234,56)
+_BRL_SEPARATORS = str.maketrans(',.', '.,')
+
 class City(db.Model):
     __tablename__ = 'cities'
     
@@ -60,7 +63,7 @@ class City(db.Model):
         if not value:
             return 'Valor não informado'
         try:
-            return f"R$ {float(value):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            return f"R$ {float(value):,.2f}".translate(_BRL_SEPARATORS)
         except:
             return 'Valor não informado'
     
@@ -198,7 +201,7 @@ class Tender(db.Model):
         if not value:
             return 'Valor não informado'
         try:
-            return f"R$ {float(value):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+            return f"R$ {float(value):,.2f}".translate(_BRL_SEPARATORS)
         except:
             return 'Valor não informado'
     
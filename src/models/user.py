@@ -1,7 +1,24 @@
+from contextlib import contextmanager
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import scoped_session
 
 db = SQLAlchemy()
 
+
+@contextmanager
+def no_expire_on_commit(session=None):
+    """Mantém os objetos carregados válidos após cada commit (evita um SELECT por objeto no próximo acesso)"""
+    session = session if session is not None else db.session
+    if isinstance(session, scoped_session):
+        session = session()
+    previous = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        yield session
+    finally:
+        session.expire_on_commit = previous
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
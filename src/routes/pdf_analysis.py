@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify, current_app
-from src.services.pdf_integration import PDFIntegrationService
+from src.services.pdf_integration import PDFIntegrationService, get_analysis_job, submit_analysis_job
 from datetime import datetime
 import logging
 
@@ -11,36 +11,27 @@ pdf_analysis_bp = Blueprint('pdf_analysis', __name__)
 def analyze_edital_pdfs(edital_id):
     """
     POST /api/editais/{id}/analyze-pdfs
-    Analisa todos os arquivos PDF de um edital específico
+    Agenda a análise de todos os arquivos PDF de um edital específico
+    
+    A análise roda em segundo plano; o andamento é consultado em
+    GET /api/editais/analysis-jobs/{job_id}
     """
     try:
-        logger.info(f"Iniciando análise de PDFs do edital {edital_id}")
+        logger.info(f"Agendando análise de PDFs do edital {edital_id}")
         
-        service = PDFIntegrationService()
-        result = service.analyze_edital_files(edital_id)
-        
-        if 'error' in result:
-            return jsonify({
-                'success': False,
-                'error': result['error'],
-                'edital_id': edital_id,
-                'timestamp': datetime.now().isoformat()
-            }), 500
+        job_id = submit_analysis_job(current_app._get_current_object(), 'analyze_edital_files', edital_id)
         
         return jsonify({
             'success': True,
-            'message': result['message'],
+            'message': 'Análise agendada',
             'edital_id': edital_id,
-            'files_analyzed': result['files_analyzed'],
-            'analysis_summary': {
-                'total_files': result['files_analyzed'],
-                'has_results': len(result.get('results', {})) > 0
-            },
+            'job_id': job_id,
+            'status_url': f'/api/editais/analysis-jobs/{job_id}',
             'timestamp': datetime.now().isoformat()
-        })
+        }), 202
         
     except Exception as e:
-        logger.error(f"Erro ao analisar PDFs do edital {edital_id}: {str(e)}")
+        logger.error(f"Erro ao agendar análise de PDFs do edital {edital_id}: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e),
@@ -52,40 +43,50 @@ def analyze_edital_pdfs(edital_id):
 def analyze_all_pending_pdfs():
     """
     POST /api/editais/analyze-all-pdfs
-    Analisa todos os arquivos PDF pendentes de análise
+    Agenda a análise de todos os arquivos PDF pendentes (em segundo plano)
     """
     try:
-        logger.info("Iniciando análise de todos os PDFs pendentes")
+        logger.info("Agendando análise de todos os PDFs pendentes")
         
-        service = PDFIntegrationService()
-        result = service.analyze_all_pending_files()
-        
-        if 'error' in result:
-            return jsonify({
-                'success': False,
-                'error': result['error'],
-                'timestamp': datetime.now().isoformat()
-            }), 500
+        job_id = submit_analysis_job(current_app._get_current_object(), 'analyze_all_pending_files')
         
         return jsonify({
             'success': True,
-            'message': result['message'],
-            'statistics': {
-                'total_pending': result['total_pending'],
-                'analyzed': result['analyzed'],
-                'errors': result['errors']
-            },
+            'message': 'Análise agendada',
+            'job_id': job_id,
+            'status_url': f'/api/editais/analysis-jobs/{job_id}',
             'timestamp': datetime.now().isoformat()
-        })
+        }), 202
         
     except Exception as e:
-        logger.error(f"Erro na análise em lote de PDFs: {str(e)}")
+        logger.error(f"Erro ao agendar análise em lote de PDFs: {str(e)}")
         return jsonify({
             'success': False,
             'error': str(e),
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@pdf_analysis_bp.route('/editais/analysis-jobs/<job_id>', methods=['GET'])
+def get_analysis_job_status(job_id):
+    """
+    GET /api/editais/analysis-jobs/{job_id}
+    Retorna o status (queued, running, finished, failed) e o resultado de um job de análise
+    """
+    job = get_analysis_job(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Job não encontrado',
+            'job_id': job_id,
+            'timestamp': datetime.now().isoformat()
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job,
+        'timestamp': datetime.now().isoformat()
+    })
+
 @pdf_analysis_bp.route('/editais/<int:edital_id>/pdf-analysis-summary', methods=['GET'])
 def get_pdf_analysis_summary(edital_id):
     """
@@ -122,6 +123,9 @@ def search_in_pdf_content():
     """
     GET /api/editais/search-in-pdfs?q=texto&limit=10
     Busca por texto no conteúdo extraído dos PDFs
+    
+    No PostgreSQL a busca é full-text em português (palavras inteiras, por radical,
+    ordenada por relevância); match_position só vem quando o texto literal ocorre
     """
     try:
         query = request.args.get('q', '').strip()
@@ -242,13 +246,9 @@ def get_pdf_content(edital_id):
                 'text_length': len(file.extracted_text) if file.extracted_text else 0
             }
             
-            # Adicionar dados semânticos se disponíveis
+            # Adicionar dados semânticos se disponíveis (jsonb, já como dict)
             if file.semantic_data:
-                try:
-                    import json
-                    file_content['semantic_data'] = json.loads(file.semantic_data)
-                except:
-                    file_content['semantic_data'] = None
+                file_content['semantic_data'] = file.semantic_data
             
             content.append(file_content)
         
@@ -1,11 +1,113 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
 from datetime import datetime
+from typing import List, Optional
 import logging
+import msgspec
+import orjson
 
 logger = logging.getLogger(__name__)
 
 scheduler_bp = Blueprint('scheduler', __name__)
 
+VALID_STATES = frozenset({
+    'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO',
+    'MA', 'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI',
+    'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
+})
+
+SCHEDULE_PRESETS = {
+    'daily_morning': {
+        'name': 'Diário - Manhã (6h)',
+        'cron': '0 6 * * *',
+        'description': 'Executa todos os dias às 6h da manhã'
+    },
+    'daily_evening': {
+        'name': 'Diário - Noite (18h)',
+        'cron': '0 18 * * *',
+        'description': 'Executa todos os dias às 18h'
+    },
+    'weekdays_morning': {
+        'name': 'Dias Úteis - Manhã (8h)',
+        'cron': '0 8 * * 1-5',
+        'description': 'Executa de segunda a sexta às 8h'
+    },
+    'weekdays_evening': {
+        'name': 'Dias Úteis - Tarde (14h)',
+        'cron': '0 14 * * 1-5',
+        'description': 'Executa de segunda a sexta às 14h'
+    },
+    'twice_daily': {
+        'name': 'Duas Vezes ao Dia (9h e 15h)',
+        'cron': '0 9,15 * * *',
+        'description': 'Executa às 9h e 15h todos os dias'
+    },
+    'every_4_hours': {
+        'name': 'A Cada 4 Horas',
+        'cron': '0 */4 * * *',
+        'description': 'Executa a cada 4 horas'
+    },
+    'weekly_monday': {
+        'name': 'Semanal - Segunda (10h)',
+        'cron': '0 10 * * 1',
+        'description': 'Executa toda segunda-feira às 10h'
+    },
+    'monthly_first': {
+        'name': 'Mensal - Primeiro Dia (7h)',
+        'cron': '0 7 1 * *',
+        'description': 'Executa no primeiro dia de cada mês às 7h'
+    }
+}
+
+STATE_GROUPS = {
+    'sudeste': ['SP', 'RJ', 'MG', 'ES'],
+    'sul': ['RS', 'SC', 'PR'],
+    'nordeste': ['BA', 'PE', 'CE', 'PB', 'RN', 'AL', 'SE', 'PI', 'MA'],
+    'norte': ['AM', 'PA', 'AC', 'RO', 'RR', 'AP', 'TO'],
+    'centro_oeste': ['GO', 'MT', 'MS', 'DF'],
+    'principais': ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'GO', 'PE', 'CE']
+}
+
+# Resposta de /scheduler/presets serializada no import; por requisição só o timestamp é anexado
+_PRESETS_JSON_PREFIX = orjson.dumps({
+    'schedule_presets': SCHEDULE_PRESETS,
+    'state_groups': STATE_GROUPS
+})[:-1] + b',"timestamp":"'
+
+class CustomJobBody(msgspec.Struct):
+    """Corpo de POST /scheduler/jobs"""
+    states: List[str] = msgspec.field(default_factory=list)
+    cron_expression: str = ''
+    job_id: Optional[str] = None
+    name: Optional[str] = None
+
+class BulkCustomJobsBody(msgspec.Struct):
+    """Corpo de POST /scheduler/jobs/bulk"""
+    jobs: List[CustomJobBody] = msgspec.field(default_factory=list)
+
+class QuickSetupBody(msgspec.Struct):
+    """Corpo de POST /scheduler/quick-setup"""
+    preset: str = ''
+    state_group: str = ''
+    custom_states: List[str] = msgspec.field(default_factory=list)
+    job_name: str = ''
+
+# Decoders compilados uma vez: parse e validação do JSON em uma única passada
+_custom_job_decoder = msgspec.json.Decoder(CustomJobBody)
+_bulk_custom_jobs_decoder = msgspec.json.Decoder(BulkCustomJobsBody)
+_quick_setup_decoder = msgspec.json.Decoder(QuickSetupBody)
+
+def _invalid_body_response(error):
+    """Resposta 400 para corpo JSON malformado ou com tipos inválidos"""
+    return jsonify({
+        'error': f'Corpo da requisição inválido: {error}'
+    }), 400
+
+@scheduler_bp.before_request
+def _cache_request_timestamp():
+    """Calcula o timestamp das respostas uma única vez por requisição"""
+    g._now = datetime.now()
+    g._now_iso = g._now.isoformat()
+
 @scheduler_bp.route('/scheduler/status', methods=['GET'])
 def get_scheduler_status():
     """
@@ -18,14 +120,14 @@ def get_scheduler_status():
         
         return jsonify({
             'status': status,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         })
         
     except Exception as e:
         logger.error(f"Erro ao obter status do scheduler: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/jobs', methods=['GET'])
@@ -41,14 +143,14 @@ def get_jobs():
         return jsonify({
             'jobs': jobs,
             'total_jobs': len(jobs),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         })
         
     except Exception as e:
         logger.error(f"Erro ao listar jobs: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/jobs', methods=['POST'])
@@ -66,12 +168,15 @@ def create_custom_job():
     }
     """
     try:
-        data = request.get_json() or {}
+        try:
+            body = _custom_job_decoder.decode(request.get_data() or b'{}')
+        except msgspec.DecodeError as e:
+            return _invalid_body_response(e)
         
-        states = data.get('states', [])
-        cron_expression = data.get('cron_expression', '')
-        job_id = data.get('job_id')
-        name = data.get('name', f"Scraping Customizado - {', '.join(states)}")
+        states = body.states
+        cron_expression = body.cron_expression
+        job_id = body.job_id
+        name = body.name or f"Scraping Customizado - {', '.join(states)}"
         
         if not states:
             return jsonify({
@@ -84,14 +189,10 @@ def create_custom_job():
             }), 400
         
         # Validar estados
-        valid_states = ['AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 
-                       'MA', 'MT', 'MS', 'MG', 'PA', 'PB', 'PR', 'PE', 'PI', 
-                       'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO']
-        
-        invalid_states = [s for s in states if s not in valid_states]
+        invalid_states = set(states) - VALID_STATES
         if invalid_states:
             return jsonify({
-                'error': f'Estados inválidos: {", ".join(invalid_states)}'
+                'error': f'Estados inválidos: {", ".join(sorted(invalid_states))}'
             }), 400
         
         scheduler_service = current_app.scheduler_service
@@ -107,14 +208,77 @@ def create_custom_job():
             'job_id': created_job_id,
             'states': states,
             'cron_expression': cron_expression,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         })
         
     except Exception as e:
         logger.error(f"Erro ao criar job customizado: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
+        }), 500
+
+@scheduler_bp.route('/scheduler/jobs/bulk', methods=['POST'])
+def create_custom_jobs_bulk():
+    """
+    POST /api/scheduler/jobs/bulk
+    Cria vários jobs customizados de scraping de uma vez
+    
+    Body:
+    {
+        "jobs": [
+            {"states": ["SP"], "cron_expression": "0 8 * * 1-5"},
+            {"states": ["RJ", "MG"], "cron_expression": "0 14 * * *", "job_id": "custom_job_2"}
+        ]
+    }
+    """
+    try:
+        try:
+            body = _bulk_custom_jobs_decoder.decode(request.get_data() or b'{}')
+        except msgspec.DecodeError as e:
+            return _invalid_body_response(e)
+        
+        if not body.jobs:
+            return jsonify({
+                'error': 'Lista de jobs é obrigatória'
+            }), 400
+        
+        # Validar todos os jobs antes de agendar qualquer um
+        for index, job in enumerate(body.jobs):
+            if not job.states:
+                return jsonify({
+                    'error': f'Job {index}: lista de estados é obrigatória'
+                }), 400
+            
+            if not job.cron_expression:
+                return jsonify({
+                    'error': f'Job {index}: expressão cron é obrigatória'
+                }), 400
+            
+            invalid_states = set(job.states) - VALID_STATES
+            if invalid_states:
+                return jsonify({
+                    'error': f'Job {index}: estados inválidos: {", ".join(sorted(invalid_states))}'
+                }), 400
+        
+        scheduler_service = current_app.scheduler_service
+        created_job_ids = scheduler_service.schedule_custom_scraping_bulk([
+            {'states': job.states, 'cron_expression': job.cron_expression, 'job_id': job.job_id}
+            for job in body.jobs
+        ])
+        
+        return jsonify({
+            'success': True,
+            'message': f'{len(created_job_ids)} jobs customizados criados com sucesso',
+            'job_ids': created_job_ids,
+            'timestamp': g._now_iso
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao criar jobs customizados em lote: {str(e)}")
+        return jsonify({
+            'error': str(e),
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/jobs/<job_id>', methods=['DELETE'])
@@ -131,19 +295,19 @@ def remove_job(job_id):
             return jsonify({
                 'success': True,
                 'message': f'Job "{job_id}" removido com sucesso',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': g._now_iso
             })
         else:
             return jsonify({
                 'error': f'Job "{job_id}" não encontrado',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': g._now_iso
             }), 404
         
     except Exception as e:
         logger.error(f"Erro ao remover job {job_id}: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/jobs/<job_id>/pause', methods=['POST'])
@@ -160,19 +324,19 @@ def pause_job(job_id):
             return jsonify({
                 'success': True,
                 'message': f'Job "{job_id}" pausado com sucesso',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': g._now_iso
             })
         else:
             return jsonify({
                 'error': f'Job "{job_id}" não encontrado',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': g._now_iso
             }), 404
         
     except Exception as e:
         logger.error(f"Erro ao pausar job {job_id}: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/jobs/<job_id>/resume', methods=['POST'])
@@ -189,48 +353,58 @@ def resume_job(job_id):
             return jsonify({
                 'success': True,
                 'message': f'Job "{job_id}" resumido com sucesso',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': g._now_iso
             })
         else:
             return jsonify({
                 'error': f'Job "{job_id}" não encontrado',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': g._now_iso
             }), 404
         
     except Exception as e:
         logger.error(f"Erro ao resumir job {job_id}: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/jobs/<job_id>/run', methods=['POST'])
 def run_job_now(job_id):
     """
     POST /api/scheduler/jobs/{job_id}/run
-    Executa um job imediatamente
+    Dispara um job imediatamente (a execução segue em segundo plano)
     """
     try:
         scheduler_service = current_app.scheduler_service
-        success = scheduler_service.run_job_now(job_id)
+        outcome = scheduler_service.run_job_now(job_id)
         
-        if success:
+        if outcome == 'started':
             return jsonify({
                 'success': True,
-                'message': f'Job "{job_id}" executado com sucesso',
-                'timestamp': datetime.now().isoformat()
-            })
-        else:
+                'message': f'Job "{job_id}" disparado',
+                'timestamp': g._now_iso
+            }), 202
+        elif outcome == 'not_found':
             return jsonify({
                 'error': f'Job "{job_id}" não encontrado',
-                'timestamp': datetime.now().isoformat()
+                'timestamp': g._now_iso
             }), 404
+        elif outcome == 'paused':
+            return jsonify({
+                'error': f'Job "{job_id}" está pausado; retome-o antes de disparar',
+                'timestamp': g._now_iso
+            }), 409
+        else:
+            return jsonify({
+                'error': 'Scheduler não está em execução',
+                'timestamp': g._now_iso
+            }), 409
         
     except Exception as e:
         logger.error(f"Erro ao executar job {job_id}: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/start', methods=['POST'])
@@ -246,14 +420,14 @@ def start_scheduler():
         return jsonify({
             'success': True,
             'message': 'Scheduler iniciado com sucesso',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         })
         
     except Exception as e:
         logger.error(f"Erro ao iniciar scheduler: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/stop', methods=['POST'])
@@ -269,14 +443,14 @@ def stop_scheduler():
         return jsonify({
             'success': True,
             'message': 'Scheduler parado com sucesso',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         })
         
     except Exception as e:
         logger.error(f"Erro ao parar scheduler: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/presets', methods=['GET'])
@@ -286,69 +460,14 @@ def get_schedule_presets():
     Retorna presets de agendamento comuns
     """
     try:
-        presets = {
-            'daily_morning': {
-                'name': 'Diário - Manhã (6h)',
-                'cron': '0 6 * * *',
-                'description': 'Executa todos os dias às 6h da manhã'
-            },
-            'daily_evening': {
-                'name': 'Diário - Noite (18h)',
-                'cron': '0 18 * * *',
-                'description': 'Executa todos os dias às 18h'
-            },
-            'weekdays_morning': {
-                'name': 'Dias Úteis - Manhã (8h)',
-                'cron': '0 8 * * 1-5',
-                'description': 'Executa de segunda a sexta às 8h'
-            },
-            'weekdays_evening': {
-                'name': 'Dias Úteis - Tarde (14h)',
-                'cron': '0 14 * * 1-5',
-                'description': 'Executa de segunda a sexta às 14h'
-            },
-            'twice_daily': {
-                'name': 'Duas Vezes ao Dia (9h e 15h)',
-                'cron': '0 9,15 * * *',
-                'description': 'Executa às 9h e 15h todos os dias'
-            },
-            'every_4_hours': {
-                'name': 'A Cada 4 Horas',
-                'cron': '0 */4 * * *',
-                'description': 'Executa a cada 4 horas'
-            },
-            'weekly_monday': {
-                'name': 'Semanal - Segunda (10h)',
-                'cron': '0 10 * * 1',
-                'description': 'Executa toda segunda-feira às 10h'
-            },
-            'monthly_first': {
-                'name': 'Mensal - Primeiro Dia (7h)',
-                'cron': '0 7 1 * *',
-                'description': 'Executa no primeiro dia de cada mês às 7h'
-            }
-        }
-        
-        states_groups = {
-            'sudeste': ['SP', 'RJ', 'MG', 'ES'],
-            'sul': ['RS', 'SC', 'PR'],
-            'nordeste': ['BA', 'PE', 'CE', 'PB', 'RN', 'AL', 'SE', 'PI', 'MA'],
-            'norte': ['AM', 'PA', 'AC', 'RO', 'RR', 'AP', 'TO'],
-            'centro_oeste': ['GO', 'MT', 'MS', 'DF'],
-            'principais': ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'GO', 'PE', 'CE']
-        }
-        
-        return jsonify({
-            'schedule_presets': presets,
-            'state_groups': states_groups,
-            'timestamp': datetime.now().isoformat()
-        })
+        body = _PRESETS_JSON_PREFIX + g._now_iso.encode() + b'"}'
+        return current_app.response_class(body, mimetype='application/json')
         
     except Exception as e:
         logger.error(f"Erro ao obter presets: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
 @scheduler_bp.route('/scheduler/quick-setup', methods=['POST'])
@@ -366,35 +485,17 @@ def quick_setup():
     }
     """
     try:
-        data = request.get_json() or {}
-        
-        preset = data.get('preset', '')
-        state_group = data.get('state_group', '')
-        custom_states = data.get('custom_states', [])
-        job_name = data.get('job_name', '')
-        
-        # Obter presets
-        presets = {
-            'daily_morning': '0 6 * * *',
-            'daily_evening': '0 18 * * *',
-            'weekdays_morning': '0 8 * * 1-5',
-            'weekdays_evening': '0 14 * * 1-5',
-            'twice_daily': '0 9,15 * * *',
-            'every_4_hours': '0 */4 * * *',
-            'weekly_monday': '0 10 * * 1',
-            'monthly_first': '0 7 1 * *'
-        }
-        
-        state_groups = {
-            'sudeste': ['SP', 'RJ', 'MG', 'ES'],
-            'sul': ['RS', 'SC', 'PR'],
-            'nordeste': ['BA', 'PE', 'CE', 'PB', 'RN', 'AL', 'SE', 'PI', 'MA'],
-            'norte': ['AM', 'PA', 'AC', 'RO', 'RR', 'AP', 'TO'],
-            'centro_oeste': ['GO', 'MT', 'MS', 'DF'],
-            'principais': ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'GO', 'PE', 'CE']
-        }
-        
-        if not preset or preset not in presets:
+        try:
+            body = _quick_setup_decoder.decode(request.get_data() or b'{}')
+        except msgspec.DecodeError as e:
+            return _invalid_body_response(e)
+        
+        preset = body.preset
+        state_group = body.state_group
+        custom_states = body.custom_states
+        job_name = body.job_name
+        
+        if not preset or preset not in SCHEDULE_PRESETS:
             return jsonify({
                 'error': 'Preset inválido ou não especificado'
             }), 400
@@ -402,8 +503,8 @@ def quick_setup():
         # Determinar estados
         if custom_states:
             states = custom_states
-        elif state_group and state_group in state_groups:
-            states = state_groups[state_group]
+        elif state_group and state_group in STATE_GROUPS:
+            states = STATE_GROUPS[state_group]
         else:
             return jsonify({
                 'error': 'Grupo de estados ou estados customizados devem ser especificados'
@@ -424,8 +525,8 @@ def quick_setup():
             job_name = f"{preset_names.get(preset, preset)} - {', '.join(states)}"
         
         # Criar job
-        cron_expression = presets[preset]
-        job_id = f"quick_{preset}_{state_group or 'custom'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        cron_expression = SCHEDULE_PRESETS[preset]['cron']
+        job_id = f"quick_{preset}_{state_group or 'custom'}_{g._now.strftime('%Y%m%d_%H%M%S')}"
         
         scheduler_service = current_app.scheduler_service
         created_job_id = scheduler_service.schedule_custom_scraping(
@@ -442,13 +543,13 @@ def quick_setup():
             'preset': preset,
             'states': states,
             'cron_expression': cron_expression,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         })
         
     except Exception as e:
         logger.error(f"Erro na configuração rápida: {str(e)}")
         return jsonify({
             'error': str(e),
-            'timestamp': datetime.now().isoformat()
+            'timestamp': g._now_iso
         }), 500
 
@@ -3,68 +3,238 @@
 API melhorada com dados completos e formatação brasileira
 """
 
-from flask import Blueprint, request, jsonify, send_file
-import psycopg2
-import psycopg2.extras
+from flask import Blueprint, request, jsonify, send_file, redirect, current_app, make_response, stream_with_context
 import logging
-import json
 import os
-from datetime import datetime
-from dotenv import load_dotenv
-
-load_dotenv()
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from functools import lru_cache, wraps
+from urllib.parse import quote
+
+from src.db_pool import db_cursor, execute_prepared
+from src.json_provider import dumps_bytes, raw_json
+from src.services.data_scraper import DataScraper
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 tender_bp = Blueprint('tender', __name__)
 
-def get_db_connection():
-    """Cria conexão direta com PostgreSQL"""
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            port=os.getenv('DB_PORT', 5432),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            client_encoding='utf8'
+# Cache em memória (por processo) das respostas de agregados, em segundos;
+# uma entrada por rota, limitado às RESPONSE_CACHE_MAXSIZE usadas mais recentemente
+RESPONSE_CACHE_TTL = 300
+STATS_CACHE_TTL = 60
+RESPONSE_CACHE_MAXSIZE = 64
+_response_cache = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# Com nginx na frente: location interna (ex.: /protected-downloads/ com "internal; alias <DOWNLOADS_ROOT>/;")
+# que entrega os arquivos de DOWNLOADS_ROOT via X-Accel-Redirect, sem ocupar o worker
+DOWNLOADS_ACCEL_PREFIX = os.getenv('DOWNLOADS_ACCEL_PREFIX')
+DOWNLOADS_ROOT = os.path.realpath(os.getenv('DOWNLOADS_ROOT', 'downloads'))
+
+# Resultado de os.path.exists por caminho, reaproveitado entre requisições (segundos);
+# limitado aos FILE_EXISTS_CACHE_MAXSIZE caminhos usados mais recentemente
+FILE_EXISTS_CACHE_TTL = 60
+FILE_EXISTS_CACHE_MAXSIZE = 2048
+_file_exists_cache = OrderedDict()
+_file_exists_lock = threading.Lock()
+
+# POST /scrape roda a coleta aqui, fora do worker da requisição (uma coleta por vez)
+_scrape_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scrape')
+_scrape_lock = threading.Lock()
+_scrape_state = {}
+
+# POST /cities/invalidate exige o header X-Admin-Token com este valor (sem ele a rota responde 403)
+CACHE_INVALIDATE_TOKEN = os.getenv('CACHE_INVALIDATE_TOKEN')
+
+# work_mem da transação de /tenders: a ordenação de buscas filtradas (ILIKE sem ordem de índice)
+# fica em memória em vez de virar "external merge" em disco
+TENDERS_WORK_MEM = os.getenv('TENDERS_WORK_MEM', '64MB')
+
+# Troca separadores do formato en-US (1,234.56) para o brasileiro (1.234,56)
+_BRL_SEPARATORS = str.maketrans(',.', '.,')
+
+@lru_cache(maxsize=4096)
+def _brl(value):
+    """Formata um float como moeda brasileira em uma única passada"""
+    return f"R$ {value:,.2f}".translate(_BRL_SEPARATORS)
+
+def _brl_sql(column):
+    """Expressão SQL que formata um valor numérico como moeda brasileira"""
+    return (
+        f"CASE WHEN COALESCE({column}, 0) = 0 THEN 'Valor não informado' "
+        f"ELSE 'R$ ' || translate(to_char({column}, 'FM9,999,999,999,990.00'), ',.', '.,') END"
+    )
+
+# Campos de /tenders (allowlist de ?fields=) e sua expressão SQL, já normalizada e formatada pelo PostgreSQL
+_TENDER_FIELDS = {
+    'id': "id",
+    'pncp_id': "COALESCE(pncp_id, '')",
+    'title': "COALESCE(title, '')",
+    'description': "COALESCE(description, '')",
+    'organization_name': "COALESCE(organization_name, '')",
+    'organization_cnpj': "COALESCE(organization_cnpj, '')",
+    'municipality_name': "COALESCE(municipality_name, '')",
+    'municipality_ibge': "COALESCE(municipality_ibge, '')",
+    'state_code': "COALESCE(state_code, '')",
+    'publication_date': "COALESCE(publication_date::text, '')",
+    'publication_date_br': "COALESCE(to_char(publication_date, 'DD/MM/YYYY'), '')",
+    'status': "COALESCE(status, '')",
+    'modality': "COALESCE(modality, '')",
+    'estimated_value': "NULLIF(estimated_value, 0)::float8",
+    'source_url': "COALESCE(source_url, '')",
+    'detail_url': "COALESCE(detail_url, '')",
+    'data_source': "COALESCE(data_source, '')",
+    'created_at': "COALESCE(created_at::text, '')",
+    'pncp_url': "COALESCE(NULLIF(detail_url, ''), NULLIF(source_url, ''), '')",
+    'objeto': "COALESCE(objeto, '')",
+    'prazo': "COALESCE(prazo, '')",
+    'detailed_description': "COALESCE(detailed_description, '')",
+    'valor_total_estimado': "NULLIF(valor_total_estimado, 0)::float8",
+    'valor_total_estimado_br': _brl_sql('valor_total_estimado'),
+    'items_count': "COALESCE(items_count, 0)",
+    'downloads_count': "COALESCE(downloads_count, 0)",
+    'formatted_value': _brl_sql('COALESCE(NULLIF(valor_total_estimado, 0), estimated_value)'),
+    'has_files': "COALESCE(downloads_count, 0) > 0",
+    'has_items': "COALESCE(items_count, 0) > 0",
+    # Blobs JSON (jsonb como texto), fora da projeção padrão
+    'downloaded_files': "COALESCE(downloaded_files_json, '[]'::jsonb)::text",
+    'items': "COALESCE(items_json, '[]'::jsonb)::text",
+}
+
+# Campos JSON repassados como texto para a resposta
+_JSON_FIELDS = frozenset({'items', 'downloaded_files'})
+
+# Projeção padrão: todos os campos leves. ?include_items=1 acrescenta os blobs JSON
+_DEFAULT_FIELDS = tuple(name for name in _TENDER_FIELDS if name not in _JSON_FIELDS)
+_FIELDS_WITH_ITEMS = tuple(_TENDER_FIELDS)
+
+# Sempre projetados: montam o next_cursor da paginação
+_REQUIRED_FIELDS = frozenset({'id', 'publication_date'})
+
+def _parse_fields(fields_arg, include_items):
+    """Campos pedidos em ?fields=, filtrados pela allowlist e na ordem canônica"""
+    if not fields_arg:
+        return _FIELDS_WITH_ITEMS if include_items else _DEFAULT_FIELDS
+
+    requested = {name.strip() for name in fields_arg.split(',')} | _REQUIRED_FIELDS
+    if include_items:
+        requested |= _JSON_FIELDS
+    return tuple(name for name in _TENDER_FIELDS if name in requested)
+
+# Colunas de /tenders/<id>: exatamente as chaves serializadas no detalhe
+_TENDER_DETAIL_SELECT = """
+SELECT id,
+       COALESCE(pncp_id, '') AS pncp_id,
+       COALESCE(title, '') AS title,
+       COALESCE(description, '') AS description,
+       COALESCE(organization_name, '') AS organization_name,
+       COALESCE(organization_cnpj, '') AS organization_cnpj,
+       COALESCE(municipality_name, '') AS municipality_name,
+       COALESCE(state_code, '') AS state_code,
+       COALESCE(to_char(publication_date, 'DD/MM/YYYY'), '') AS publication_date_br,
+       COALESCE(status, '') AS status,
+       COALESCE(modality, '') AS modality,
+       COALESCE(NULLIF(detail_url, ''), NULLIF(source_url, ''), '') AS pncp_url,
+       COALESCE(objeto, '') AS objeto,
+       COALESCE(prazo, '') AS prazo,
+       COALESCE(detailed_description, '') AS detailed_description,
+       """ + _brl_sql('valor_total_estimado') + """ AS valor_total_estimado_br,
+       COALESCE(items_count, 0) AS items_count,
+       COALESCE(downloads_count, 0) AS downloads_count,
+       COALESCE(items_json, '[]'::jsonb)::text AS items,
+       COALESCE(downloaded_files_json, '[]'::jsonb)::text AS downloaded_files
+FROM tenders
+WHERE id = %s
+"""
+
+# Filtros de /tenders, na ordem (cidade, estado, palavra-chave):
+# fragmento WHERE pré-compilado e como gerar seus parâmetros a partir do valor informado
+_TENDER_FILTERS = (
+    ("municipality_name ILIKE %s", lambda value: [f'%{value}%']),
+    ("state_code ILIKE %s", lambda value: [f'%{value}%']),
+    ("(title ILIKE %s OR description ILIKE %s OR organization_name ILIKE %s OR objeto ILIKE %s)",
+     lambda value: [f'%{value}%'] * 4),
+)
+
+# Ordenação da listagem. Sem data de publicação a linha vai para o fim ('-infinity'): num DESC
+# puro os NULLs viriam primeiro e o cursor não teria como passar deles
+_SORT_DATE = "COALESCE(publication_date, '-infinity'::date)"
+_LIST_ORDER = f"ORDER BY {_SORT_DATE} DESC, id DESC"
+
+# Paginação por cursor: linhas depois de (after_publication_date, after_id) na ordenação da listagem
+_KEYSET_FILTER = f"({_SORT_DATE}, id) < (%s::date, %s)"
+
+@lru_cache(maxsize=8)
+def _where_clause(mask):
+    """Cláusula WHERE para uma das 8 combinações de filtros ativos"""
+    return ' AND '.join(['1=1'] + [clause for (clause, _), active in zip(_TENDER_FILTERS, mask) if active])
+
+@lru_cache(maxsize=64)
+def _tenders_queries(where_clause, fields=_DEFAULT_FIELDS, keyset=False):
+    """SQL de listagem e de contagem para uma cláusula WHERE e uma projeção"""
+    columns = ',\n       '.join(f"{_TENDER_FIELDS[name]} AS {name}" for name in fields)
+    if keyset:
+        # Seek pelo índice tenders_sort_date_id: custo constante em qualquer profundidade.
+        # O total não sai da window function aqui, pois ela só veria as linhas após o cursor
+        list_query = (
+            f"SELECT {columns}\nFROM tenders WHERE {where_clause} AND {_KEYSET_FILTER} "
+            f"{_LIST_ORDER} LIMIT %s"
         )
-        return conn
-    except Exception as e:
-        logger.error(f"Erro de conexão: {e}")
-        return None
+    else:
+        # Com filtros, o total sai junto da página via window function (uma única varredura).
+        # Sem filtros o total vem da estimativa do planner, então o COUNT OVER() é dispensado
+        full_count = ",\n       COUNT(*) OVER() AS full_count" if where_clause != '1=1' else ''
+        list_query = (
+            f"SELECT {columns}{full_count}\nFROM tenders WHERE {where_clause} "
+            f"{_LIST_ORDER} LIMIT %s OFFSET %s"
+        )
+    count_query = f"SELECT COUNT(*) FROM tenders WHERE {where_clause}"
+    return list_query, count_query
+
+def _build_filters(city_name, state_code, keyword):
+    """Monta a cláusula WHERE e os parâmetros dos filtros de /tenders"""
+    values = (city_name, state_code, keyword)
+    params = []
+    for (_, to_params), value in zip(_TENDER_FILTERS, values):
+        if value:
+            params.extend(to_params(value))
+
+    return _where_clause(tuple(bool(value) for value in values)), params
+
+def _estimate_total_tenders(cursor):
+    """Total aproximado de licitações a partir das estatísticas do planner"""
+    cursor.execute("SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = 'tenders'::regclass")
+    estimate = cursor.fetchone()[0]
+
+    # Tabela ainda não analisada (reltuples = -1): cair para o COUNT exato
+    if estimate is None or estimate < 0:
+        cursor.execute("SELECT COUNT(*) FROM tenders")
+        return cursor.fetchone()[0]
 
-def format_brazilian_date(date_str):
-    """Formata data para padrão brasileiro"""
-    if not date_str:
-        return ''
-    try:
-        if isinstance(date_str, str):
-            # Se já está no formato YYYY-MM-DD
-            if '-' in date_str and len(date_str) == 10:
-                year, month, day = date_str.split('-')
-                return f"{day}/{month}/{year}"
-        return str(date_str)
-    except:
-        return str(date_str)
-
-def format_brazilian_currency(value):
-    """Formata valor para moeda brasileira"""
-    if not value or value == 0:
-        return 'Valor não informado'
+    return estimate
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def _ndjson_lines(meta, rows):
+    """Gera o corpo NDJSON de /tenders linha a linha"""
+    yield dumps_bytes({'meta': meta}) + b'\n'
+    for row in rows:
+        yield dumps_bytes(row) + b'\n'
+
+def _valid_cursor_date(value):
+    """Confere se o cursor after_publication_date é uma data ISO ou '-infinity' (datas nulas)"""
+    if value == '-infinity':
+        return True
     try:
-        # Converter para float se necessário
-        if isinstance(value, str):
-            value = float(value.replace(',', '.'))
-
-        # Formatar como moeda brasileira
-        formatted = f"R$ {float(value):,.2f}"
-        # Trocar . por , e , por .
-        formatted = formatted.replace(',', 'TEMP').replace('.', ',').replace('TEMP', '.')
-        return formatted
-    except:
-        return 'Valor não informado'
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
 
 @tender_bp.route('/tenders', methods=['GET'])
 def get_tenders():
@@ -76,151 +246,112 @@ def get_tenders():
         city_name = request.args.get('city_name', '').strip()
         state_code = request.args.get('state_code', '').strip()
         keyword = request.args.get('keyword', '').strip()
-
-        # Conectar
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # Query com TODOS os campos
-        base_query = """
-        SELECT id, pncp_id, title, description, organization_name, organization_cnpj,
-               municipality_name, municipality_ibge, state_code, publication_date,
-               status, modality, estimated_value, source_url, detail_url,
-               data_source, created_at, downloaded_files, objeto, items_json,
-               downloaded_files_json, prazo, detailed_description, valor_total_estimado,
-               items_count, downloads_count
-        FROM tenders 
-        WHERE 1=1
-        """
-
-        params = []
-
-        # Aplicar filtros
-        if city_name:
-            base_query += " AND municipality_name ILIKE %s"
-            params.append(f'%{city_name}%')
-
-        if state_code:
-            base_query += " AND state_code ILIKE %s"
-            params.append(f'%{state_code}%')
-
-        if keyword:
-            base_query += " AND (title ILIKE %s OR description ILIKE %s OR organization_name ILIKE %s OR objeto ILIKE %s)"
-            params.extend([f'%{keyword}%', f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'])
-
-        # Ordenar e paginar
-        base_query += " ORDER BY publication_date DESC"
-        base_query += f" LIMIT {per_page} OFFSET {(page - 1) * per_page}"
-
-        # Executar query
-        cursor.execute(base_query, params)
-        rows = cursor.fetchall()
-
-        # Converter para lista de dicionários com formatação brasileira
-        tenders = []
-        for row in rows:
-            # Parse JSON fields
-            items = []
-            downloaded_files = []
-
-            try:
-                if row['items_json']:
-                    items = json.loads(row['items_json'])
-            except:
-                items = []
-
-            try:
-                if row['downloaded_files_json']:
-                    downloaded_files = json.loads(row['downloaded_files_json'])
-            except:
-                downloaded_files = []
-
-            tender_dict = {
-                'id': row['id'],
-                'pncp_id': row['pncp_id'] or '',
-                'title': row['title'] or '',
-                'description': row['description'] or '',
-                'organization_name': row['organization_name'] or '',
-                'organization_cnpj': row['organization_cnpj'] or '',
-                'municipality_name': row['municipality_name'] or '',
-                'municipality_ibge': row['municipality_ibge'] or '',
-                'state_code': row['state_code'] or '',
-                'publication_date': str(row['publication_date']) if row['publication_date'] else '',
-                'publication_date_br': format_brazilian_date(row['publication_date']),
-                'status': row['status'] or '',
-                'modality': row['modality'] or '',
-                'estimated_value': float(row['estimated_value']) if row['estimated_value'] else None,
-                'source_url': row['source_url'] or '',
-                'detail_url': row['detail_url'] or '',
-                'data_source': row['data_source'] or '',
-                'created_at': str(row['created_at']) if row['created_at'] else '',
-                'pncp_url': row['detail_url'] or row['source_url'] or '',
-
-                # NOVOS CAMPOS COMPLETOS
-                'objeto': row['objeto'] or '',
-                'prazo': row['prazo'] or '',
-                'detailed_description': row['detailed_description'] or '',
-                'valor_total_estimado': float(row['valor_total_estimado']) if row['valor_total_estimado'] else None,
-                'valor_total_estimado_br': format_brazilian_currency(row['valor_total_estimado']),
-                'items_count': row['items_count'] or 0,
-                'downloads_count': row['downloads_count'] or 0,
-                'items': items,
-                'downloaded_files': downloaded_files,
-
-                # FORMATAÇÃO BRASILEIRA
-                'formatted_value': format_brazilian_currency(row['valor_total_estimado'] or row['estimated_value']),
-                'has_items': len(items) > 0,
-                'has_files': len(downloaded_files) > 0
+        include_items = request.args.get('include_items', '') in ('1', 'true')
+        fields = _parse_fields(request.args.get('fields', ''), include_items)
+
+        # Cursor da página anterior (next_cursor); sem ele vale a paginação legada por page
+        after_publication_date = request.args.get('after_publication_date', '').strip()
+        after_id = request.args.get('after_id', type=int)
+        keyset = bool(after_publication_date) and after_id is not None
+        if keyset and not _valid_cursor_date(after_publication_date):
+            return jsonify({
+                'success': False,
+                'error': 'after_publication_date inválido (use AAAA-MM-DD ou -infinity)'
+            }), 400
+
+        # Cursor de tuplas: evita montar um dict por linha no psycopg2
+        with db_cursor() as cursor:
+            where_clause, params = _build_filters(city_name, state_code, keyword)
+            list_query, count_query = _tenders_queries(where_clause, fields, keyset)
+
+            # Vale só para esta transação; o rollback na devolução ao pool restaura o padrão
+            cursor.execute("SELECT set_config('work_mem', %s, true)", (TENDERS_WORK_MEM,))
+
+            # Executar query preparada (paginação como parâmetros: um statement por combinação de filtros)
+            if keyset:
+                execute_prepared(cursor, list_query, params + [after_publication_date, after_id, per_page])
+            else:
+                execute_prepared(cursor, list_query, params + [per_page, (page - 1) * per_page])
+            rows = cursor.fetchall()
+            columns = [col[0] for col in cursor.description]
+
+            # O total da window function se repete em toda linha: lido uma vez, fora dos dicts
+            full_count = None
+            if columns[-1] == 'full_count':
+                columns.pop()
+                if rows:
+                    full_count = rows[0][-1]
+
+            # Linhas já chegam formatadas (zip para no fim de columns e descarta full_count);
+            # items e downloaded_files (jsonb) seguem como texto JSON direto para a resposta
+            json_columns = [i for i, name in enumerate(columns) if name in _JSON_FIELDS]
+            if json_columns:
+                tenders = []
+                for row in rows:
+                    tender_dict = dict(zip(columns, row))
+                    for i in json_columns:
+                        tender_dict[columns[i]] = raw_json(row[i])
+                    tenders.append(tender_dict)
+            else:
+                tenders = [dict(zip(columns, row)) for row in rows]
+
+            # Contar total
+            if not (city_name or state_code or keyword):
+                total = _estimate_total_tenders(cursor)
+            elif full_count is not None:
+                total = full_count
+            elif page <= 1 and not keyset:
+                total = 0
+            else:
+                # Página por cursor ou além do fim: a window function não informou o total
+                execute_prepared(cursor, count_query, params)
+                total = cursor.fetchone()[0]
+
+        # Cursor para a próxima página ('-infinity' quando a última linha não tem data)
+        next_cursor = None
+        if len(tenders) == per_page:
+            next_cursor = {
+                'after_publication_date': tenders[-1]['publication_date'] or '-infinity',
+                'after_id': tenders[-1]['id']
             }
-            tenders.append(tender_dict)
-
-        # Contar total
-        count_query = "SELECT COUNT(*) FROM tenders WHERE 1=1"
-        count_params = []
-
-        if city_name:
-            count_query += " AND municipality_name ILIKE %s"
-            count_params.append(f'%{city_name}%')
-
-        if state_code:
-            count_query += " AND state_code ILIKE %s"
-            count_params.append(f'%{state_code}%')
-
-        if keyword:
-            count_query += " AND (title ILIKE %s OR description ILIKE %s OR organization_name ILIKE %s OR objeto ILIKE %s)"
-            count_params.extend([f'%{keyword}%', f'%{keyword}%', f'%{keyword}%', f'%{keyword}%'])
-
-        cursor.execute(count_query, count_params)
-        total = cursor.fetchone()['count']
-
-        # Fechar conexão
-        cursor.close()
-        conn.close()
 
         # Calcular paginação
         pages = (total + per_page - 1) // per_page
-        has_next = page < pages
-        has_prev = page > 1
+        if keyset:
+            has_next = next_cursor is not None
+            has_prev = True
+        else:
+            has_next = page < pages
+            has_prev = page > 1
+
+        pagination = {
+            'page': page,
+            'pages': pages,
+            'per_page': per_page,
+            'total': total,
+            'has_next': has_next,
+            'has_prev': has_prev,
+            'next_cursor': next_cursor
+        }
+        filters_applied = {
+            'city_name': city_name,
+            'state_code': state_code,
+            'keyword': keyword
+        }
+
+        # NDJSON: metadados na primeira linha e uma licitação por linha, serializadas sob demanda
+        if request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE:
+            meta = {'success': True, 'pagination': pagination, 'filters_applied': filters_applied}
+            return current_app.response_class(
+                stream_with_context(_ndjson_lines(meta, tenders)),
+                mimetype=NDJSON_MIMETYPE
+            )
 
         return jsonify({
             'success': True,
             'tenders': tenders,
-            'pagination': {
-                'page': page,
-                'pages': pages,
-                'per_page': per_page,
-                'total': total,
-                'has_next': has_next,
-                'has_prev': has_prev
-            },
-            'filters_applied': {
-                'city_name': city_name,
-                'state_code': state_code,
-                'keyword': keyword
-            }
+            'pagination': pagination,
+            'filters_applied': filters_applied
         })
 
     except Exception as e:
@@ -243,66 +374,20 @@ def get_tenders():
 def get_tender_details(tender_id):
     """Get detalhes completos de uma licitação"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+        with db_cursor() as cursor:
+            execute_prepared(cursor, _TENDER_DETAIL_SELECT, (tender_id,))
+            row = cursor.fetchone()
 
-        query = """
-        SELECT * FROM tenders WHERE id = %s
-        """
-
-        cursor.execute(query, (tender_id,))
-        row = cursor.fetchone()
+            if not row:
+                return jsonify({
+                    'success': False,
+                    'error': 'Licitação não encontrada'
+                }), 404
 
-        if not row:
-            return jsonify({
-                'success': False,
-                'error': 'Licitação não encontrada'
-            }), 404
-
-        # Parse JSON fields
-        items = []
-        downloaded_files = []
-
-        try:
-            if row['items_json']:
-                items = json.loads(row['items_json'])
-        except:
-            items = []
-
-        try:
-            if row['downloaded_files_json']:
-                downloaded_files = json.loads(row['downloaded_files_json'])
-        except:
-            downloaded_files = []
-
-        tender = {
-            'id': row['id'],
-            'pncp_id': row['pncp_id'] or '',
-            'title': row['title'] or '',
-            'description': row['description'] or '',
-            'organization_name': row['organization_name'] or '',
-            'organization_cnpj': row['organization_cnpj'] or '',
-            'municipality_name': row['municipality_name'] or '',
-            'state_code': row['state_code'] or '',
-            'publication_date_br': format_brazilian_date(row['publication_date']),
-            'status': row['status'] or '',
-            'modality': row['modality'] or '',
-            'pncp_url': row['detail_url'] or row['source_url'] or '',
-            'objeto': row['objeto'] or '',
-            'prazo': row['prazo'] or '',
-            'detailed_description': row['detailed_description'] or '',
-            'valor_total_estimado_br': format_brazilian_currency(row['valor_total_estimado']),
-            'items_count': row['items_count'] or 0,
-            'downloads_count': row['downloads_count'] or 0,
-            'items': items,
-            'downloaded_files': downloaded_files
-        }
-
-        cursor.close()
-        conn.close()
+            # Campos já chegam formatados; os JSON (jsonb) seguem como texto para a resposta
+            tender = dict(zip([col[0] for col in cursor.description], row))
+            tender['items'] = raw_json(tender['items'])
+            tender['downloaded_files'] = raw_json(tender['downloaded_files'])
 
         return jsonify({
             'success': True,
@@ -321,88 +406,374 @@ def download_file(tender_id, filename):
     """Download de arquivo específico"""
     try:
         # Buscar informações do arquivo
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
+        with db_cursor() as cursor:
+            # O PostgreSQL localiza o arquivo no jsonb e devolve só o caminho (NULL se não houver);
+            # mesma regra de _local_path: filepath ou, nos registros antigos, local_path
+            query = """
+            SELECT COALESCE(
+                       NULLIF(f.entry->>'filepath', ''),
+                       NULLIF(f.entry->>'local_path', '')
+                   )
+            FROM tenders t
+            CROSS JOIN LATERAL (
+                SELECT jsonb_path_query_first(
+                           t.downloaded_files_json,
+                           '$[*] ? (@.filename == $filename)',
+                           jsonb_build_object('filename', %s::text)
+                       ) AS entry
+            ) f
+            WHERE t.id = %s
+            """
+            cursor.execute(query, (filename, tender_id))
+            row = cursor.fetchone()
+
+            if not row:
+                return jsonify({'error': 'Licitação não encontrada'}), 404
+
+            filepath = row[0]
+            if not filepath:
+                return jsonify({'error': 'Arquivo não encontrado'}), 404
+
+            # Verificar se arquivo existe no disco
+            if not _file_exists(filepath):
+                return jsonify({'error': 'Arquivo não disponível no servidor'}), 404
+
+        return _send_stored_file(filepath, filename)
+
+    except Exception as e:
+        logger.error(f"Error downloading file: {e}")
+        return jsonify({'error': 'Erro ao baixar arquivo'}), 500
+
+def _file_exists(path):
+    """os.path.exists com cache LRU por FILE_EXISTS_CACHE_TTL segundos"""
+    now = time.monotonic()
+    with _file_exists_lock:
+        entry = _file_exists_cache.get(path)
+        if entry is not None and now < entry[0]:
+            _file_exists_cache.move_to_end(path)
+            return entry[1]
+
+    exists = os.path.exists(path)
+    with _file_exists_lock:
+        _file_exists_cache[path] = (now + FILE_EXISTS_CACHE_TTL, exists)
+        _file_exists_cache.move_to_end(path)
+        while len(_file_exists_cache) > FILE_EXISTS_CACHE_MAXSIZE:
+            _file_exists_cache.popitem(last=False)
+    return exists
+
+def _send_stored_file(filepath, download_name, as_attachment=True, mimetype=None):
+    """Envia um arquivo baixado; o nginx serve direto quando configurado e o arquivo está sob DOWNLOADS_ROOT"""
+    realpath = os.path.realpath(filepath)
+    if DOWNLOADS_ACCEL_PREFIX and realpath.startswith(DOWNLOADS_ROOT + os.sep):
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = (
+            DOWNLOADS_ACCEL_PREFIX.rstrip('/') + '/' + quote(os.path.relpath(realpath, DOWNLOADS_ROOT))
+        )
+        disposition = 'attachment' if as_attachment else 'inline'
+        response.headers['Content-Disposition'] = f"{disposition}; filename*=UTF-8''{quote(download_name)}"
+        if mimetype is None:
+            # Tipo definido pelo nginx a partir da extensão
+            del response.headers['Content-Type']
+        return response
+
+    try:
+        return send_file(
+            filepath,
+            as_attachment=as_attachment,
+            download_name=download_name,
+            mimetype=mimetype,
+            conditional=True
+        )
+    except FileNotFoundError:
+        # Removido depois de _file_exists ter guardado True
+        with _file_exists_lock:
+            _file_exists_cache.pop(filepath, None)
+        return jsonify({
+            'success': False,
+            'error': 'Arquivo não disponível no servidor'
+        }), 404
 
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+def _local_path(file_info):
+    """Caminho local de um arquivo em downloaded_files (raspadores gravam filepath ou local_path)"""
+    return file_info.get('filepath') or file_info.get('local_path') or ''
 
-        query = "SELECT downloaded_files_json FROM tenders WHERE id = %s"
-        cursor.execute(query, (tender_id,))
+def _fetch_downloaded_files(tender_id):
+    """downloaded_files de uma licitação (None se ela não existir)"""
+    with db_cursor() as cursor:
+        cursor.execute("SELECT downloaded_files_json FROM tenders WHERE id = %s", (tender_id,))
         row = cursor.fetchone()
+    if not row:
+        return None
+    # jsonb já chega decodificado pelo psycopg2
+    return row[0] or []
 
-        if not row:
-            return jsonify({'error': 'Licitação não encontrada'}), 404
+@tender_bp.route('/tenders/<int:tender_id>/files', methods=['GET'])
+def get_tender_files(tender_id):
+    """Lista os arquivos de uma licitação com disponibilidade e link de download"""
+    try:
+        files = _fetch_downloaded_files(tender_id)
+        if files is None:
+            return jsonify({
+                'success': False,
+                'error': 'Licitação não encontrada'
+            }), 404
 
-        # Parse arquivos
-        try:
-            downloaded_files = json.loads(row['downloaded_files_json'] or '[]')
-        except:
-            downloaded_files = []
+        processed_files = []
+        for file_info in files:
+            local_path = _local_path(file_info)
+            filename = file_info.get('filename', 'Arquivo')
+            processed_files.append({
+                'filename': filename,
+                'url': file_info.get('url', ''),
+                'local_path': local_path,
+                'file_size': file_info.get('file_size', 0),
+                'file_type': file_info.get('file_type', 'PDF'),
+                'download_url': f"/api/tenders/{tender_id}/download/{quote(filename)}" if local_path else file_info.get('url', ''),
+                'is_local': bool(local_path),
+                'is_available': bool(local_path and _file_exists(local_path)) or bool(file_info.get('url'))
+            })
 
-        # Buscar arquivo específico
-        target_file = None
-        for file_info in downloaded_files:
-            if file_info.get('filename') == filename:
-                target_file = file_info
-                break
+        return jsonify({
+            'success': True,
+            'files': processed_files,
+            'total_files': len(processed_files)
+        })
 
-        if not target_file:
-            return jsonify({'error': 'Arquivo não encontrado'}), 404
+    except Exception as e:
+        logger.error(f"Error fetching files for tender {tender_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erro ao buscar arquivos'
+        }), 500
 
-        # Verificar se arquivo existe no disco
-        filepath = target_file.get('filepath', '')
-        if not os.path.exists(filepath):
-            return jsonify({'error': 'Arquivo não disponível no servidor'}), 404
+@tender_bp.route('/tenders/<int:tender_id>/pdf', methods=['GET'])
+def get_tender_pdf(tender_id):
+    """Abre o primeiro arquivo da licitação (local ou redirecionando para a URL de origem)"""
+    try:
+        files = _fetch_downloaded_files(tender_id)
+        if files is None:
+            return jsonify({
+                'success': False,
+                'error': 'Licitação não encontrada'
+            }), 404
 
-        cursor.close()
-        conn.close()
+        if not files:
+            return jsonify({
+                'success': False,
+                'error': 'Nenhum PDF disponível para esta licitação'
+            }), 404
 
-        # Enviar arquivo
-        return send_file(
-            filepath,
-            as_attachment=True,
-            download_name=filename
-        )
+        pdf_file = files[0]
+        local_path = _local_path(pdf_file)
+
+        if local_path:
+            if not _file_exists(local_path):
+                return jsonify({
+                    'success': False,
+                    'error': 'Arquivo não disponível no servidor'
+                }), 404
+            return _send_stored_file(
+                local_path,
+                pdf_file.get('filename', 'edital.pdf'),
+                as_attachment=False,
+                mimetype='application/pdf'
+            )
+
+        if pdf_file.get('url'):
+            return redirect(pdf_file['url'])
+
+        return jsonify({
+            'success': False,
+            'error': 'Nenhum caminho ou URL válido para o PDF'
+        }), 404
 
     except Exception as e:
-        logger.error(f"Error downloading file: {e}")
-        return jsonify({'error': 'Erro ao baixar arquivo'}), 500
+        logger.error(f"Error serving PDF for tender {tender_id}: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Erro ao abrir PDF'
+        }), 500
+
+def _run_scraping_in_background(app):
+    """Coleta completa fora da requisição; o resultado fica em _scrape_state"""
+    try:
+        with app.app_context():
+            results = DataScraper().run_full_scraping()
+
+        # Novos dados: agregados e arquivos em cache ficaram velhos
+        _clear_caches()
+        _scrape_state['results'] = results
+    except Exception as e:
+        logger.error(f"Error running scraping: {e}")
+        _scrape_state['results'] = {'errors': [str(e)]}
+    finally:
+        _scrape_state['finished_at'] = datetime.now(timezone.utc).isoformat()
+
+@tender_bp.route('/scrape', methods=['POST'])
+def run_scraping():
+    """Dispara a coleta de dados (PNCP e Querido Diário) em segundo plano"""
+    try:
+        with _scrape_lock:
+            future = _scrape_state.get('future')
+            if future is not None and not future.done():
+                return jsonify({
+                    'success': False,
+                    'error': 'Coleta já em andamento',
+                    'started_at': _scrape_state['started_at']
+                }), 409
+
+            _scrape_state.update(
+                started_at=datetime.now(timezone.utc).isoformat(),
+                finished_at=None,
+                results=None,
+                future=_scrape_executor.submit(_run_scraping_in_background, current_app._get_current_object())
+            )
+
+        return jsonify({
+            'success': True,
+            'status': 'started',
+            'started_at': _scrape_state['started_at'],
+            'status_url': '/api/scrape/status'
+        }), 202
+    except Exception as e:
+        logger.error(f"Error starting scraping: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@tender_bp.route('/scrape/status', methods=['GET'])
+def get_scraping_status():
+    """Situação da última coleta disparada por POST /scrape"""
+    future = _scrape_state.get('future')
+    return jsonify({
+        'success': True,
+        'running': future is not None and not future.done(),
+        'started_at': _scrape_state.get('started_at'),
+        'finished_at': _scrape_state.get('finished_at'),
+        'results': _scrape_state.get('results')
+    })
+
+@tender_bp.route('/health', methods=['GET'])
+def health_check():
+    """Verifica a conexão com o banco e retorna totais básicos"""
+    try:
+        with db_cursor() as cursor:
+            total_tenders = _estimate_total_tenders(cursor)
+            cursor.execute("SELECT COUNT(*) FROM mv_cities")
+            total_cities = cursor.fetchone()[0]
+
+        return jsonify({
+            'success': True,
+            'status': 'healthy',
+            'database': 'connected',
+            'total_tenders': total_tenders,
+            'total_cities': total_cities,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        })
+    except Exception as e:
+        logger.error(f"Health check failed: {e}")
+        return jsonify({
+            'success': False,
+            'status': 'unhealthy',
+            'error': str(e),
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }), 500
+
+def _clear_caches():
+    """Esvazia os caches de respostas e de arquivos deste processo; devolve quantas respostas saíram"""
+    with _response_cache_lock:
+        removed = len(_response_cache)
+        _response_cache.clear()
+    with _file_exists_lock:
+        _file_exists_cache.clear()
+    return removed
 
 # Manter rotas existentes (cities, states, stats, test)
+def cached_response(ttl=RESPONSE_CACHE_TTL):
+    """Guarda o corpo das respostas 200 da rota por ttl segundos e responde com ETag/304
+
+    A chave é a rota e seus argumentos de URL, nunca a query string: as rotas em cache
+    não leem request.args, e ?x=<aleatório> não pode criar uma entrada nova por requisição.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (view.__name__, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with _response_cache_lock:
+                entry = _response_cache.get(key)
+                if entry is not None and now >= entry[0]:
+                    del _response_cache[key]
+                    entry = None
+                elif entry is not None:
+                    _response_cache.move_to_end(key)
+
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response.add_etag()
+                entry = (time.monotonic() + ttl, response.get_data(), response.get_etag()[0])
+                with _response_cache_lock:
+                    _response_cache[key] = entry
+                    _response_cache.move_to_end(key)
+                    while len(_response_cache) > RESPONSE_CACHE_MAXSIZE:
+                        _response_cache.popitem(last=False)
+
+            response = current_app.response_class(entry[1], mimetype='application/json')
+            response.set_etag(entry[2])
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+@tender_bp.route('/cities/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Descarta as respostas em cache (chamar ao fim de cada raspagem)
+
+    Os caches são por processo: a chamada limpa só o worker do gunicorn que a atendeu;
+    nos demais as entradas expiram pelo TTL (no máximo RESPONSE_CACHE_TTL segundos).
+    """
+    if not CACHE_INVALIDATE_TOKEN or request.headers.get('X-Admin-Token') != CACHE_INVALIDATE_TOKEN:
+        return jsonify({
+            'success': False,
+            'error': 'Não autorizado'
+        }), 403
+
+    removed = _clear_caches()
+
+    return jsonify({
+        'success': True,
+        'invalidated': removed
+    })
+
 @tender_bp.route('/cities', methods=['GET'])
+@cached_response()
 def get_cities():
     """Get cities usando psycopg2 diretamente"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        query = """
-        SELECT DISTINCT municipality_name, state_code, municipality_ibge, COUNT(*) as tender_count
-        FROM tenders 
-        WHERE municipality_name IS NOT NULL AND municipality_name != ''
-        GROUP BY municipality_name, state_code, municipality_ibge
-        ORDER BY municipality_name
-        """
-
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-        cities = []
-        for row in rows:
-            city = {
-                'name': row['municipality_name'] or '',
-                'state_code': row['state_code'] or '',
-                'ibge_code': row['municipality_ibge'] or '',
-                'tender_count': row['tender_count'] or 0
-            }
-            cities.append(city)
-
-        cursor.close()
-        conn.close()
+        # Cursor nomeado (server-side) faz streaming do resultado em lotes
+        with db_cursor('cities_stream') as cursor:
+            cursor.itersize = 2000
+
+            # Agregado pré-calculado (criar_views_materializadas.py), atualizado a cada raspagem
+            query = """
+            SELECT municipality_name, state_code, municipality_ibge, tender_count
+            FROM mv_cities
+            ORDER BY municipality_name
+            """
+
+            cursor.execute(query)
+
+            cities = [
+                {
+                    'name': name or '',
+                    'state_code': state or '',
+                    'ibge_code': ibge or '',
+                    'tender_count': count or 0
+                }
+                for name, state, ibge, count in cursor
+            ]
 
         return jsonify({
             'success': True,
@@ -418,37 +789,31 @@ def get_cities():
         }), 500
 
 @tender_bp.route('/states', methods=['GET'])
+@cached_response()
 def get_states():
     """Get states usando psycopg2 diretamente"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        query = """
-        SELECT state_code, COUNT(*) as tender_count
-        FROM tenders 
-        WHERE state_code IS NOT NULL AND state_code != ''
-        GROUP BY state_code
-        ORDER BY state_code
-        """
-
-        cursor.execute(query)
-        rows = cursor.fetchall()
-
-        states = []
-        for row in rows:
-            state = {
-                'code': row['state_code'] or '',
-                'name': row['state_code'] or '',
-                'count': row['tender_count'] or 0
-            }
-            states.append(state)
-
-        cursor.close()
-        conn.close()
+        # Cursor nomeado (server-side) faz streaming do resultado em lotes, como em /cities
+        with db_cursor('states_stream') as cursor:
+            cursor.itersize = 2000
+
+            # Agregado pré-calculado (criar_views_materializadas.py), atualizado a cada raspagem
+            query = """
+            SELECT state_code, tender_count
+            FROM mv_states
+            ORDER BY state_code
+            """
+
+            cursor.execute(query)
+
+            states = [
+                {
+                    'code': code or '',
+                    'name': code or '',
+                    'count': count or 0
+                }
+                for code, count in cursor
+            ]
 
         return jsonify({
             'success': True,
@@ -464,41 +829,22 @@ def get_states():
         }), 500
 
 @tender_bp.route('/stats', methods=['GET'])
+@cached_response(STATS_CACHE_TTL)
 def get_stats():
     """Retorna estatísticas gerais do sistema"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor()
-
-        # Total de licitações
-        cursor.execute("SELECT COUNT(*) FROM tenders")
-        total_tenders = cursor.fetchone()[0]
-
-        # Total de cidades únicas
-        cursor.execute("SELECT COUNT(DISTINCT municipality_name) FROM tenders WHERE municipality_name IS NOT NULL")
-        total_cities = cursor.fetchone()[0]
-
-        # Total de itens (somar items_count)
-        cursor.execute("SELECT COALESCE(SUM(items_count), 0) FROM tenders WHERE items_count IS NOT NULL")
-        total_items = cursor.fetchone()[0]
-
-        # Total de arquivos (somar downloads_count)
-        cursor.execute("SELECT COALESCE(SUM(downloads_count), 0) FROM tenders WHERE downloads_count IS NOT NULL")
-        total_files = cursor.fetchone()[0]
-
-        # Estados únicos
-        cursor.execute("SELECT COUNT(DISTINCT state_code) FROM tenders WHERE state_code IS NOT NULL")
-        total_states = cursor.fetchone()[0]
-
-        # Valor total estimado
-        cursor.execute("SELECT COALESCE(SUM(estimated_value), 0) FROM tenders WHERE estimated_value IS NOT NULL")
-        total_value = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            # Todos os totais em uma só varredura e um só round trip (SUM e COUNT DISTINCT já ignoram NULL)
+            cursor.execute("""
+                SELECT COUNT(*),
+                       COUNT(DISTINCT municipality_name),
+                       COUNT(DISTINCT state_code),
+                       COALESCE(SUM(items_count), 0),
+                       COALESCE(SUM(downloads_count), 0),
+                       COALESCE(SUM(estimated_value), 0)
+                FROM tenders
+            """)
+            total_tenders, total_cities, total_states, total_items, total_files, total_value = cursor.fetchone()
 
         stats = {
             'total_tenders': total_tenders,
@@ -507,7 +853,7 @@ def get_stats():
             'total_files': int(total_files) if total_files else 0,
             'total_states': total_states,
             'total_value': float(total_value) if total_value else 0.0,
-            'formatted_value': f"R$ {float(total_value):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.') if total_value else "R$ 0,00"
+            'formatted_value': _brl(float(total_value)) if total_value else "R$ 0,00"
         }
 
         return jsonify({
@@ -532,19 +878,13 @@ def get_stats():
         }), 500
 
 @tender_bp.route('/test', methods=['GET'])
+@cached_response()
 def test_connection():
     """Test usando psycopg2 diretamente"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM tenders")
-        count = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM tenders")
+            count = cursor.fetchone()[0]
 
         return jsonify({
             'success': True,
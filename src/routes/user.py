@@ -4,53 +4,50 @@ API completa para autenticação de usuários
 """
 
 from flask import Blueprint, request, jsonify
-import psycopg2
-import psycopg2.extras
 import hashlib
+import hmac
 import re
 import logging
 import json
 import os
 from datetime import datetime, timedelta
-from dotenv import load_dotenv
 import secrets
-import string
+import time
 
-load_dotenv()
+from src.db_pool import db_conn
+from src.json_provider import raw_json
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 user_bp = Blueprint('user', __name__)
 
-def get_db_connection():
-    """Cria conexão direta com PostgreSQL"""
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv('DB_HOST'),
-            port=os.getenv('DB_PORT', 5432),
-            database=os.getenv('DB_NAME'),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            client_encoding='utf8'
-        )
-        return conn
-    except Exception as e:
-        logger.error(f"Erro de conexão: {e}")
-        return None
+# Usernames cadastrados/vistos recentemente (por processo): recusa na hora tentativas repetidas
+# sem ir ao banco. O índice único continua sendo a fonte da verdade
+RECENT_USERNAMES_TTL = 60
+RECENT_USERNAMES_MAX = 10000
+_recent_usernames = {}
+
+# Padrões compilados uma única vez no import
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_NON_DIGIT_RE = re.compile(r'[^0-9]')
+
+# Tabela de str.translate que remove tudo de Latin-1 exceto 0-9 (pontuação de CPF/CNPJ)
+_KEEP_DIGITS = str.maketrans('', '', ''.join(chr(c) for c in range(256) if not '0' <= chr(c) <= '9'))
 
 def validate_email(email):
     """Valida formato de email"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return _EMAIL_RE.match(email) is not None
 
 def validate_cnpj_cpf(document):
     """Valida CNPJ ou CPF básico"""
     if not document:
         return True  # Campo opcional
 
-    # Remove caracteres especiais
-    clean_doc = re.sub(r'[^0-9]', '', document)
+    # Remove caracteres especiais (translate em C; regex só se sobrar algo fora de Latin-1)
+    clean_doc = document.translate(_KEEP_DIGITS)
+    if not clean_doc.isascii():
+        clean_doc = _NON_DIGIT_RE.sub('', clean_doc)
 
     # CPF: 11 dígitos
     if len(clean_doc) == 11:
@@ -66,9 +63,43 @@ def hash_password(password):
     """Cria hash da senha"""
     return hashlib.sha256(password.encode()).hexdigest()
 
+def verify_password(password, stored_hash):
+    """Confere a senha com o hash hex armazenado, comparando os bytes em tempo constante"""
+    try:
+        expected = bytes.fromhex(stored_hash)
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(hashlib.sha256(password.encode()).digest(), expected)
+
+def find_existing_user(cursor, username=None, email=None):
+    """Retorna (username_existe, email_existe) em uma única consulta"""
+    # EXISTS para no primeiro registro encontrado (index-only scan nos índices únicos)
+    cursor.execute("""
+        SELECT EXISTS (SELECT 1 FROM users WHERE username = %s),
+               EXISTS (SELECT 1 FROM users WHERE email = %s)
+    """, (username, email))
+    return tuple(cursor.fetchone())
+
+def remember_username(username):
+    """Registra um username como já existente por RECENT_USERNAMES_TTL segundos"""
+    if len(_recent_usernames) >= RECENT_USERNAMES_MAX:
+        _recent_usernames.clear()
+    _recent_usernames[username] = time.monotonic() + RECENT_USERNAMES_TTL
+
+def is_recent_username(username):
+    """True se o username foi cadastrado/visto há menos de RECENT_USERNAMES_TTL segundos"""
+    expires = _recent_usernames.get(username)
+    if expires is None:
+        return False
+    if time.monotonic() >= expires:
+        _recent_usernames.pop(username, None)
+        return False
+    return True
+
 def generate_reset_token():
     """Gera token para reset de senha"""
-    return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
+    # 24 bytes aleatórios em uma chamada -> 32 caracteres URL-safe
+    return secrets.token_urlsafe(24)
 
 @user_bp.route('/register', methods=['POST'])
 def register_user():
@@ -106,66 +137,66 @@ def register_user():
                 'error': 'CNPJ/CPF inválido'
             }), 400
 
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # Verificar se username já existe
-        cursor.execute("SELECT id FROM users WHERE username = %s", (data['username'],))
-        if cursor.fetchone():
+        # Username sabidamente em uso: responde sem hash de senha nem round trip ao banco
+        if is_recent_username(data['username']):
             return jsonify({
                 'success': False,
                 'error': 'Nome de usuário já existe'
             }), 400
 
-        # Verificar se email já existe
-        cursor.execute("SELECT id FROM users WHERE email = %s", (data['email'],))
-        if cursor.fetchone():
-            return jsonify({
-                'success': False,
-                'error': 'Email já cadastrado'
-            }), 400
+        with db_conn() as conn, conn.cursor() as cursor:
+            # Criar hash da senha
+            password_hash = hash_password(data['password'])
+
+            # Inserir usuário; os índices únicos de username e email garantem a unicidade
+            # (criar_indices_postgresql.py), sem SELECT prévio nem corrida entre cadastros.
+            # Colunas de controle explícitas: não dependem dos DEFAULTs de definir_padroes_users.py
+            # (sem eles is_active ficaria NULL e o login, que filtra is_active = true, recusaria o usuário)
+            insert_query = """
+                INSERT INTO users (
+                    username, email, password_hash, full_name, phone, company_name,
+                    cnpj_cpf, address, city, state, zip_code, user_type,
+                    is_active, email_verified, created_at, updated_at
+                ) VALUES (
+                    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                    true, false, now(), now()
+                )
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """
+
+            cursor.execute(insert_query, (
+                data['username'],
+                data['email'],
+                password_hash,
+                data['full_name'],
+                data.get('phone', ''),
+                data.get('company_name', ''),
+                data.get('cnpj_cpf', ''),
+                data.get('address', ''),
+                data.get('city', ''),
+                data.get('state', ''),
+                data.get('zip_code', ''),
+                data.get('user_type', 'individual')
+            ))
+
+            row = cursor.fetchone()
+
+            if not row:
+                # Conflito: uma consulta só para dizer qual campo já existe
+                username_exists, _ = find_existing_user(cursor, data['username'], data['email'])
+                if username_exists:
+                    remember_username(data['username'])
+                return jsonify({
+                    'success': False,
+                    'error': 'Nome de usuário já existe' if username_exists else 'Email já cadastrado'
+                }), 400
+
+            user_id = row[0]
 
-        # Criar hash da senha
-        password_hash = hash_password(data['password'])
-
-        # Inserir usuário
-        insert_query = """
-            INSERT INTO users (
-                username, email, password_hash, full_name, phone, company_name,
-                cnpj_cpf, address, city, state, zip_code, user_type,
-                is_active, email_verified, created_at, updated_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            ) RETURNING id
-        """
-
-        cursor.execute(insert_query, (
-            data['username'],
-            data['email'],
-            password_hash,
-            data['full_name'],
-            data.get('phone', ''),
-            data.get('company_name', ''),
-            data.get('cnpj_cpf', ''),
-            data.get('address', ''),
-            data.get('city', ''),
-            data.get('state', ''),
-            data.get('zip_code', ''),
-            data.get('user_type', 'individual'),
-            True,  # is_active
-            False,  # email_verified
-            datetime.now(),
-            datetime.now()
-        ))
-
-        user_id = cursor.fetchone()['id']
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+
+        remember_username(data['username'])
 
         logger.info(f"Usuário cadastrado: {data['username']} (ID: {user_id})")
 
@@ -194,63 +225,59 @@ def login_user():
                 'error': 'Nome de usuário/email e senha são obrigatórios'
             }), 400
 
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        # Buscar usuário por username ou email
-        cursor.execute("""
-            SELECT id, username, email, full_name, phone, company_name, user_type,
-                   is_active, email_verified, password_hash, created_at, last_login
-            FROM users 
-            WHERE (username = %s OR email = %s) AND is_active = true
-        """, (data['username'], data['username']))
+        with db_conn() as conn, conn.cursor() as cursor:
+            # Buscar usuário por username ou email
+            cursor.execute("""
+                SELECT id, username, email, full_name, phone, company_name, user_type,
+                       is_active, email_verified, password_hash, created_at, last_login
+                FROM users 
+                WHERE (username = %s OR email = %s) AND is_active = true
+            """, (data['username'], data['username']))
 
-        user = cursor.fetchone()
+            row = cursor.fetchone()
 
-        if not user:
-            logger.warning(f"Tentativa de login com usuário inexistente: {data['username']}")
-            return jsonify({
-                'success': False,
-                'error': 'Usuário não encontrado'
-            }), 401
+            if not row:
+                logger.warning(f"Tentativa de login com usuário inexistente: {data['username']}")
+                return jsonify({
+                    'success': False,
+                    'error': 'Usuário não encontrado'
+                }), 401
 
-        # Verificar senha
-        password_hash = hash_password(data['password'])
-        if password_hash != user['password_hash']:
-            logger.warning(f"Tentativa de login com senha incorreta: {user['username']}")
-            return jsonify({
-                'success': False,
-                'error': 'Senha incorreta'
-            }), 401
+            # Tupla posicional na ordem do SELECT (sem dict por linha)
+            (user_id, username, email, full_name, phone, company_name, user_type,
+             is_active, email_verified, password_hash, created_at, last_login) = row
 
-        # Atualizar último login
-        cursor.execute(
-            "UPDATE users SET last_login = %s WHERE id = %s",
-            (datetime.now(), user['id'])
-        )
-        conn.commit()
+            # Verificar senha
+            if not verify_password(data['password'], password_hash):
+                logger.warning(f"Tentativa de login com senha incorreta: {username}")
+                return jsonify({
+                    'success': False,
+                    'error': 'Senha incorreta'
+                }), 401
 
-        cursor.close()
-        conn.close()
+            # Atualizar último login (o mesmo instante vai para o banco e para a resposta)
+            now = datetime.now()
+            cursor.execute(
+                "UPDATE users SET last_login = %s WHERE id = %s",
+                (now, user_id)
+            )
+            conn.commit()
 
         # Preparar dados do usuário para resposta (sem senha)
         user_data = {
-            'id': user['id'],
-            'username': user['username'],
-            'email': user['email'],
-            'full_name': user['full_name'],
-            'phone': user['phone'],
-            'company_name': user['company_name'],
-            'user_type': user['user_type'],
-            'email_verified': user['email_verified'],
-            'created_at': user['created_at'].isoformat() if user['created_at'] else None,
-            'last_login': datetime.now().isoformat()
+            'id': user_id,
+            'username': username,
+            'email': email,
+            'full_name': full_name,
+            'phone': phone,
+            'company_name': company_name,
+            'user_type': user_type,
+            'email_verified': email_verified,
+            'created_at': created_at.isoformat() if created_at else None,
+            'last_login': now.isoformat()
         }
 
-        logger.info(f"Login realizado com sucesso: {user['username']} (ID: {user['id']})")
+        logger.info(f"Login realizado com sucesso: {username} (ID: {user_id})")
 
         return jsonify({
             'success': True,
@@ -269,43 +296,32 @@ def login_user():
 def get_user_profile(user_id):
     """Busca perfil completo do usuário"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-
-        cursor.execute("""
-            SELECT id, username, email, full_name, phone, company_name,
-                   cnpj_cpf, address, city, state, zip_code, user_type,
-                   is_active, email_verified, created_at, last_login, updated_at
-            FROM users 
-            WHERE id = %s AND is_active = true
-        """, (user_id,))
-
-        user = cursor.fetchone()
-
-        if not user:
-            return jsonify({
-                'success': False,
-                'error': 'Usuário não encontrado'
-            }), 404
-
-        cursor.close()
-        conn.close()
-
-        # Converter para dict e formatar datas
-        user_data = dict(user)
-        if user_data['created_at']:
-            user_data['created_at'] = user_data['created_at'].isoformat()
-        if user_data['last_login']:
-            user_data['last_login'] = user_data['last_login'].isoformat()
-        if user_data['updated_at']:
-            user_data['updated_at'] = user_data['updated_at'].isoformat()
+        with db_conn(autocommit=True) as conn, conn.cursor() as cursor:
+            # O PostgreSQL monta o JSON do perfil (timestamps já em ISO 8601) e ele segue
+            # para a resposta como texto, sem dict nem isoformat() no Python
+            cursor.execute("""
+                SELECT json_build_object(
+                    'id', id, 'username', username, 'email', email, 'full_name', full_name,
+                    'phone', phone, 'company_name', company_name, 'cnpj_cpf', cnpj_cpf,
+                    'address', address, 'city', city, 'state', state, 'zip_code', zip_code,
+                    'user_type', user_type, 'is_active', is_active, 'email_verified', email_verified,
+                    'created_at', created_at, 'last_login', last_login, 'updated_at', updated_at
+                )::text
+                FROM users 
+                WHERE id = %s AND is_active = true
+            """, (user_id,))
+
+            row = cursor.fetchone()
+
+            if not row:
+                return jsonify({
+                    'success': False,
+                    'error': 'Usuário não encontrado'
+                }), 404
 
         return jsonify({
             'success': True,
-            'user': user_data
+            'user': raw_json(row[0])
         })
 
     except Exception as e:
@@ -321,26 +337,17 @@ def check_availability():
     try:
         data = request.get_json()
 
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor()
-
-        result = {'available': True, 'message': ''}
+        with db_conn(autocommit=True) as conn, conn.cursor() as cursor:
+            result = {'available': True, 'message': ''}
 
-        if data.get('username'):
-            cursor.execute("SELECT id FROM users WHERE username = %s", (data['username'],))
-            if cursor.fetchone():
-                result = {'available': False, 'message': 'Nome de usuário já existe'}
-
-        if data.get('email') and result['available']:
-            cursor.execute("SELECT id FROM users WHERE email = %s", (data['email'],))
-            if cursor.fetchone():
-                result = {'available': False, 'message': 'Email já cadastrado'}
-
-        cursor.close()
-        conn.close()
+            if data.get('username') or data.get('email'):
+                username_exists, email_exists = find_existing_user(
+                    cursor, data.get('username') or None, data.get('email') or None
+                )
+                if username_exists:
+                    result = {'available': False, 'message': 'Nome de usuário já existe'}
+                elif email_exists:
+                    result = {'available': False, 'message': 'Email já cadastrado'}
 
         return jsonify({
             'success': True,
@@ -385,35 +392,28 @@ def forgot_password():
                 'error': 'Email é obrigatório'
             }), 400
 
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor()
+        with db_conn(autocommit=True) as conn, conn.cursor() as cursor:
+            # Verificar se email existe
+            cursor.execute("SELECT 1 FROM users WHERE email = %s AND is_active = true LIMIT 1", (data['email'],))
+            email_exists = cursor.fetchone()
 
-        # Verificar se email existe
-        cursor.execute("SELECT id FROM users WHERE email = %s AND is_active = true", (data['email'],))
-        user = cursor.fetchone()
-
-        if not user:
-            # Por segurança, sempre retorna sucesso mesmo se email não existir
-            return jsonify({
-                'success': True,
-                'message': 'Se o email existir, você receberá instruções para reset da senha'
-            })
-
-        # Gerar token de reset (implementação futura)
-        reset_token = generate_reset_token()
-        expires_at = datetime.now() + timedelta(hours=1)
+            if not email_exists:
+                # Por segurança, sempre retorna sucesso mesmo se email não existir
+                return jsonify({
+                    'success': True,
+                    'message': 'Se o email existir, você receberá instruções para reset da senha'
+                })
 
-        # Salvar token no banco (implementação futura)
-        # cursor.execute(
-        #     "INSERT INTO password_reset_tokens (user_id, token, expires_at) VALUES (%s, %s, %s)",
-        #     (user[0], reset_token, expires_at)
-        # )
+            # Gerar token de reset (implementação futura)
+            reset_token = generate_reset_token()
+            expires_at = datetime.now() + timedelta(hours=1)
 
-        cursor.close()
-        conn.close()
+            # Salvar token no banco (implementação futura)
+            # cursor.execute(
+            #     "INSERT INTO password_reset_tokens (user_id, token, expires_at) "
+            #     "SELECT id, %s, %s FROM users WHERE email = %s",
+            #     (reset_token, expires_at, data['email'])
+            # )
 
         # Aqui seria enviado o email com o token (implementação futura)
         logger.info(f"Reset de senha solicitado para: {data['email']}")
@@ -434,43 +434,24 @@ def forgot_password():
 def get_user_stats():
     """Estatísticas de usuários"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor()
-
-        # Total de usuários
-        cursor.execute("SELECT COUNT(*) FROM users WHERE is_active = true")
-        total_users = cursor.fetchone()[0]
-
-        # Usuários por tipo
-        cursor.execute("""
-            SELECT user_type, COUNT(*) 
-            FROM users 
-            WHERE is_active = true 
-            GROUP BY user_type
-        """)
-        users_by_type = dict(cursor.fetchall())
-
-        # Usuários cadastrados hoje
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM users 
-            WHERE DATE(created_at) = CURRENT_DATE AND is_active = true
-        """)
-        users_today = cursor.fetchone()[0]
-
-        # Usuários cadastrados esta semana
-        cursor.execute("""
-            SELECT COUNT(*) 
-            FROM users 
-            WHERE created_at >= CURRENT_DATE - INTERVAL '7 days' AND is_active = true
-        """)
-        users_this_week = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
+        with db_conn(autocommit=True) as conn, conn.cursor() as cursor:
+            # Total, hoje, esta semana (agregados condicionais) e usuários por tipo, este já
+            # agregado em jsonb pelo servidor: uma única consulta, um único snapshot
+            cursor.execute("""
+                SELECT COUNT(*),
+                       COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE
+                                          AND created_at < CURRENT_DATE + INTERVAL '1 day'),
+                       COUNT(*) FILTER (WHERE created_at >= CURRENT_DATE - INTERVAL '7 days'),
+                       (SELECT jsonb_object_agg(COALESCE(user_type, 'null'), n)
+                        FROM (SELECT user_type, COUNT(*) AS n
+                              FROM users
+                              WHERE is_active = true
+                              GROUP BY user_type) AS by_type)
+                FROM users
+                WHERE is_active = true
+            """)
+            total_users, users_today, users_this_week, users_by_type = cursor.fetchone()
+            users_by_type = users_by_type or {}
 
         return jsonify({
             'success': True,
@@ -493,16 +474,9 @@ def get_user_stats():
 def test_user_api():
     """Testa conexão da API de usuários"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            raise Exception("Erro de conexão com banco")
-
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM users")
-        count = cursor.fetchone()[0]
-
-        cursor.close()
-        conn.close()
+        with db_conn(autocommit=True) as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM users")
+            count = cursor.fetchone()[0]
 
         return jsonify({
             'success': True,
@@ -1,6 +1,14 @@
+import csv
+import io
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date
 from typing import List, Dict, Optional
+from flask import current_app
+from psycopg2.extensions import get_wait_callback
+from psycopg2.extras import Json, execute_values
+from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 
 from src.services.pncp_client import PNCPClient
@@ -10,6 +18,26 @@ from src.models.tender import Tender, City
 
 logger = logging.getLogger(__name__)
 
+# Tenders per multi-row INSERT in save_tenders_bulk
+BULK_INSERT_PAGE_SIZE = 1000
+
+# Batches at least this large go through COPY into a staging table instead of INSERT ... VALUES
+BULK_COPY_THRESHOLD = 500
+
+# NULL marker of the CSV fed to COPY (empty fields stay empty strings, e.g. title)
+_COPY_NULL = '\\N'
+
+# Columns written by save_tenders_bulk, in the order of _tender_row
+_BULK_TENDER_COLUMNS = (
+    'pncp_id', 'title', 'description', 'organization_name', 'organization_cnpj',
+    'municipality_name', 'municipality_ibge', 'state_code', 'publication_date',
+    'update_date', 'status', 'modality', 'estimated_value', 'source_url',
+    'downloaded_files', 'data_source', 'created_at'
+)
+
+# Materialized aggregates over tenders read by /cities, /states and /health (criar_views_materializadas.py)
+AGGREGATE_VIEWS = ('mv_cities', 'mv_states')
+
 class DataScraper:
     """Main data scraper service that coordinates PNCP and Querido Diário APIs"""
     
@@ -23,6 +51,12 @@ class DataScraper:
             {'ibge_code': '3509502', 'name': 'Campinas', 'state_code': 'SP', 'state_name': 'São Paulo'},
             {'ibge_code': '2927408', 'name': 'Salvador', 'state_code': 'BA', 'state_name': 'Bahia'}
         ]
+        
+        # IBGE codes of the target cities, built once for every scrape/stats call
+        self.ibge_codes = tuple(city['ibge_code'] for city in self.target_cities)
+        
+        # Failures of the current run (batches not saved, sources that failed)
+        self.errors: List[str] = []
     
     def initialize_cities(self):
         """Initialize target cities in the database"""
@@ -109,6 +143,158 @@ class DataScraper:
             db.session.rollback()
             return None
     
+    @staticmethod
+    def _tender_row(tender_data: Dict, created_at: datetime) -> tuple:
+        """Build the INSERT tuple for a tender, truncated like save_tender_to_db"""
+        return (
+            tender_data.get('pncp_id'),
+            tender_data.get('title', '')[:500],
+            tender_data.get('description', ''),
+            tender_data.get('organization_name', '')[:200],
+            tender_data.get('organization_cnpj'),
+            tender_data.get('municipality_name', '')[:100],
+            tender_data.get('municipality_ibge'),
+            tender_data.get('state_code'),
+            tender_data.get('publication_date'),
+            tender_data.get('update_date'),
+            tender_data.get('status', '')[:50],
+            tender_data.get('modality', '')[:100],
+            tender_data.get('estimated_value'),
+            tender_data.get('source_url'),
+            Json(tender_data.get('downloaded_files', [])),
+            tender_data.get('data_source', 'UNKNOWN'),
+            created_at
+        )
+    
+    @staticmethod
+    def _copy_tender_rows(cursor, rows: List[tuple]) -> List[tuple]:
+        """
+        Insert rows via COPY FROM STDIN into a temporary staging table, then move them to tenders
+        
+        Returns:
+            The RETURNING id rows of the tenders actually inserted
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                _COPY_NULL if value is None
+                else json.dumps(value.adapted) if isinstance(value, Json)
+                else value
+                for value in row
+            ])
+        buffer.seek(0)
+        
+        columns = ', '.join(_BULK_TENDER_COLUMNS)
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS tenders_stage "
+            "(LIKE tenders INCLUDING DEFAULTS) ON COMMIT DROP"
+        )
+        cursor.copy_expert(
+            f"COPY tenders_stage ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{_COPY_NULL}')",
+            buffer
+        )
+        cursor.execute(
+            f"INSERT INTO tenders ({columns}) SELECT {columns} FROM tenders_stage "
+            "ON CONFLICT (pncp_id) DO NOTHING RETURNING id"
+        )
+        return cursor.fetchall()
+    
+    def get_existing_pncp_ids(self, ibge_codes: List[str]) -> set:
+        """
+        Load the pncp_ids already stored for the given cities in one query
+        
+        Args:
+            ibge_codes: IBGE codes of the scraped cities
+            
+        Returns:
+            Set of existing pncp_ids
+        """
+        result = db.session.execute(
+            text("SELECT pncp_id FROM tenders WHERE municipality_ibge = ANY(:codes) AND pncp_id IS NOT NULL"),
+            {'codes': list(ibge_codes)}
+        )
+        return {row[0] for row in result}
+    
+    def save_tenders_bulk(self, tenders: List[Dict], existing: Optional[set] = None) -> int:
+        """
+        Save a batch of tenders in a single transaction: multi-row INSERTs, or COPY
+        through a staging table for batches of BULK_COPY_THRESHOLD tenders or more
+        (only when psycopg2 has no wait callback installed)
+        
+        Raises:
+            Exception: Any database error, after rolling the batch back
+        
+        Args:
+            tenders: Parsed tender data
+            existing: pncp_ids already stored (see get_existing_pncp_ids); queried if omitted
+            
+        Returns:
+            Number of tenders inserted
+        """
+        if not tenders:
+            return 0
+        
+        try:
+            # Raw psycopg2 cursor from the session's connection (same transaction as the ORM)
+            cursor = db.session.connection().connection.cursor()
+            
+            try:
+                if existing is not None:
+                    # Copy: ids added below must not leak into the caller's set
+                    existing = set(existing)
+                else:
+                    # One round trip to find which tenders are already stored
+                    existing = set()
+                    pncp_ids = [t['pncp_id'] for t in tenders if t.get('pncp_id')]
+                    if pncp_ids:
+                        cursor.execute(
+                            "SELECT pncp_id FROM tenders WHERE pncp_id = ANY(%s)",
+                            (pncp_ids,)
+                        )
+                        existing = {row[0] for row in cursor}
+                
+                created_at = datetime.utcnow()
+                rows = []
+                for tender_data in tenders:
+                    pncp_id = tender_data.get('pncp_id')
+                    if pncp_id:
+                        if pncp_id in existing:
+                            continue
+                        # Also drops repeated ids within the batch itself
+                        existing.add(pncp_id)
+                    rows.append(self._tender_row(tender_data, created_at))
+                
+                if not rows:
+                    logger.debug("No new tenders to save")
+                    return 0
+                
+                # ON CONFLICT covers tenders inserted concurrently since the SELECT above.
+                # COPY is unsupported in green mode (psycogreen in the gevent worker)
+                if len(rows) >= BULK_COPY_THRESHOLD and get_wait_callback() is None:
+                    inserted = self._copy_tender_rows(cursor, rows)
+                else:
+                    inserted = execute_values(
+                        cursor,
+                        f"INSERT INTO tenders ({', '.join(_BULK_TENDER_COLUMNS)}) VALUES %s "
+                        "ON CONFLICT (pncp_id) DO NOTHING RETURNING id",
+                        rows,
+                        page_size=BULK_INSERT_PAGE_SIZE,
+                        fetch=True
+                    )
+            finally:
+                cursor.close()
+            
+            db.session.commit()
+            
+            logger.debug(f"Saved {len(inserted)} tenders in bulk")
+            return len(inserted)
+            
+        except Exception as e:
+            logger.error(f"Error saving tenders in bulk ({len(tenders)} tenders): {e}")
+            db.session.rollback()
+            raise
+    
     def scrape_pncp_data(self) -> int:
         """
         Scrape tender data from PNCP API
@@ -120,23 +306,25 @@ class DataScraper:
         saved_count = 0
         
         try:
-            # Get IBGE codes for target cities
-            ibge_codes = [city['ibge_code'] for city in self.target_cities]
+            ibge_codes = self.ibge_codes
             
-            # Fetch tenders from PNCP
-            tenders_data = self.pncp_client.fetch_tenders_for_cities(ibge_codes)
+            # Tenders already stored for these cities, loaded once instead of per tender
+            existing = self.get_existing_pncp_ids(ibge_codes)
             
-            # Save tenders to database
-            for tender_data in tenders_data:
-                tender = self.save_tender_to_db(tender_data)
-                if tender:
-                    saved_count += 1
+            # Save each city's tenders as soon as it arrives, while the other cities are still fetched
+            for tenders_data in self.pncp_client.iter_city_tenders(ibge_codes):
+                try:
+                    saved_count += self.save_tenders_bulk(tenders_data, existing)
+                except Exception as e:
+                    # The other cities are still saved; the failure is reported by run_full_scraping
+                    self.errors.append(f"PNCP batch of {len(tenders_data)} tenders not saved: {e}")
             
             logger.info(f"PNCP scraping completed. Saved {saved_count} tenders")
             return saved_count
             
         except Exception as e:
             logger.error(f"Error during PNCP scraping: {e}")
+            self.errors.append(f"PNCP scraping failed: {e}")
             return saved_count
     
     def scrape_querido_diario_data(self) -> int:
@@ -150,25 +338,31 @@ class DataScraper:
         saved_count = 0
         
         try:
-            # Get IBGE codes for target cities
-            ibge_codes = [city['ibge_code'] for city in self.target_cities]
+            ibge_codes = self.ibge_codes
+            
+            # Tenders already stored for these cities, loaded once instead of per tender
+            existing = self.get_existing_pncp_ids(ibge_codes)
             
             # Fetch tenders from Querido Diário
             tenders_data = self.qd_client.fetch_tenders_for_cities(ibge_codes)
             
             # Save tenders to database
-            for tender_data in tenders_data:
-                tender = self.save_tender_to_db(tender_data)
-                if tender:
-                    saved_count += 1
+            saved_count = self.save_tenders_bulk(tenders_data, existing)
             
             logger.info(f"Querido Diário scraping completed. Saved {saved_count} tenders")
             return saved_count
             
         except Exception as e:
             logger.error(f"Error during Querido Diário scraping: {e}")
+            self.errors.append(f"Querido Diário scraping failed: {e}")
             return saved_count
     
+    @staticmethod
+    def _run_in_app_context(app, func):
+        """Run func inside a fresh app context (for worker threads)"""
+        with app.app_context():
+            return func()
+    
     def run_full_scraping(self) -> Dict[str, int]:
         """
         Run complete data scraping from both sources
@@ -185,28 +379,46 @@ class DataScraper:
             'errors': []
         }
         
+        self.errors = []
+        
         try:
             # Initialize cities
             self.initialize_cities()
             
-            # Scrape PNCP data
-            try:
-                results['pncp_count'] = self.scrape_pncp_data()
-            except Exception as e:
-                error_msg = f"PNCP scraping failed: {e}"
-                logger.error(error_msg)
-                results['errors'].append(error_msg)
+            # Both sources are independent and I/O-bound: scrape them concurrently.
+            # Each thread runs in its own app context, so it gets its own session/transaction
+            app = current_app._get_current_object()
+            sources = {
+                'pncp_count': ('PNCP', self.scrape_pncp_data),
+                'querido_diario_count': ('Querido Diário', self.scrape_querido_diario_data)
+            }
             
-            # Scrape Querido Diário data
-            try:
-                results['querido_diario_count'] = self.scrape_querido_diario_data()
-            except Exception as e:
-                error_msg = f"Querido Diário scraping failed: {e}"
-                logger.error(error_msg)
-                results['errors'].append(error_msg)
+            with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+                futures = {
+                    executor.submit(self._run_in_app_context, app, scrape): key
+                    for key, (_, scrape) in sources.items()
+                }
+                
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        results[key] = future.result()
+                    except Exception as e:
+                        error_msg = f"{sources[key][0]} scraping failed: {e}"
+                        logger.error(error_msg)
+                        results['errors'].append(error_msg)
             
+            results['errors'].extend(self.errors)
             results['total_count'] = results['pncp_count'] + results['querido_diario_count']
             
+            if results['total_count']:
+                try:
+                    self.refresh_aggregate_views()
+                except Exception as e:
+                    error_msg = f"Aggregate views refresh failed: {e}"
+                    logger.error(error_msg)
+                    results['errors'].append(error_msg)
+            
             logger.info(f"Full scraping completed. Total: {results['total_count']} tenders")
             return results
             
@@ -216,6 +428,18 @@ class DataScraper:
             results['errors'].append(error_msg)
             return results
     
+    @staticmethod
+    def refresh_aggregate_views():
+        """Recompute AGGREGATE_VIEWS after new tenders are saved (CONCURRENTLY: reads are not blocked)"""
+        try:
+            for view in AGGREGATE_VIEWS:
+                db.session.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+            db.session.commit()
+            logger.info(f"Refreshed aggregate views: {', '.join(AGGREGATE_VIEWS)}")
+        except Exception:
+            db.session.rollback()
+            raise
+    
     def get_scraping_stats(self) -> Dict:
         """
         Get statistics about scraped data
@@ -224,24 +448,32 @@ class DataScraper:
             Dict with statistics
         """
         try:
-            total_tenders = Tender.query.count()
-            pncp_tenders = Tender.query.filter_by(data_source='PNCP').count()
-            qd_tenders = Tender.query.filter_by(data_source='QUERIDO_DIARIO').count()
-            
-            # Get tenders by city
-            city_stats = []
-            for city in self.target_cities:
-                city_count = Tender.query.filter_by(municipality_ibge=city['ibge_code']).count()
-                city_stats.append({
+            # Totals by source and this month's tenders in a single scan
+            total_tenders, pncp_tenders, qd_tenders, recent_tenders = db.session.execute(
+                text("""
+                    SELECT COUNT(*),
+                           COUNT(*) FILTER (WHERE data_source = 'PNCP'),
+                           COUNT(*) FILTER (WHERE data_source = 'QUERIDO_DIARIO'),
+                           COUNT(*) FILTER (WHERE publication_date >= :month_start)
+                    FROM tenders
+                """),
+                {'month_start': date.today().replace(day=1)}
+            ).one()
+            
+            # Get tenders by city (one GROUP BY instead of a COUNT per city)
+            city_counts = dict(db.session.execute(
+                text("SELECT municipality_ibge, COUNT(*) FROM tenders "
+                     "WHERE municipality_ibge = ANY(:codes) GROUP BY municipality_ibge"),
+                {'codes': list(self.ibge_codes)}
+            ).all())
+            city_stats = [
+                {
                     'city': city['name'],
                     'ibge_code': city['ibge_code'],
-                    'tender_count': city_count
-                })
-            
-            # Get recent tenders
-            recent_tenders = Tender.query.filter(
-                Tender.publication_date >= date.today().replace(day=1)
-            ).count()
+                    'tender_count': city_counts.get(city['ibge_code'], 0)
+                }
+                for city in self.target_cities
+            ]
             
             return {
                 'total_tenders': total_tenders,
@@ -1,8 +1,13 @@
 import os
 import re
 import json
+import atexit
 import logging
-from typing import Dict, List, Optional, Tuple
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
 from decimal import Decimal
 
@@ -13,52 +18,309 @@ except ImportError:
     print("ERRO: Dependências de PDF não instaladas. Execute: pip install PyMuPDF pdfplumber")
     exit(1)
 
+try:
+    import hyperscan  # Opcional: pré-filtro DFA (tempo linear) dos campos de varredura
+except ImportError:
+    hyperscan = None
+
 logger = logging.getLogger(__name__)
 
+# Campos sem literal fixo (classes de caracteres), pré-filtrados pelo hyperscan quando disponível
+SCANNER_FIELDS = ('email', 'telefone', 'endereco')
+
+# Páginas do PyMuPDF com fração de caracteres imprimíveis abaixo disto (ou vazias)
+# são reextraídas com o pdfplumber
+MIN_PAGE_TEXT_QUALITY = 0.9
+
+# Extração do PyMuPDF só de texto: sem blocos de imagem (nem seus placeholders)
+PYMUPDF_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_IMAGES
+
+# Tamanho do text_preview devolvido na análise
+TEXT_PREVIEW_CHARS = 500
+
+# Os metadados do edital ficam nas primeiras páginas: a leitura para depois de tantas
+# páginas, ou antes se todos os campos já tiverem match (0 = documento inteiro)
+MAX_PAGES_FOR_METADATA = int(os.getenv('PDF_MAX_PAGES_FOR_METADATA', 10))
+
+# Regexes combinadas mantidas por analisador (uma por conjunto de campos candidatos)
+COMBINED_PATTERN_CACHE_SIZE = 256
+
+# Processos usados na análise em lote (PDF é CPU-bound); 1 = sequencial
+PDF_ANALYSIS_WORKERS = int(os.getenv('PDF_ANALYSIS_WORKERS', os.cpu_count() or 1))
+
+# Palavras-chave das colunas de itens, na ordem de prioridade: o primeiro termo
+# contido no cabeçalho define o campo da coluna
+COL_KEYWORDS = (
+    ('item', 'numero'), ('número', 'numero'), ('nº', 'numero'),
+    ('descrição', 'descricao'), ('objeto', 'descricao'), ('especificação', 'descricao'),
+    ('quantidade', 'quantidade'), ('qtd', 'quantidade'), ('qtde', 'quantidade'),
+    ('unitário', 'valor_unitario'), ('unit', 'valor_unitario'),
+    ('total', 'valor_total'), ('valor total', 'valor_total'),
+    ('unidade', 'unidade'), ('un', 'unidade'), ('medida', 'unidade'),
+)
+
+# Primeiro número de um valor monetário: com separador de milhar (1.234.567,89),
+# o ponto é milhar; sem ele (1234,56 / 12.50 / 100), o separador único é decimal
+_MONEY_RE = re.compile(r'(?P<milhar>\d{1,3}(?:\.\d{3})+(?:,\d+)?)|\d+(?:[.,]\d+)?', re.ASCII)
+
+# Data dd/mm/aaaa (ou com hífen), comum aos padrões de data e à sua normalização
+DATE_PATTERN = r'\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4}'
+_DATE_NORM = re.compile(r'(\d{1,2})[\/\-](\d{1,2})[\/\-](\d{2,4})', re.ASCII)
+
 class PDFAnalyzer:
     """Serviço para análise semântica de PDFs de editais"""
     
     def __init__(self):
+        # Padrões compilados uma vez por processo e compartilhados (somente leitura)
         self.patterns = self._init_patterns()
+        self.literals = self._init_literals()
+        self.scanner_db = self._build_scanner_db()
+        # Scratch do hyperscan não pode ser usado por duas varreduras ao mesmo tempo: um por thread
+        self._scanner_local = threading.local()
+        # Regex combinada por conjunto de campos candidatos (ver _combined_for)
+        self._combined_cache = {}
     
-    def _init_patterns(self) -> Dict[str, re.Pattern]:
-        """Inicializa padrões regex para extração de dados"""
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _init_patterns() -> Dict[str, re.Pattern]:
+        """
+        Inicializa padrões regex para extração de dados
+        
+        Os padrões são aplicados ao texto já em minúsculas (ver _lower_text), por isso
+        têm literais minúsculos e dispensam re.IGNORECASE (case folding a cada comparação)
+        
+        re.ASCII (\\d só com 0-9, sem consulta às tabelas Unicode) vai nos padrões cuja
+        única classe é \\d; os que usam \\s ou \\w continuam Unicode, pois o texto dos
+        PDFs traz espaço não separável (\\xa0) e letras acentuadas
+        """
         return {
             # Valores monetários
-            'valor_estimado': re.compile(r'valor\s+(?:estimado|total|global|máximo)[\s:]*R?\$?\s*([\d.,]+)', re.IGNORECASE),
-            'valor_unitario': re.compile(r'valor\s+unitário[\s:]*R?\$?\s*([\d.,]+)', re.IGNORECASE),
-            'valor_total': re.compile(r'valor\s+total[\s:]*R?\$?\s*([\d.,]+)', re.IGNORECASE),
+            'valor_estimado': re.compile(r'valor\s+(?:estimado|total|global|máximo)[\s:]*r?\$?\s*([\d.,]+)'),
+            'valor_unitario': re.compile(r'valor\s+unitário[\s:]*r?\$?\s*([\d.,]+)'),
+            'valor_total': re.compile(r'valor\s+total[\s:]*r?\$?\s*([\d.,]+)'),
             
             # Datas
-            'data_abertura': re.compile(r'(?:data|abertura).*?(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})', re.IGNORECASE),
-            'data_entrega': re.compile(r'(?:prazo|entrega|execução).*?(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})', re.IGNORECASE),
-            'data_publicacao': re.compile(r'(?:publicado|publicação).*?(\d{1,2}[\/\-]\d{1,2}[\/\-]\d{2,4})', re.IGNORECASE),
+            'data_abertura': re.compile(r'(?:data|abertura).*?(' + DATE_PATTERN + ')', re.ASCII),
+            'data_entrega': re.compile(r'(?:prazo|entrega|execução).*?(' + DATE_PATTERN + ')', re.ASCII),
+            'data_publicacao': re.compile(r'(?:publicado|publicação).*?(' + DATE_PATTERN + ')', re.ASCII),
             
             # Informações do edital
-            'numero_edital': re.compile(r'(?:edital|pregão|concorrência)\s*n[ºo°]?\s*(\d+[\/\-]\d+)', re.IGNORECASE),
-            'numero_processo': re.compile(r'processo\s*n[ºo°]?\s*([\d\/\-\.]+)', re.IGNORECASE),
-            'modalidade': re.compile(r'(pregão|concorrência|tomada\s+de\s+preços|convite|concurso)', re.IGNORECASE),
+            'numero_edital': re.compile(r'(?:edital|pregão|concorrência)\s*n[ºo°]?\s*(\d+[\/\-]\d+)'),
+            'numero_processo': re.compile(r'processo\s*n[ºo°]?\s*([\d\/\-\.]+)'),
+            'modalidade': re.compile(r'(pregão|concorrência|tomada\s+de\s+preços|convite|concurso)'),
             
             # Contatos
             'email': re.compile(r'[\w\.-]+@[\w\.-]+\.\w+'),
             'telefone': re.compile(r'\(?\d{2}\)?\s*\d{4,5}[\-\s]?\d{4}'),
-            'endereco': re.compile(r'(?:rua|av|avenida|praça)[\s\w\d,\-\.]+', re.IGNORECASE),
+            'endereco': re.compile(r'(?:rua|av|avenida|praça)[\s\w\d,\-\.]+'),
             
             # Objeto
-            'objeto': re.compile(r'objeto[\s:]*(.{10,200})', re.IGNORECASE | re.DOTALL),
-            'descricao': re.compile(r'descrição[\s:]*(.{10,300})', re.IGNORECASE | re.DOTALL),
+            'objeto': re.compile(r'objeto[\s:]*(.{10,200})', re.DOTALL),
+            'descricao': re.compile(r'descrição[\s:]*(.{10,300})', re.DOTALL),
             
             # Prazos
-            'prazo_execucao': re.compile(r'prazo.*?(\d+)\s*(?:dias|meses|anos)', re.IGNORECASE),
-            'prazo_entrega': re.compile(r'entrega.*?(\d+)\s*(?:dias|meses|anos)', re.IGNORECASE),
+            'prazo_execucao': re.compile(r'prazo.*?(\d+)\s*(?:dias|meses|anos)'),
+            'prazo_entrega': re.compile(r'entrega.*?(\d+)\s*(?:dias|meses|anos)'),
             
             # Garantias
-            'garantia': re.compile(r'garantia.*?([\d,]+)%', re.IGNORECASE),
+            'garantia': re.compile(r'garantia.*?([\d,]+)%', re.ASCII),
             
             # Critérios
-            'criterio_julgamento': re.compile(r'critério.*?julgamento[\s:]*(.{10,100})', re.IGNORECASE),
+            'criterio_julgamento': re.compile(r'critério.*?julgamento[\s:]*(.{10,100})'),
         }
     
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _init_literals() -> Dict[str, Tuple[str, ...]]:
+        """
+        Literais (minúsculos) dos quais ao menos um aparece em todo match do campo
+        
+        Servem de pré-filtro por página com str.find; campos sem literal confiável
+        (telefone) não entram aqui e são sempre procurados.
+        """
+        return {
+            'valor_estimado': ('valor',),
+            'valor_unitario': ('valor',),
+            'valor_total': ('valor',),
+            'data_abertura': ('data', 'abertura'),
+            'data_entrega': ('prazo', 'entrega', 'execução'),
+            'data_publicacao': ('publicado', 'publicação'),
+            'numero_edital': ('edital', 'pregão', 'concorrência'),
+            'numero_processo': ('processo',),
+            'modalidade': ('pregão', 'concorrência', 'tomada', 'convite', 'concurso'),
+            'email': ('@',),
+            'endereco': ('rua', 'av', 'praça'),
+            'objeto': ('objeto',),
+            'descricao': ('descrição',),
+            'prazo_execucao': ('prazo',),
+            'prazo_entrega': ('entrega',),
+            'garantia': ('garantia',),
+            'criterio_julgamento': ('critério',),
+        }
+    
+    def _build_scanner_db(self):
+        """Compila os padrões de SCANNER_FIELDS em um banco hyperscan (None sem hyperscan)"""
+        if hyperscan is None:
+            return None
+        try:
+            database = hyperscan.Database()
+            database.compile(
+                expressions=[self.patterns[field_name].pattern.encode('utf-8') for field_name in SCANNER_FIELDS],
+                ids=list(range(len(SCANNER_FIELDS))),
+                elements=len(SCANNER_FIELDS),
+                flags=[hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH] * len(SCANNER_FIELDS)
+            )
+            return database
+        except Exception as e:
+            logger.warning(f"hyperscan indisponível, usando apenas re: {str(e)}")
+            return None
+    
+    def _scanner_hits(self, text_lower: str) -> set:
+        """Campos de SCANNER_FIELDS com algum match no texto, em uma única varredura DFA"""
+        hits = set()
+        
+        def on_match(pattern_id, start, end, flags, context):
+            hits.add(SCANNER_FIELDS[pattern_id])
+            # Interrompe a varredura quando todos os campos já apareceram
+            return len(hits) == len(SCANNER_FIELDS)
+        
+        scratch = getattr(self._scanner_local, 'scratch', None)
+        if scratch is None:
+            scratch = self._scanner_local.scratch = hyperscan.Scratch(self.scanner_db)
+        
+        try:
+            self.scanner_db.scan(text_lower.encode('utf-8'), match_event_handler=on_match, scratch=scratch)
+        except hyperscan.ScanTerminated:
+            pass
+        return hits
+    
+    @staticmethod
+    def _lower_text(text: str) -> str:
+        """
+        text.lower() com o mesmo comprimento do original, para que os spans encontrados
+        no texto minúsculo recortem o texto original (caracteres como 'İ', cujo minúsculo
+        tem dois code points, ficam como estão)
+        """
+        text_lower = text.lower()
+        if len(text_lower) == len(text):
+            return text_lower
+        return ''.join(char if len(char.lower()) != 1 else char.lower() for char in text)
+    
+    def _candidate_fields(self, text_lower: str) -> Tuple[str, ...]:
+        """Campos que podem ter match no texto minúsculo: os que têm algum literal presente (ou nenhum literal)"""
+        # Com hyperscan, os campos de varredura só seguem para o re se o DFA achou match
+        scanner_hits = self._scanner_hits(text_lower) if self.scanner_db is not None else None
+        
+        candidates = []
+        for field_name in self.patterns:
+            if scanner_hits is not None and field_name in SCANNER_FIELDS:
+                if field_name in scanner_hits:
+                    candidates.append(field_name)
+                continue
+            
+            literals = self.literals.get(field_name)
+            if literals is None or any(literal in text_lower for literal in literals):
+                candidates.append(field_name)
+        return tuple(candidates)
+    
+    def _combined_for(self, fields: Tuple[str, ...]) -> Tuple[re.Pattern, Dict[str, int]]:
+        """Regex combinada de um conjunto de campos, compilada uma vez por conjunto"""
+        combined = self._combined_cache.get(fields)
+        if combined is None:
+            if len(self._combined_cache) >= COMBINED_PATTERN_CACHE_SIZE:
+                self._combined_cache.clear()
+            combined = self._build_combined_pattern({field_name: self.patterns[field_name] for field_name in fields})
+            self._combined_cache[fields] = combined
+        return combined
+    
+    @staticmethod
+    def _build_combined_pattern(patterns: Dict[str, re.Pattern]) -> Tuple[re.Pattern, Dict[str, int]]:
+        """
+        Junta todos os padrões em uma única alternação, para percorrer o texto uma só vez
+        
+        Cada padrão vira um lookahead com grupo nomeado (largura zero: toda posição do
+        texto é testada, como no findall de cada padrão) e mantém suas próprias flags
+        via grupo com flags locais.
+        
+        Returns:
+            (regex combinada, índice do grupo nomeado de cada campo)
+        """
+        parts = []
+        groups = {}
+        group_index = 1
+        for field_name, pattern in patterns.items():
+            flags = ''
+            if pattern.flags & re.IGNORECASE:
+                flags += 'i'
+            if pattern.flags & re.DOTALL:
+                flags += 's'
+            if pattern.flags & re.ASCII:
+                flags += 'a'
+            parts.append(f"(?=(?P<{field_name}>(?{flags}:{pattern.pattern})))")
+            groups[field_name] = group_index
+            group_index += 1 + pattern.groups
+        return re.compile('|'.join(parts)), groups
+    
+    @staticmethod
+    def _match_value(match: re.Match, group: int, pattern: re.Pattern, text: str):
+        """
+        Valor do match no formato do findall (texto todo, grupo único ou tupla de grupos),
+        recortado de text pelos spans (o match foi feito na versão minúscula de text)
+        """
+        def span_text(index):
+            start, end = match.span(index)
+            return text[start:end] if start >= 0 else ''
+        
+        if pattern.groups == 0:
+            return span_text(group)
+        if pattern.groups == 1:
+            return span_text(group + 1)
+        return tuple(span_text(group + 1 + i) for i in range(pattern.groups))
+    
+    def _find_all_matches(self, text: str, fields: Optional[Tuple[str, ...]] = None,
+                          text_lower: Optional[str] = None) -> Dict[str, List]:
+        """
+        Equivale a findall do padrão com IGNORECASE para cada campo, em uma única passada
+        
+        A alternação reporta só o primeiro campo que casa em cada posição; os campos
+        seguintes são testados ali com match() ancorado. next_pos reproduz o findall,
+        que retoma a busca de cada campo no fim do seu último match.
+        
+        Args:
+            text: Texto a varrer
+            fields: Campos procurados, na ordem de self.patterns (padrão: todos)
+            text_lower: _lower_text(text), se já calculado
+        """
+        if text_lower is None:
+            text_lower = self._lower_text(text)
+        fields = tuple(fields) if fields is not None else tuple(self.patterns)
+        combined_pattern, pattern_groups = self._combined_for(fields)
+        order = {field_name: i for i, field_name in enumerate(fields)}
+        matches = {field_name: [] for field_name in fields}
+        next_pos = dict.fromkeys(fields, 0)
+        
+        for combined_match in combined_pattern.finditer(text_lower):
+            pos = combined_match.start()
+            first_field = combined_match.lastgroup
+            
+            for field_name in fields[order[first_field]:]:
+                if pos < next_pos[field_name]:
+                    continue
+                
+                pattern = self.patterns[field_name]
+                if field_name == first_field:
+                    match, group = combined_match, pattern_groups[field_name]
+                else:
+                    match, group = pattern.match(text_lower, pos), 0
+                    if not match:
+                        continue
+                
+                end = match.end(group)
+                matches[field_name].append(self._match_value(match, group, pattern, text))
+                next_pos[field_name] = end if end > pos else pos + 1
+        
+        return matches
+    
     def analyze_pdf(self, pdf_path: str) -> Dict:
         """
         Analisa um PDF e extrai dados semânticos
@@ -75,29 +337,38 @@ class PDFAnalyzer:
             if not os.path.exists(pdf_path):
                 raise FileNotFoundError(f"Arquivo não encontrado: {pdf_path}")
             
-            # Extrair texto usando múltiplas bibliotecas
-            text_pymupdf = self._extract_text_pymupdf(pdf_path)
-            text_pdfplumber = self._extract_text_pdfplumber(pdf_path)
-            
-            # Combinar textos para análise mais robusta
-            combined_text = f"{text_pymupdf}\n\n{text_pdfplumber}"
-            
-            # Extrair dados semânticos
-            semantic_data = self._extract_semantic_data(combined_text)
-            
-            # Extrair tabelas
-            tables = self._extract_tables_pdfplumber(pdf_path)
+            # Um único handle do pdfplumber serve ao fallback de texto e às tabelas:
+            # o arquivo é aberto uma vez e as páginas já lidas não são reprocessadas
+            plumber = self._open_pdfplumber(pdf_path)
+            try:
+                # Extrair dados semânticos direto das páginas extraídas (PyMuPDF, com
+                # pdfplumber só nas páginas ruins), sem montar o texto inteiro na memória
+                text_stats = {}
+                pages = self._iter_text(pdf_path, text_stats, plumber)
+                try:
+                    semantic_data = self._extract_semantic_data(pages, MAX_PAGES_FOR_METADATA)
+                finally:
+                    # Fecha o PyMuPDF se a leitura parou antes da última página
+                    pages.close()
+                
+                # Extrair tabelas
+                tables = self._extract_tables_pdfplumber(plumber)
+            finally:
+                if plumber is not None:
+                    plumber.close()
             
             # Metadados do arquivo
             file_info = self._get_file_info(pdf_path)
             
+            text_preview = text_stats['text_preview']
             result = {
                 'file_info': file_info,
-                'text_length': len(combined_text),
-                'text_preview': combined_text[:500] + "..." if len(combined_text) > 500 else combined_text,
+                'pages_analyzed': text_stats['pages'],
+                'text_length': text_stats['text_length'],
+                'text_preview': text_preview[:TEXT_PREVIEW_CHARS] + "..." if len(text_preview) > TEXT_PREVIEW_CHARS else text_preview,
                 'semantic_data': semantic_data,
                 'tables': tables,
-                'extraction_method': 'pymupdf_pdfplumber_combined',
+                'extraction_method': 'pymupdf_pdfplumber_fallback' if text_stats['fallback_pages'] else 'pymupdf',
                 'analyzed_at': datetime.now().isoformat()
             }
             
@@ -112,60 +383,140 @@ class PDFAnalyzer:
                 'analyzed_at': datetime.now().isoformat()
             }
     
-    def _extract_text_pymupdf(self, pdf_path: str) -> str:
-        """Extrai texto usando PyMuPDF"""
+    @staticmethod
+    def _page_text_quality(text: str) -> float:
+        """Fração de caracteres imprimíveis (ou quebras/tabs) do texto; 0 se vazio"""
+        if not text or not text.strip():
+            return 0.0
+        printable = sum(1 for char in text if char.isprintable() or char in '\n\t')
+        return printable / len(text)
+    
+    @staticmethod
+    def _open_pdfplumber(pdf_path: str):
+        """Abre o PDF no pdfplumber; None se não for possível (texto e tabelas seguem sem ele)"""
+        try:
+            return pdfplumber.open(pdf_path)
+        except Exception as e:
+            logger.warning(f"Erro ao abrir PDF com pdfplumber: {str(e)}")
+            return None
+    
+    def _iter_text(self, pdf_path: str, stats: Dict, plumber=None) -> Iterator[str]:
+        """
+        Gera o texto página a página: PyMuPDF, com pdfplumber só nas páginas vazias/ilegíveis
+        
+        O documento nunca é montado em uma string única. stats recebe, ao longo da
+        iteração, 'pages', 'text_length', 'text_preview' (primeiros TEXT_PREVIEW_CHARS + 1
+        caracteres) e 'fallback_pages' das páginas lidas.
+        """
+        stats.update(pages=0, text_length=0, text_preview='', fallback_pages=0)
+        
+        for page_text in self._iter_pages(pdf_path, stats, plumber):
+            stats['pages'] += 1
+            stats['text_length'] += len(page_text)
+            # Só o que falta para completar o preview é copiado (nunca a página inteira)
+            missing = TEXT_PREVIEW_CHARS + 1 - len(stats['text_preview'])
+            if missing > 0:
+                stats['text_preview'] += page_text[:missing]
+            yield page_text
+    
+    def _iter_pages(self, pdf_path: str, stats: Dict, plumber=None) -> Iterator[str]:
+        """Texto de cada página, escolhendo o extrator por página (plumber é do chamador)"""
         try:
             doc = fitz.open(pdf_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text
         except Exception as e:
             logger.warning(f"Erro ao extrair texto com PyMuPDF: {str(e)}")
-            return ""
+            for page_text in self._iter_text_pdfplumber(plumber):
+                stats['fallback_pages'] += 1
+                yield page_text
+            return
+        
+        try:
+            for page_num, page in enumerate(doc):
+                page_text = page.get_text("text", flags=PYMUPDF_TEXT_FLAGS)
+                quality = self._page_text_quality(page_text)
+                if quality < MIN_PAGE_TEXT_QUALITY and plumber is not None:
+                    try:
+                        fallback_text = plumber.pages[page_num].extract_text() or ""
+                        if self._page_text_quality(fallback_text) > quality:
+                            page_text = fallback_text + "\n"
+                            stats['fallback_pages'] += 1
+                    except Exception as e:
+                        logger.warning(f"Erro ao extrair texto com pdfplumber: {str(e)}")
+                yield page_text
+        finally:
+            doc.close()
     
-    def _extract_text_pdfplumber(self, pdf_path: str) -> str:
-        """Extrai texto usando pdfplumber"""
+    def _iter_text_pdfplumber(self, plumber) -> Iterator[str]:
+        """Gera o texto de cada página usando pdfplumber"""
+        if plumber is None:
+            return
         try:
-            text = ""
-            with pdfplumber.open(pdf_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            return text
+            for page in plumber.pages:
+                page_text = page.extract_text()
+                if page_text:
+                    yield page_text + "\n"
         except Exception as e:
             logger.warning(f"Erro ao extrair texto com pdfplumber: {str(e)}")
-            return ""
     
-    def _extract_tables_pdfplumber(self, pdf_path: str) -> List[Dict]:
-        """Extrai tabelas usando pdfplumber"""
+    def _extract_tables_pdfplumber(self, plumber) -> List[Dict]:
+        """Extrai tabelas usando o handle do pdfplumber já aberto pela análise"""
+        if plumber is None:
+            return []
         try:
             tables = []
-            with pdfplumber.open(pdf_path) as pdf:
-                for page_num, page in enumerate(pdf.pages, 1):
-                    page_tables = page.extract_tables()
-                    for table_num, table in enumerate(page_tables, 1):
-                        if table and len(table) > 1:  # Pelo menos cabeçalho + 1 linha
-                            tables.append({
-                                'page': page_num,
-                                'table_number': table_num,
-                                'headers': table[0] if table else [],
-                                'rows': table[1:] if len(table) > 1 else [],
-                                'total_rows': len(table) - 1 if table else 0
-                            })
+            for page_num, page in enumerate(plumber.pages, 1):
+                # Páginas que passaram pelo fallback de texto reaproveitam os objetos já lidos
+                page_tables = page.extract_tables()
+                # Libera os objetos da página: o documento inteiro não fica em memória
+                page.flush_cache()
+                for table_num, table in enumerate(page_tables, 1):
+                    if table and len(table) > 1:  # Pelo menos cabeçalho + 1 linha
+                        tables.append({
+                            'page': page_num,
+                            'table_number': table_num,
+                            'headers': table[0] if table else [],
+                            'rows': table[1:] if len(table) > 1 else [],
+                            'total_rows': len(table) - 1 if table else 0
+                        })
             return tables
         except Exception as e:
             logger.warning(f"Erro ao extrair tabelas: {str(e)}")
             return []
     
-    def _extract_semantic_data(self, text: str) -> Dict:
-        """Extrai dados semânticos do texto usando regex"""
+    def _extract_semantic_data(self, text_chunks: Iterable[str], max_chunks: int = 0) -> Dict:
+        """
+        Extrai dados semânticos do texto (string ou páginas em sequência) usando regex
+        
+        Args:
+            text_chunks: Texto ou páginas do documento
+            max_chunks: Para após tantas páginas (0 = sem limite); para antes disso
+                assim que todos os campos tiverem ao menos um match
+        """
         data = {}
         
-        for field_name, pattern in self.patterns.items():
-            matches = pattern.findall(text)
+        if isinstance(text_chunks, str):
+            text_chunks = (text_chunks,)
+        
+        # Uma única varredura de cada página para todos os campos; os matches se
+        # acumulam na ordem do documento (um match não atravessa a quebra de página)
+        matches_by_field = {field_name: [] for field_name in self.patterns}
+        remaining = set(self.patterns)
+        for chunk_num, chunk in enumerate(text_chunks, 1):
+            # Pré-filtro: só entram na regex os campos cujo literal aparece na página
+            # Minúsculas uma vez por página: servem ao pré-filtro e às regexes
+            chunk_lower = self._lower_text(chunk)
+            candidates = self._candidate_fields(chunk_lower)
+            if candidates:
+                for field_name, matches in self._find_all_matches(chunk, candidates, chunk_lower).items():
+                    if matches:
+                        matches_by_field[field_name].extend(matches)
+                        remaining.discard(field_name)
+            
+            if not remaining or (max_chunks and chunk_num >= max_chunks):
+                break
+        
+        for field_name in self.patterns:
+            matches = matches_by_field[field_name]
             if matches:
                 if field_name.startswith('valor_'):
                     # Processar valores monetários
@@ -192,17 +543,20 @@ class PDFAnalyzer:
                 return None
             
             # Pegar o primeiro valor encontrado
-            value_str = matches[0]
-            
-            # Limpar e converter
-            clean_value = value_str.replace('.', '').replace(',', '.')
-            clean_value = re.sub(r'[^\d.]', '', clean_value)
-            
-            if clean_value:
-                return float(clean_value)
+            return self._parse_money(matches[0])
+        except (TypeError, ValueError):
             return None
-        except:
+    
+    @staticmethod
+    def _parse_money(value: str) -> Optional[float]:
+        """Converte o primeiro número de um valor monetário (formato brasileiro) em float"""
+        match = _MONEY_RE.search(value)
+        if not match:
             return None
+        number = match.group()
+        if match.group('milhar'):
+            number = number.replace('.', '')
+        return float(number.replace(',', '.'))
     
     def _process_dates(self, matches: List[str]) -> Optional[str]:
         """Processa datas"""
@@ -210,11 +564,9 @@ class PDFAnalyzer:
             if not matches:
                 return None
             
-            date_str = matches[0]
             # Normalizar formato de data
-            date_str = re.sub(r'(\d{1,2})[\/\-](\d{1,2})[\/\-](\d{2,4})', r'\1/\2/\3', date_str)
-            return date_str
-        except:
+            return _DATE_NORM.sub(r'\1/\2/\3', matches[0])
+        except TypeError:
             return None
     
     def _process_deadlines(self, matches: List[str]) -> Optional[Dict]:
@@ -225,7 +577,7 @@ class PDFAnalyzer:
             
             value = int(matches[0])
             return {'value': value, 'unit': 'dias'}  # Assumir dias por padrão
-        except:
+        except (TypeError, ValueError):
             return None
     
     def _clean_text(self, text: str) -> str:
@@ -233,12 +585,9 @@ class PDFAnalyzer:
         if not text:
             return ""
         
-        # Remover quebras de linha excessivas
-        text = re.sub(r'\n+', ' ', text)
-        # Remover espaços múltiplos
-        text = re.sub(r'\s+', ' ', text)
-        # Remover caracteres especiais no início/fim
-        text = text.strip(' .:;,-')
+        # Colapsar quebras de linha e espaços múltiplos (split/join em C, sem regex)
+        # e remover caracteres especiais no início/fim
+        text = ' '.join(text.split()).strip(' .:;,-')
         
         return text[:500]  # Limitar tamanho
     
@@ -253,16 +602,16 @@ class PDFAnalyzer:
                 'modified_at': datetime.fromtimestamp(stat.st_mtime).isoformat(),
                 'path': pdf_path
             }
-        except:
+        except OSError:
             return {'filename': os.path.basename(pdf_path), 'path': pdf_path}
     
     def analyze_multiple_pdfs(self, pdf_paths: List[str]) -> Dict[str, Dict]:
-        """Analisa múltiplos PDFs"""
+        """Analisa múltiplos PDFs (em paralelo, ver analyze_pdf_files)"""
         results = {}
         
-        for pdf_path in pdf_paths:
+        for pdf_path, result in zip(pdf_paths, analyze_pdf_files(pdf_paths)):
             filename = os.path.basename(pdf_path)
-            results[filename] = self.analyze_pdf(pdf_path)
+            results[filename] = result
         
         return results
     
@@ -296,18 +645,10 @@ class PDFAnalyzer:
                 
             header_lower = header.lower()
             
-            if any(word in header_lower for word in ['item', 'número', 'nº']):
-                columns['numero'] = i
-            elif any(word in header_lower for word in ['descrição', 'objeto', 'especificação']):
-                columns['descricao'] = i
-            elif any(word in header_lower for word in ['quantidade', 'qtd', 'qtde']):
-                columns['quantidade'] = i
-            elif any(word in header_lower for word in ['unitário', 'unit']):
-                columns['valor_unitario'] = i
-            elif any(word in header_lower for word in ['total', 'valor total']):
-                columns['valor_total'] = i
-            elif any(word in header_lower for word in ['unidade', 'un', 'medida']):
-                columns['unidade'] = i
+            for keyword, field in COL_KEYWORDS:
+                if keyword in header_lower:
+                    columns[field] = i
+                    break
         
         return columns
     
@@ -323,15 +664,10 @@ class PDFAnalyzer:
                     if field in ['quantidade']:
                         try:
                             item[field] = int(float(value.replace(',', '.')))
-                        except:
+                        except (ValueError, OverflowError):
                             item[field] = None
                     elif field in ['valor_unitario', 'valor_total']:
-                        try:
-                            clean_value = re.sub(r'[^\d,.]', '', value)
-                            clean_value = clean_value.replace(',', '.')
-                            item[field] = float(clean_value) if clean_value else None
-                        except:
-                            item[field] = None
+                        item[field] = self._parse_money(value)
                     else:
                         item[field] = value
             
@@ -345,9 +681,76 @@ class PDFAnalyzer:
             logger.warning(f"Erro ao extrair item da linha: {str(e)}")
             return None
 
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def get_pdf_analyzer() -> PDFAnalyzer:
+    """Analisador compartilhado pelo processo (regexes e banco hyperscan compilados uma vez)"""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = PDFAnalyzer()
+    return _analyzer
+
 # Função de conveniência para uso direto
 def analyze_pdf_file(pdf_path: str) -> Dict:
     """Função de conveniência para analisar um PDF"""
-    analyzer = PDFAnalyzer()
-    return analyzer.analyze_pdf(pdf_path)
+    return get_pdf_analyzer().analyze_pdf(pdf_path)
+
+# Pools de processos de analyze_pdf_files, um por número de workers, criados no primeiro uso.
+# Os processos nascem por spawn: os chamadores (threads do APScheduler, workers gevent) são
+# processos com várias threads e sockets do pool de conexões, e um fork herdaria locks presos
+_pdf_executors = {}
+_pdf_executors_lock = threading.Lock()
 
+def _get_pdf_executor(workers: int) -> ProcessPoolExecutor:
+    """Pool de processos compartilhado com o número de workers pedido"""
+    with _pdf_executors_lock:
+        executor = _pdf_executors.get(workers)
+        if executor is None:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _pdf_executors[workers] = executor
+        return executor
+
+def _discard_pdf_executor(workers: int):
+    """Descarta um pool que falhou (ex.: BrokenProcessPool) para o próximo uso criar outro"""
+    with _pdf_executors_lock:
+        executor = _pdf_executors.pop(workers, None)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+@atexit.register
+def _shutdown_pdf_executors():
+    with _pdf_executors_lock:
+        executors = list(_pdf_executors.values())
+        _pdf_executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def analyze_pdf_files(pdf_paths: List[str], max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    Analisa vários PDFs distribuindo-os entre processos
+    
+    Args:
+        pdf_paths: Caminhos dos arquivos
+        max_workers: Número de processos (padrão: PDF_ANALYSIS_WORKERS)
+        
+    Returns:
+        Resultados de analyze_pdf, na mesma ordem de pdf_paths
+    """
+    # O pool tem tamanho fixo (não depende de len(pdf_paths)): chamadas com poucos PDFs
+    # reaproveitam o mesmo pool, e os processos só sobem conforme há trabalho
+    workers = max_workers or PDF_ANALYSIS_WORKERS
+    if workers <= 1 or len(pdf_paths) <= 1:
+        return [analyze_pdf_file(pdf_path) for pdf_path in pdf_paths]
+    
+    try:
+        return list(_get_pdf_executor(workers).map(analyze_pdf_file, pdf_paths))
+    except Exception as e:
+        _discard_pdf_executor(workers)
+        logger.warning(f"Análise paralela indisponível, analisando em sequência: {str(e)}")
+        return [analyze_pdf_file(pdf_path) for pdf_path in pdf_paths]
@@ -1,20 +1,53 @@
 import os
-import json
+import time
+import uuid
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Optional
 from datetime import datetime
 
+from sqlalchemy import and_, text
+
 from src.models.user import db
 from src.models.edital import Edital, EditalFile
-from src.services.pdf_analyzer import PDFAnalyzer
+from src.services.pdf_analyzer import analyze_pdf_files, get_pdf_analyzer
 
 logger = logging.getLogger(__name__)
 
+# Arquivos gravados por commit na análise em lote
+ANALYSIS_COMMIT_BATCH = 100
+
+# Análises disparadas pela API rodam em segundo plano (o PDF já é processado em
+# paralelo por analyze_pdf_files; poucos jobs simultâneos bastam)
+ANALYSIS_JOB_WORKERS = int(os.getenv('PDF_ANALYSIS_JOB_WORKERS', 2))
+
+# Segundos que o status de um job concluído continua disponível para consulta
+ANALYSIS_JOB_TTL = 3600
+
+# Segundos que o resultado de has_pending é reaproveitado
+PENDING_CHECK_TTL = 30
+
 class PDFIntegrationService:
     """Serviço para integrar análise de PDF com o sistema de editais"""
     
     def __init__(self):
-        self.analyzer = PDFAnalyzer()
+        self.analyzer = get_pdf_analyzer()
+        self._pending_cache = None  # (expira_em, resultado) de has_pending
+    
+    def has_pending(self) -> bool:
+        """Indica se há PDFs sem análise (um SELECT ... LIMIT 1, reaproveitado por PENDING_CHECK_TTL)"""
+        now = time.monotonic()
+        if self._pending_cache is not None and self._pending_cache[0] > now:
+            return self._pending_cache[1]
+        
+        pending = db.session.query(EditalFile.id).filter(
+            EditalFile.file_type == 'PDF',
+            EditalFile.extracted_text.is_(None)
+        ).limit(1).first() is not None
+        
+        self._pending_cache = (now + PENDING_CHECK_TTL, pending)
+        return pending
     
     def analyze_edital_files(self, edital_id: int) -> Dict:
         """
@@ -29,16 +62,18 @@ class PDFIntegrationService:
         try:
             logger.info(f"Analisando arquivos do edital {edital_id}")
             
-            # Buscar edital
-            edital = Edital.query.get(edital_id)
-            if not edital:
+            # Buscar edital e seus arquivos PDF em uma única consulta (LEFT JOIN:
+            # um edital sem PDFs volta como uma linha com arquivo None)
+            rows = db.session.query(Edital, EditalFile).outerjoin(
+                EditalFile,
+                and_(EditalFile.edital_id == Edital.id, EditalFile.file_type == 'PDF')
+            ).filter(Edital.id == edital_id).all()
+            
+            if not rows:
                 raise ValueError(f"Edital {edital_id} não encontrado")
             
-            # Buscar arquivos PDF do edital
-            pdf_files = EditalFile.query.filter_by(
-                edital_id=edital_id,
-                file_type='PDF'
-            ).all()
+            edital = rows[0][0]
+            pdf_files = [pdf_file for _, pdf_file in rows if pdf_file is not None]
             
             if not pdf_files:
                 logger.warning(f"Nenhum arquivo PDF encontrado para edital {edital_id}")
@@ -114,25 +149,35 @@ class PDFIntegrationService:
             analyzed = 0
             errors = 0
             
+            # Separar os arquivos presentes em disco para analisá-los em paralelo
+            available_files = []
             for pdf_file in pending_files:
+                if pdf_file.local_path and os.path.exists(pdf_file.local_path):
+                    available_files.append(pdf_file)
+                else:
+                    logger.warning(f"Arquivo não encontrado: {pdf_file.local_path}")
+                    errors += 1
+            
+            logger.info(f"Analisando {len(available_files)} arquivos")
+            analysis_results = analyze_pdf_files([pdf_file.local_path for pdf_file in available_files])
+            
+            # Gravação no banco feita aqui, no processo principal: UPDATEs em lote
+            # (sem o ORM por linha) e um commit a cada ANALYSIS_COMMIT_BATCH arquivos
+            updates = []
+            for pdf_file, analysis_result in zip(available_files, analysis_results):
                 try:
-                    if pdf_file.local_path and os.path.exists(pdf_file.local_path):
-                        logger.info(f"Analisando: {pdf_file.filename}")
-                        
-                        analysis_result = self.analyzer.analyze_pdf(pdf_file.local_path)
-                        self._save_analysis_to_database(pdf_file, analysis_result)
-                        
-                        analyzed += 1
-                    else:
-                        logger.warning(f"Arquivo não encontrado: {pdf_file.local_path}")
-                        errors += 1
-                        
+                    updates.append(self._analysis_update_mapping(pdf_file, analysis_result))
+                    analyzed += 1
                 except Exception as e:
                     logger.error(f"Erro ao analisar {pdf_file.filename}: {str(e)}")
                     errors += 1
             
-            # Commit das mudanças
-            db.session.commit()
+            for start in range(0, len(updates), ANALYSIS_COMMIT_BATCH):
+                db.session.bulk_update_mappings(EditalFile, updates[start:start + ANALYSIS_COMMIT_BATCH])
+                db.session.commit()
+            
+            # A lista de pendentes mudou
+            self._pending_cache = None
             
             return {
                 'total_pending': len(pending_files),
@@ -150,32 +195,35 @@ class PDFIntegrationService:
                 'error': str(e)
             }
     
+    def _analysis_update_mapping(self, pdf_file: EditalFile, analysis_result: Dict) -> Dict:
+        """Colunas de EditalFile atualizadas com o resultado da análise (formato de bulk_update_mappings)"""
+        # Texto para busca e dados semânticos
+        update = {
+            'id': pdf_file.id,
+            'extracted_text': analysis_result.get('text_preview', ''),
+            'semantic_data': analysis_result.get('semantic_data', {})
+        }
+        
+        # Atualizar informações do arquivo se disponíveis
+        file_info = analysis_result.get('file_info', {})
+        if file_info.get('size_bytes'):
+            update['file_size'] = file_info['size_bytes']
+        
+        return update
+    
     def _save_analysis_to_database(self, pdf_file: EditalFile, analysis_result: Dict):
-        """Salva resultado da análise no banco de dados"""
+        """Aplica o resultado da análise ao arquivo na sessão (o commit fica com quem chama)"""
         try:
-            # Extrair texto para busca
-            text_preview = analysis_result.get('text_preview', '')
-            
-            # Preparar dados semânticos
-            semantic_data = analysis_result.get('semantic_data', {})
-            
-            # Atualizar arquivo no banco
-            pdf_file.extracted_text = text_preview
-            pdf_file.semantic_data = json.dumps(semantic_data, ensure_ascii=False, default=str)
-            
-            # Atualizar informações do arquivo se disponíveis
-            file_info = analysis_result.get('file_info', {})
-            if file_info.get('size_bytes'):
-                pdf_file.file_size = file_info['size_bytes']
+            for column, value in self._analysis_update_mapping(pdf_file, analysis_result).items():
+                if column != 'id':
+                    setattr(pdf_file, column, value)
             
             db.session.add(pdf_file)
-            db.session.commit()
             
-            logger.info(f"Análise salva para arquivo {pdf_file.filename}")
+            logger.info(f"Análise registrada para arquivo {pdf_file.filename}")
             
         except Exception as e:
             logger.error(f"Erro ao salvar análise no banco: {str(e)}")
-            db.session.rollback()
     
     def _update_edital_with_analysis(self, edital: Edital, analysis_results: Dict):
         """Atualiza dados do edital com informações extraídas dos PDFs"""
@@ -207,15 +255,10 @@ class PDFIntegrationService:
                 except:
                     pass
             
-            # Salvar dados semânticos consolidados como JSON no campo description
+            # Salvar dados semânticos consolidados na coluna própria (a análise cobre
+            # todos os PDFs do edital, então substitui a anterior); description fica intacta
             if consolidated_data:
-                semantic_json = json.dumps(consolidated_data, ensure_ascii=False, indent=2, default=str)
-                
-                # Adicionar aos dados existentes
-                if edital.description:
-                    edital.description += f"\n\n--- DADOS EXTRAÍDOS DOS PDFs ---\n{semantic_json}"
-                else:
-                    edital.description = f"--- DADOS EXTRAÍDOS DOS PDFs ---\n{semantic_json}"
+                edital.extracted_data = consolidated_data
             
             db.session.add(edital)
             db.session.commit()
@@ -262,21 +305,19 @@ class PDFIntegrationService:
                     'filename': file.filename,
                     'file_size': file.file_size,
                     'text_length': len(file.extracted_text) if file.extracted_text else 0,
-                    'has_semantic_data': bool(file.semantic_data),
+                    'has_semantic_data': file.semantic_data is not None,
                     'created_at': file.created_at.isoformat() if file.created_at else None
                 }
                 
                 # Adicionar dados semânticos se disponíveis
-                if file.semantic_data:
-                    try:
-                        semantic_data = json.loads(file.semantic_data)
-                        file_summary['semantic_fields'] = list(semantic_data.keys())
-                        file_summary['key_data'] = {
-                            k: v for k, v in semantic_data.items() 
-                            if k in ['numero_edital', 'modalidade', 'objeto', 'valor_estimado']
-                        }
-                    except:
-                        pass
+                # (jsonb já carregado como dict pelo driver)
+                semantic_data = file.semantic_data
+                if isinstance(semantic_data, dict):
+                    file_summary['semantic_fields'] = list(semantic_data.keys())
+                    file_summary['key_data'] = {
+                        k: v for k, v in semantic_data.items() 
+                        if k in ['numero_edital', 'modalidade', 'objeto', 'valor_estimado']
+                    }
                 
                 summary['files'].append(file_summary)
             
@@ -294,15 +335,24 @@ class PDFIntegrationService:
         """
         Busca por texto no conteúdo extraído dos PDFs
         
+        No PostgreSQL a busca é full-text em português (_search_pdf_content_fts): casa
+        palavras inteiras pelo radical ("licitações" acha "licitação"), não trechos de
+        palavra, e ordena por relevância. Nos outros bancos é busca de substring (ILIKE).
+        
         Args:
             query: Texto a buscar
             limit: Limite de resultados
             
         Returns:
-            Lista de arquivos que contêm o texto
+            Lista de arquivos encontrados. 'match_type' indica o critério ('fulltext' ou
+            'substring'); 'match_position' (índice do texto literal da busca) só aparece
+            quando esse texto ocorre no arquivo
         """
         try:
-            # Buscar arquivos que contêm o texto
+            if db.engine.dialect.name == 'postgresql':
+                return self._search_pdf_content_fts(query, limit)
+            
+            # Outros bancos (SQLite local): varredura com ILIKE
             files = EditalFile.query.filter(
                 EditalFile.extracted_text.ilike(f'%{query}%')
             ).limit(limit).all()
@@ -326,6 +376,7 @@ class PDFIntegrationService:
                         'edital_id': file.edital_id,
                         'filename': file.filename,
                         'context': context,
+                        'match_type': 'substring',
                         'match_position': index
                     })
             
@@ -334,4 +385,121 @@ class PDFIntegrationService:
         except Exception as e:
             logger.error(f"Erro na busca em PDFs: {str(e)}")
             return []
+    
+    def _search_pdf_content_fts(self, query: str, limit: int) -> List[Dict]:
+        """
+        Busca full-text (PostgreSQL) usando o índice GIN edital_files_extracted_text_fts
+        (criar_indices_postgresql.py); o trecho de contexto vem do ts_headline
+        
+        Um arquivo pode casar só pelo radical, sem conter o texto literal da busca: nesse
+        caso não há posição a informar e match_position fica de fora do resultado.
+        """
+        rows = db.session.execute(
+            text("""
+                SELECT f.id, f.edital_id, f.filename,
+                       ts_headline('portuguese', f.extracted_text, q,
+                                   'StartSel="", StopSel="", MaxFragments=1, MinWords=15, MaxWords=35') AS context,
+                       strpos(lower(f.extracted_text), lower(:raw_query)) - 1 AS match_position
+                FROM edital_files f, plainto_tsquery('portuguese', :query) q
+                WHERE to_tsvector('portuguese', f.extracted_text) @@ q
+                ORDER BY ts_rank(to_tsvector('portuguese', f.extracted_text), q) DESC
+                LIMIT :limit
+            """),
+            {'query': query, 'raw_query': query, 'limit': limit}
+        )
+        
+        results = []
+        for row in rows:
+            result = {
+                'file_id': row.id,
+                'edital_id': row.edital_id,
+                'filename': row.filename,
+                'context': row.context,
+                'match_type': 'fulltext'
+            }
+            if row.match_position is not None and row.match_position >= 0:
+                result['match_position'] = row.match_position
+            results.append(result)
+        
+        return results
+
+
+
+_job_executor = None
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+def _get_job_executor() -> ThreadPoolExecutor:
+    """Executor dos jobs de análise, criado no primeiro uso"""
+    global _job_executor
+    if _job_executor is None:
+        with _jobs_lock:
+            if _job_executor is None:
+                _job_executor = ThreadPoolExecutor(
+                    max_workers=ANALYSIS_JOB_WORKERS,
+                    thread_name_prefix='pdf-analysis'
+                )
+    return _job_executor
+
+def _update_job(job_id: str, **fields):
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+def _prune_jobs():
+    """Descarta jobs concluídos há mais de ANALYSIS_JOB_TTL segundos (chamar com o lock)"""
+    cutoff = time.monotonic() - ANALYSIS_JOB_TTL
+    expired = [job_id for job_id, job in _jobs.items() if job.get('_finished') and job['_finished'] < cutoff]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def submit_analysis_job(app, method: str, *args) -> str:
+    """
+    Agenda PDFIntegrationService.<method>(*args) em segundo plano
+    
+    Args:
+        app: Aplicação Flask (o job roda no seu app context)
+        method: 'analyze_edital_files' ou 'analyze_all_pending_files'
+        
+    Returns:
+        ID do job, para consulta com get_analysis_job
+    """
+    job_id = uuid.uuid4().hex
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job_id] = {
+            'job_id': job_id,
+            'type': method,
+            'status': 'queued',
+            'created_at': datetime.now().isoformat()
+        }
+    
+    _get_job_executor().submit(_run_analysis_job, app, job_id, method, args)
+    logger.info(f"Job de análise {job_id} agendado ({method})")
+    return job_id
+
+def _run_analysis_job(app, job_id: str, method: str, args: tuple):
+    _update_job(job_id, status='running', started_at=datetime.now().isoformat())
+    try:
+        with app.app_context():
+            result = getattr(PDFIntegrationService(), method)(*args)
+        
+        # Os resultados por arquivo já estão no banco; o job guarda só o resumo
+        file_results = result.pop('results', None)
+        if file_results is not None:
+            result['has_results'] = len(file_results) > 0
+        status = 'failed' if 'error' in result else 'finished'
+    except Exception as e:
+        logger.error(f"Erro no job de análise {job_id}: {str(e)}")
+        result = {'error': str(e)}
+        status = 'failed'
+    
+    _update_job(job_id, status=status, result=result,
+                finished_at=datetime.now().isoformat(), _finished=time.monotonic())
 
+def get_analysis_job(job_id: str) -> Optional[Dict]:
+    """Status de um job de análise (None se não existir ou já tiver expirado)"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if not key.startswith('_')}
@@ -1,23 +1,53 @@
+import os
+import orjson
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date
-from typing import List, Dict, Optional
-import time
+from requests.adapters import HTTPAdapter
+from typing import Dict, Iterator, List, Optional
+
+from src.services.response_cache import ttl_cache
+from src.services.rate_limiter import get_concurrency_controller, get_rate_limiter, rate_limited_get
 
 logger = logging.getLogger(__name__)
 
+# Cities fetched concurrently (the calls are network-bound); 1 = sequential
+PNCP_FETCH_WORKERS = int(os.getenv('PNCP_FETCH_WORKERS', 5))
+
+# Request budget shared by all PNCP calls of the process (token bucket)
+PNCP_REQUESTS_PER_SECOND = float(os.getenv('PNCP_REQUESTS_PER_SECOND', 2))
+
+# Seconds a parsed GET response is reused for identical parameters
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 300))
+
+# Pages of /publicacao read per city (page N+1 downloads while page N is parsed)
+PNCP_MAX_PAGES = int(os.getenv('PNCP_MAX_PAGES', 5))
+PNCP_PAGE_SIZE = 100
+
 class PNCPClient:
     """Client for PNCP (Portal Nacional de Contratações Públicas) API"""
     
     BASE_URL = "https://pncp.gov.br/api/consulta"
+    EDITAL_URL = "https://pncp.gov.br/app/editais/"
     
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'MVP-Licitacoes-Bot/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Connection': 'keep-alive'
         })
+        # A single host: one pool, with a kept-alive connection per concurrent worker.
+        # Retries are done by rate_limited_get (backoff + rate limiter), not by urllib3
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(PNCP_FETCH_WORKERS, 1), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.limiter = get_rate_limiter('pncp.gov.br', PNCP_REQUESTS_PER_SECOND, PNCP_FETCH_WORKERS)
+        # Concurrent cities back off when PNCP slows down or answers 429/5xx
+        self.controller = get_concurrency_controller('pncp.gov.br', PNCP_FETCH_WORKERS)
     
+    @ttl_cache(maxsize=256, ttl=API_CACHE_TTL)
     def get_tenders_by_publication_date(
         self,
         start_date: str,
@@ -53,10 +83,10 @@ class PNCPClient:
         
         try:
             logger.info(f"Fetching tenders from PNCP: {params}")
-            response = self.session.get(endpoint, params=params, timeout=30)
+            response = rate_limited_get(self.session, self.limiter, endpoint, self.controller, params=params, timeout=30)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             logger.info(f"Successfully fetched {len(data.get('data', []))} tenders")
             return data
             
@@ -96,10 +126,10 @@ class PNCPClient:
         
         try:
             logger.info(f"Fetching open tenders from PNCP: {params}")
-            response = self.session.get(endpoint, params=params, timeout=30)
+            response = rate_limited_get(self.session, self.limiter, endpoint, self.controller, params=params, timeout=30)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             logger.info(f"Successfully fetched {len(data.get('data', []))} open tenders")
             return data
             
@@ -110,6 +140,18 @@ class PNCPClient:
             logger.error(f"Unexpected error: {e}")
             raise
     
+    @staticmethod
+    def _parse_iso(value) -> Optional[datetime]:
+        """Parse an ISO 8601 timestamp from the API (None if missing or malformed)"""
+        if not isinstance(value, str) or len(value) < 10:
+            return None
+        if value[-1] == 'Z':
+            value = value[:-1] + '+00:00'
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    
     def parse_tender_data(self, tender_raw: Dict) -> Dict:
         """
         Parse raw tender data from PNCP API into standardized format
@@ -121,43 +163,35 @@ class PNCPClient:
             Dict with parsed tender data
         """
         try:
-            # Extract organization info
-            org_info = tender_raw.get('orgaoEntidade', {})
-            unit_info = tender_raw.get('unidadeOrgao', {})
-            legal_info = tender_raw.get('amparoLegal', {})
+            raw_get = tender_raw.get
+            
+            # Extract organization info (each nested dict looked up once)
+            org_info = raw_get('orgaoEntidade') or {}
+            unit_info = raw_get('unidadeOrgao') or {}
+            legal_info = raw_get('amparoLegal') or {}
+            cnpj = org_info.get('cnpj', '')
             
             # Parse dates
-            pub_date = None
-            if tender_raw.get('dataPublicacaoPncp'):
-                try:
-                    pub_date = datetime.fromisoformat(
-                        tender_raw['dataPublicacaoPncp'].replace('Z', '+00:00')
-                    ).date()
-                except:
-                    pass
-            
-            update_date = None
-            if tender_raw.get('dataAtualizacao'):
-                try:
-                    update_date = datetime.fromisoformat(
-                        tender_raw['dataAtualizacao'].replace('Z', '+00:00')
-                    )
-                except:
-                    pass
+            pub_date = self._parse_iso(raw_get('dataPublicacaoPncp'))
+            if pub_date:
+                pub_date = pub_date.date()
+            
+            update_date = self._parse_iso(raw_get('dataAtualizacao'))
             
             # Build PNCP ID
-            pncp_id = None
-            if tender_raw.get('numeroControlePncp'):
-                pncp_id = tender_raw['numeroControlePncp']
-            elif all([tender_raw.get('anoCompra'), tender_raw.get('sequencialCompra'), org_info.get('cnpj')]):
-                pncp_id = f"{org_info['cnpj']}-{tender_raw['anoCompra']}-{tender_raw['sequencialCompra']}"
+            pncp_id = raw_get('numeroControlePncp') or None
+            if not pncp_id:
+                year = raw_get('anoCompra')
+                sequence = raw_get('sequencialCompra')
+                if year and sequence and cnpj:
+                    pncp_id = f"{cnpj}-{year}-{sequence}"
             
             parsed_data = {
                 'pncp_id': pncp_id,
-                'title': tender_raw.get('numeroCompra', 'Sem título'),
+                'title': raw_get('numeroCompra', 'Sem título'),
                 'description': legal_info.get('descricao', ''),
                 'organization_name': org_info.get('razaoSocial', ''),
-                'organization_cnpj': org_info.get('cnpj', ''),
+                'organization_cnpj': cnpj,
                 'municipality_name': unit_info.get('municipioNome', ''),
                 'municipality_ibge': unit_info.get('codigoIbge', ''),
                 'state_code': unit_info.get('ufSigla', ''),
@@ -166,7 +200,7 @@ class PNCPClient:
                 'status': 'Publicado',  # Default status
                 'modality': legal_info.get('nome', ''),
                 'estimated_value': None,  # Not available in this endpoint
-                'source_url': f"https://pncp.gov.br/app/editais/{pncp_id}" if pncp_id else None,
+                'source_url': self.EDITAL_URL + pncp_id if pncp_id else None,
                 'data_source': 'PNCP'
             }
             
@@ -192,60 +226,150 @@ class PNCPClient:
         Returns:
             List of parsed tender data
         """
+        all_tenders = []
+        for city_tenders in self.iter_city_tenders(city_ibge_codes, days_back):
+            all_tenders.extend(city_tenders)
+        
+        logger.info(f"Total tenders fetched: {len(all_tenders)}")
+        return all_tenders
+    
+    def iter_city_tenders(
+        self,
+        city_ibge_codes: List[str],
+        days_back: int = 30
+    ) -> Iterator[List[Dict]]:
+        """
+        Yield each city's parsed tenders as soon as that city is fetched
+        
+        Cities are fetched concurrently and yielded in completion order, so the
+        caller can save one batch while the slower cities are still downloading.
+        
+        Args:
+            city_ibge_codes: List of IBGE codes for cities
+            days_back: Number of days to look back from today
+            
+        Yields:
+            List of parsed tender data of one city (duplicates of earlier batches removed)
+        """
         end_date = date.today()
         start_date = date.today().replace(day=1)  # First day of current month
         
-        all_tenders = []
+        seen = set()
+        duplicates = 0
+        
+        # Each city costs two requests of pure network wait: fetch them concurrently
+        workers = max(1, min(PNCP_FETCH_WORKERS, len(city_ibge_codes)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self._fetch_city_tenders, ibge_code, start_date.isoformat(), end_date.isoformat())
+                for ibge_code in city_ibge_codes
+            ]
+            for future in as_completed(futures):
+                batch = []
+                for tender in future.result():
+                    # A tender listed by both /publicacao and /proposta is kept once
+                    # (the first occurrence, as the ON CONFLICT insert would)
+                    pncp_id = tender['pncp_id']
+                    if pncp_id:
+                        if pncp_id in seen:
+                            duplicates += 1
+                            continue
+                        seen.add(pncp_id)
+                    batch.append(tender)
+                yield batch
         
-        for ibge_code in city_ibge_codes:
+        if duplicates:
+            logger.info(f"Skipped {duplicates} duplicate tenders across PNCP endpoints")
+        logger.info(f"PNCP response cache: {self.get_tenders_by_publication_date.cache_info()}")
+    
+    def _fetch_city_tenders(self, ibge_code: str, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Fetch and parse recent and open-proposal tenders for a single city
+        
+        Args:
+            ibge_code: IBGE code of the city
+            start_date: Start date in YYYY-MM-DD format
+            end_date: End date in YYYY-MM-DD format
+            
+        Returns:
+            List of parsed tender data (empty on error)
+        """
+        city_tenders = []
+        
+        try:
+            logger.info(f"Fetching tenders for city {ibge_code}")
+            
+            # Fetch and parse recent tenders, page by page
+            for response in self._iter_publication_pages(ibge_code, start_date, end_date):
+                for tender_raw in response.get('data', []):
+                    try:
+                        parsed_tender = self.parse_tender_data(tender_raw)
+                        city_tenders.append(parsed_tender)
+                    except Exception as e:
+                        logger.error(f"Error parsing tender: {e}")
+                        continue
+            
+            # Fetch open proposals
             try:
-                logger.info(f"Fetching tenders for city {ibge_code}")
-                
-                # Fetch recent tenders
-                response = self.get_tenders_by_publication_date(
-                    start_date=start_date.isoformat(),
-                    end_date=end_date.isoformat(),
+                open_response = self.get_tenders_with_open_proposals(
                     municipality_ibge=ibge_code,
                     page=1,
-                    page_size=100
+                    page_size=50
                 )
                 
-                # Parse tender data
-                for tender_raw in response.get('data', []):
+                for tender_raw in open_response.get('data', []):
                     try:
                         parsed_tender = self.parse_tender_data(tender_raw)
-                        all_tenders.append(parsed_tender)
+                        parsed_tender['status'] = 'Recebendo Propostas'
+                        city_tenders.append(parsed_tender)
                     except Exception as e:
-                        logger.error(f"Error parsing tender: {e}")
+                        logger.error(f"Error parsing open tender: {e}")
                         continue
+                        
+            except Exception as e:
+                logger.warning(f"Could not fetch open proposals for {ibge_code}: {e}")
+            
+        except Exception as e:
+            logger.error(f"Error fetching tenders for city {ibge_code}: {e}")
+        
+        return city_tenders
+    
+    def _iter_publication_pages(self, ibge_code: str, start_date: str, end_date: str):
+        """
+        Yield /publicacao pages of a city, up to PNCP_MAX_PAGES
+        
+        The next page is requested in the background before the current one is
+        yielded, so its download overlaps the caller's parsing. Stops at a short
+        page or at totalPaginas. An error on the first page is raised; on later
+        pages it is logged and the pages already read are kept.
+        """
+        def fetch(page):
+            return self.get_tenders_by_publication_date(
+                start_date=start_date,
+                end_date=end_date,
+                municipality_ibge=ibge_code,
+                page=page,
+                page_size=PNCP_PAGE_SIZE
+            )
+        
+        response = fetch(1)
+        with ThreadPoolExecutor(max_workers=1) as prefetcher:
+            page = 1
+            while True:
+                total_pages = response.get('totalPaginas') or PNCP_MAX_PAGES
+                has_next = (
+                    len(response.get('data', [])) >= PNCP_PAGE_SIZE
+                    and page < min(total_pages, PNCP_MAX_PAGES)
+                )
+                next_page = prefetcher.submit(fetch, page + 1) if has_next else None
+                
+                yield response
                 
-                # Fetch open proposals
+                if next_page is None:
+                    return
                 try:
-                    open_response = self.get_tenders_with_open_proposals(
-                        municipality_ibge=ibge_code,
-                        page=1,
-                        page_size=50
-                    )
-                    
-                    for tender_raw in open_response.get('data', []):
-                        try:
-                            parsed_tender = self.parse_tender_data(tender_raw)
-                            parsed_tender['status'] = 'Recebendo Propostas'
-                            all_tenders.append(parsed_tender)
-                        except Exception as e:
-                            logger.error(f"Error parsing open tender: {e}")
-                            continue
-                            
+                    response = next_page.result()
                 except Exception as e:
-                    logger.warning(f"Could not fetch open proposals for {ibge_code}: {e}")
-                
-                # Rate limiting
-                time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"Error fetching tenders for city {ibge_code}: {e}")
-                continue
-        
-        logger.info(f"Total tenders fetched: {len(all_tenders)}")
-        return all_tenders
-
+                    logger.warning(f"Stopped at page {page} for city {ibge_code}: {e}")
+                    return
+                page += 1
@@ -1,12 +1,69 @@
+import os
+import orjson
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date
+from itertools import chain
 from typing import List, Dict, Optional
 import re
-import time
+from requests.adapters import HTTPAdapter
+
+from src.services.response_cache import ttl_cache
+from src.services.rate_limiter import get_rate_limiter, rate_limited_get
 
 logger = logging.getLogger(__name__)
 
+# Request budget shared by all Querido Diário calls of the process (token bucket)
+QUERIDO_DIARIO_REQUESTS_PER_SECOND = float(os.getenv('QUERIDO_DIARIO_REQUESTS_PER_SECOND', 1))
+
+# Seconds a parsed GET response is reused for identical parameters
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 300))
+
+# The city list is nearly static
+CITIES_CACHE_TTL = int(os.getenv('CITIES_CACHE_TTL', 24 * 3600))
+
+# Gazette search pagination: page size, territory ids per search (keeps the URL short),
+# results read per territory chunk and pages fetched concurrently
+GAZETTE_PAGE_SIZE = 100
+TERRITORY_CHUNK_SIZE = 50
+MAX_GAZETTES_PER_CHUNK = int(os.getenv('QUERIDO_DIARIO_MAX_GAZETTES', 1000))
+QUERIDO_DIARIO_FETCH_WORKERS = int(os.getenv('QUERIDO_DIARIO_FETCH_WORKERS', 4))
+
+TENDER_QUERYSTRING = "licitação OR edital OR pregão OR concorrência"
+
+# Excerpt characters kept as the tender description
+DESCRIPTION_MAX_CHARS = 500
+
+# Common patterns for tender information, compiled once
+# Edital/aviso or pregão number in one alternation (one scan of the excerpt)
+_TITLE_RE = re.compile(
+    r'(?:(?:EDITAL|AVISO)(?:\s+DE)?(?:\s+LICITAÇÃO)?|PREGÃO(?:\s+ELETRÔNICO)?)\s+N[°º]?\s*(\d+/\d+)',
+    re.IGNORECASE
+)
+_MODALITY_RE = re.compile(r'(?:MODALIDADE|TIPO):\s*([A-ZÁÊÇÕ\s]+)', re.IGNORECASE)
+_OBJECT_RE = re.compile(r'(?:OBJETO|FINALIDADE):\s*([^.]+)', re.IGNORECASE)
+_VALUE_RE = re.compile(r'(?:VALOR|PREÇO)\s*(?:ESTIMADO|MÁXIMO|TOTAL)?:?\s*R\$\s*([\d.,]+)', re.IGNORECASE)
+_DEADLINE_RE = re.compile(r'(?:PRAZO|DATA\s+LIMITE|ENTREGA):\s*(\d{1,2}/\d{1,2}/\d{4})', re.IGNORECASE)
+
+# (tender_info key, pattern) for the fields taken from the first capture group
+_FIELD_PATTERNS = (
+    ('modality', _MODALITY_RE),
+    ('object', _OBJECT_RE),
+    ('value', _VALUE_RE),
+    ('deadline', _DEADLINE_RE),
+)
+
+# Literals each pattern needs (in the upper-cased excerpt): a field's regex only runs
+# if every group has at least one of its literals present
+_FIELD_LITERALS = {
+    'title': (('EDITAL', 'AVISO', 'PREGÃO'), ('/',)),
+    'modality': (('MODALIDADE:', 'TIPO:'),),
+    'object': (('OBJETO:', 'FINALIDADE:'),),
+    'value': (('VALOR', 'PREÇO'), ('R$',)),
+    'deadline': (('PRAZO:', 'LIMITE:', 'ENTREGA:'), ('/',)),
+}
+
 class QueridoDiarioClient:
     """Client for Querido Diário API"""
     
@@ -16,9 +73,16 @@ class QueridoDiarioClient:
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'MVP-Licitacoes-Bot/1.0',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Connection': 'keep-alive'
         })
+        # A single host: one kept-alive pool; retries are done by rate_limited_get
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(QUERIDO_DIARIO_FETCH_WORKERS, 1), max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.limiter = get_rate_limiter('queridodiario.ok.org.br', QUERIDO_DIARIO_REQUESTS_PER_SECOND)
     
+    @ttl_cache(maxsize=256, ttl=API_CACHE_TTL)
     def search_gazettes(
         self,
         territory_ids: List[str],
@@ -59,10 +123,10 @@ class QueridoDiarioClient:
         
         try:
             logger.info(f"Searching gazettes in Querido Diário: {params}")
-            response = self.session.get(endpoint, params=params, timeout=30)
+            response = rate_limited_get(self.session, self.limiter, endpoint, params=params, timeout=30)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             logger.info(f"Successfully found {len(data.get('gazettes', []))} gazette results")
             return data
             
@@ -73,6 +137,7 @@ class QueridoDiarioClient:
             logger.error(f"Unexpected error: {e}")
             raise
     
+    @ttl_cache(maxsize=256, ttl=CITIES_CACHE_TTL)
     def get_cities(self, name_filter: Optional[str] = None) -> Dict:
         """
         Get available cities from Querido Diário
@@ -91,10 +156,10 @@ class QueridoDiarioClient:
         
         try:
             logger.info(f"Fetching cities from Querido Diário: {params}")
-            response = self.session.get(endpoint, params=params, timeout=30)
+            response = rate_limited_get(self.session, self.limiter, endpoint, params=params, timeout=30)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             logger.info(f"Successfully fetched {len(data.get('cities', []))} cities")
             return data
             
@@ -124,29 +189,25 @@ class QueridoDiarioClient:
         }
         
         try:
-            # Common patterns for tender information
-            patterns = {
-                'edital_number': r'(?:EDITAL|AVISO)\s+(?:DE\s+)?(?:LICITAÇÃO\s+)?N[°º]?\s*(\d+/\d+)',
-                'pregao_number': r'PREGÃO\s+(?:ELETRÔNICO\s+)?N[°º]?\s*(\d+/\d+)',
-                'modality': r'(?:MODALIDADE|TIPO):\s*([A-ZÁÊÇÕ\s]+)',
-                'object': r'(?:OBJETO|FINALIDADE):\s*([^.]+)',
-                'value': r'(?:VALOR|PREÇO)\s*(?:ESTIMADO|MÁXIMO|TOTAL)?:?\s*R\$\s*([\d.,]+)',
-                'deadline': r'(?:PRAZO|DATA\s+LIMITE|ENTREGA):\s*(\d{1,2}/\d{1,2}/\d{4})'
+            # Skip the regexes whose required literals are absent (one upper-casing
+            # plus substring checks instead of a full regex scan per field)
+            excerpt_upper = excerpt.upper()
+            candidates = {
+                field for field, groups in _FIELD_LITERALS.items()
+                if all(any(literal in excerpt_upper for literal in group) for group in groups)
             }
             
             # Extract title (edital or pregão number)
-            for pattern_name in ['edital_number', 'pregao_number']:
-                match = re.search(patterns[pattern_name], excerpt, re.IGNORECASE)
+            if 'title' in candidates:
+                match = _TITLE_RE.search(excerpt)
                 if match:
                     tender_info['title'] = match.group(0)
-                    break
             
             # Extract other information
-            for field, pattern in patterns.items():
-                if field in ['edital_number', 'pregao_number']:
+            for field, pattern in _FIELD_PATTERNS:
+                if field not in candidates:
                     continue
-                    
-                match = re.search(pattern, excerpt, re.IGNORECASE)
+                match = pattern.search(excerpt)
                 if match:
                     tender_info[field] = match.group(1).strip()
             
@@ -156,17 +217,20 @@ class QueridoDiarioClient:
             logger.error(f"Error extracting tender info from excerpt: {e}")
             return tender_info
     
-    def parse_gazette_data(self, gazette_raw: Dict) -> List[Dict]:
+    def parse_gazette_data(self, gazette_raw: Dict, now: Optional[datetime] = None) -> List[Dict]:
         """
         Parse raw gazette data from Querido Diário API into tender format
         
         Args:
             gazette_raw: Raw gazette data from API
+            now: Ingestion timestamp stored as update_date (default: datetime.utcnow())
             
         Returns:
             List of parsed tender data
         """
         tenders = []
+        if now is None:
+            now = datetime.utcnow()
         
         try:
             # Extract basic gazette info
@@ -185,7 +249,7 @@ class QueridoDiarioClient:
             
             # Process excerpts
             for excerpt_data in gazette_raw.get('excerpts', []):
-                excerpt_text = excerpt_data.get('excerpt', '')
+                excerpt_text = excerpt_data.get('excerpt') or ''
                 
                 # Extract tender information from excerpt
                 tender_info = self.extract_tender_info_from_excerpt(excerpt_text)
@@ -195,14 +259,17 @@ class QueridoDiarioClient:
                     parsed_tender = {
                         'pncp_id': None,  # Not available from Querido Diário
                         'title': tender_info['title'] or 'Licitação identificada em diário oficial',
-                        'description': excerpt_text[:500] + '...' if len(excerpt_text) > 500 else excerpt_text,
+                        'description': (
+                            excerpt_text if len(excerpt_text) <= DESCRIPTION_MAX_CHARS
+                            else excerpt_text[:DESCRIPTION_MAX_CHARS] + '...'
+                        ),
                         'organization_name': territory_name,
                         'organization_cnpj': None,
                         'municipality_name': territory_name,
                         'municipality_ibge': territory_id,
                         'state_code': state_code,
                         'publication_date': pub_date,
-                        'update_date': datetime.utcnow(),
+                        'update_date': now,
                         'status': 'Publicado',
                         'modality': tender_info['modality'],
                         'estimated_value': None,  # Would need more complex parsing
@@ -236,36 +303,74 @@ class QueridoDiarioClient:
         """
         end_date = date.today()
         start_date = date.today().replace(day=1)  # First day of current month
+        published_since = start_date.isoformat()
+        published_until = end_date.isoformat()
+        
+        # One ingestion timestamp for the whole run
+        now = datetime.utcnow()
         
         all_tenders = []
         
-        try:
-            logger.info(f"Fetching gazette tenders for cities: {city_ibge_codes}")
-            
-            # Search for tender-related content
-            response = self.search_gazettes(
-                territory_ids=city_ibge_codes,
-                querystring="licitação OR edital OR pregão OR concorrência",
-                published_since=start_date.isoformat(),
-                published_until=end_date.isoformat(),
-                size=100
-            )
-            
-            # Parse gazette data
-            for gazette_raw in response.get('gazettes', []):
-                try:
-                    parsed_tenders = self.parse_gazette_data(gazette_raw)
-                    all_tenders.extend(parsed_tenders)
-                except Exception as e:
-                    logger.error(f"Error parsing gazette: {e}")
-                    continue
+        logger.info(f"Fetching gazette tenders for cities: {city_ibge_codes}")
+        
+        codes = list(city_ibge_codes)
+        chunks = [codes[i:i + TERRITORY_CHUNK_SIZE] for i in range(0, len(codes), TERRITORY_CHUNK_SIZE)]
+        if not chunks:
+            return all_tenders
+        
+        def fetch_page(job):
+            # Parsing runs in the worker as soon as its page lands, overlapping the
+            # network wait of the other pages instead of running after all of them
+            territory_ids, offset = job
+            response = self._search_tender_page(territory_ids, published_since, published_until, offset)
+            return response.get('total_gazettes', 0), self._parse_gazettes(response, now)
+        
+        with ThreadPoolExecutor(max_workers=max(1, QUERIDO_DIARIO_FETCH_WORKERS)) as executor:
+            # First page of every chunk tells how many gazettes match
+            first_pages = list(executor.map(fetch_page, [(chunk, 0) for chunk in chunks]))
             
-            # Rate limiting
-            time.sleep(1)
+            # Remaining pages of all chunks, fetched concurrently
+            page_jobs = []
+            for chunk, (total, _) in zip(chunks, first_pages):
+                if total > MAX_GAZETTES_PER_CHUNK:
+                    logger.warning(f"Gazette search capped at {MAX_GAZETTES_PER_CHUNK} of {total} results")
+                    total = MAX_GAZETTES_PER_CHUNK
+                page_jobs.extend((chunk, offset) for offset in range(GAZETTE_PAGE_SIZE, total, GAZETTE_PAGE_SIZE))
             
-        except Exception as e:
-            logger.error(f"Error fetching gazette tenders: {e}")
+            for _, page_tenders in chain(first_pages, executor.map(fetch_page, page_jobs)):
+                all_tenders.extend(page_tenders)
         
         logger.info(f"Total gazette tenders fetched: {len(all_tenders)}")
         return all_tenders
-
+    
+    def _parse_gazettes(self, response: Dict, now: Optional[datetime] = None) -> List[Dict]:
+        """Parse every gazette of a search response into tenders"""
+        tenders = []
+        for gazette_raw in response.get('gazettes', []):
+            try:
+                tenders.extend(self.parse_gazette_data(gazette_raw, now))
+            except Exception as e:
+                logger.error(f"Error parsing gazette: {e}")
+                continue
+        return tenders
+    
+    def _search_tender_page(
+        self,
+        territory_ids: List[str],
+        published_since: str,
+        published_until: str,
+        offset: int
+    ) -> Dict:
+        """One page of the tender gazette search (empty dict on error, so other pages still count)"""
+        try:
+            return self.search_gazettes(
+                territory_ids=territory_ids,
+                querystring=TENDER_QUERYSTRING,
+                published_since=published_since,
+                published_until=published_until,
+                size=GAZETTE_PAGE_SIZE,
+                offset=offset
+            )
+        except Exception as e:
+            logger.error(f"Error fetching gazette tenders (offset {offset}): {e}")
+            return {}
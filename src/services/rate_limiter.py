@@ -0,0 +1,213 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Pause applied on a 429 without a usable Retry-After header (seconds)
+DEFAULT_RETRY_AFTER = 5
+
+# Attempts per request on transient failures (429/5xx, connection error, timeout)
+MAX_ATTEMPTS = 5
+
+# Exponential backoff with full jitter: sleep uniform(0, BACKOFF_BASE * 2**attempt) seconds
+BACKOFF_BASE = 0.25
+
+# Statuses worth retrying (anything else is returned to the caller as is)
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Statuses read as "server overloaded" by the concurrency controller
+OVERLOAD_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second, bursts of up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._blocked_until:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._blocked_until - now
+            time.sleep(wait)
+
+    def penalize(self, retry_after: float):
+        """Drain the bucket and stop refilling for `retry_after` seconds (server asked to slow down)"""
+        with self._lock:
+            self._tokens = 0
+            self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+            self._updated = self._blocked_until
+
+
+class AIMDController:
+    """
+    Adaptive concurrency limit (additive increase, multiplicative decrease)
+
+    Callers hold a slot() around each request and report it with record(). A fast
+    healthy response raises the limit by `alpha`; an overload status, a connection
+    error or a response slower than `target_latency` multiplies it by `beta`.
+    """
+
+    def __init__(self, cmin: int = 1, cmax: int = 16, initial: Optional[float] = None,
+                 target_latency: float = 2.0, alpha: float = 0.5, beta: float = 0.5):
+        self.cmin = cmin
+        self.cmax = cmax
+        self.target_latency = target_latency
+        self.alpha = alpha
+        self.beta = beta
+        self.current = float(initial if initial is not None else cmax)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self):
+        """Wait until fewer than int(current) requests are in flight"""
+        with self._cond:
+            while self._in_flight >= int(self.current):
+                self._cond.wait()
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def increase(self):
+        with self._cond:
+            self.current = min(self.cmax, self.current + self.alpha)
+            self._cond.notify_all()
+
+    def decrease(self):
+        with self._cond:
+            self.current = max(self.cmin, self.current * self.beta)
+
+    def record(self, latency: float, status_code: Optional[int] = None):
+        """Feed one request outcome (status_code None = connection error)"""
+        if status_code is None or status_code in OVERLOAD_STATUSES or latency > self.target_latency:
+            self.decrease()
+        else:
+            self.increase()
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_controllers: Dict[str, AIMDController] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(host: str, rate: float, capacity: Optional[float] = None) -> TokenBucket:
+    """Shared limiter per host, so every client instance respects the same budget"""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = TokenBucket(rate, capacity)
+        return limiter
+
+
+def get_concurrency_controller(host: str, cmax: int) -> AIMDController:
+    """Shared AIMD controller per host, starting at (and never above) cmax"""
+    with _limiters_lock:
+        controller = _controllers.get(host)
+        if controller is None:
+            controller = _controllers[host] = AIMDController(cmax=max(1, cmax))
+        return controller
+
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return DEFAULT_RETRY_AFTER
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+def _timed_get(session: requests.Session, controller: Optional[AIMDController], url: str, **kwargs) -> requests.Response:
+    """session.get inside a controller slot, reporting latency and status to it"""
+    if controller is None:
+        return session.get(url, **kwargs)
+
+    with controller.slot():
+        start = time.monotonic()
+        try:
+            response = session.get(url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            controller.record(time.monotonic() - start)
+            raise
+        controller.record(time.monotonic() - start, response.status_code)
+        return response
+
+
+def rate_limited_get(session: requests.Session, limiter: TokenBucket, url: str,
+                     controller: Optional[AIMDController] = None, **kwargs) -> requests.Response:
+    """
+    GET through the limiter (and the concurrency controller, if given), retrying
+    transient failures up to MAX_ATTEMPTS times
+
+    A 429 penalizes the limiter for the Retry-After period; other retryable statuses
+    wait for Retry-After when present, otherwise for an exponential backoff with full
+    jitter. Connection errors and timeouts are re-raised after the last attempt.
+
+    Returns:
+        The last response (callers still call raise_for_status)
+    """
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        limiter.acquire()
+        try:
+            response = _timed_get(session, controller, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if last_attempt:
+                raise
+            delay = random.uniform(0, BACKOFF_BASE * 2 ** attempt)
+            logger.warning(f"Transient error on {url} ({e}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code not in RETRY_STATUSES or last_attempt:
+            return response
+
+        retry_after = response.headers.get('Retry-After')
+        if response.status_code == 429:
+            delay = parse_retry_after(retry_after)
+            # The limiter holds every caller of this host, not only this request
+            limiter.penalize(delay)
+        else:
+            delay = parse_retry_after(retry_after) if retry_after else random.uniform(0, BACKOFF_BASE * 2 ** attempt)
+            time.sleep(delay)
+        logger.warning(f"HTTP {response.status_code} from {url}, retrying in {delay:.2f}s")
+
+    return response
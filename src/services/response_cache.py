@@ -0,0 +1,137 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable
+
+import orjson
+
+try:
+    import redis  # Optional: cache shared by processes and kept across restarts
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Second-level cache (only used when set and the redis package is installed)
+REDIS_URL = os.getenv('REDIS_URL')
+REDIS_KEY_PREFIX = 'api-cache:'
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def _get_redis():
+    """Shared Redis client, or None when not configured"""
+    global _redis_client
+    if redis is None or not REDIS_URL:
+        return None
+    if _redis_client is None:
+        with _redis_lock:
+            if _redis_client is None:
+                _redis_client = redis.Redis.from_url(REDIS_URL)
+    return _redis_client
+
+
+def _redis_get(redis_key: str):
+    client = _get_redis()
+    if client is None:
+        return None
+    try:
+        raw = client.get(redis_key)
+        return orjson.loads(zlib.decompress(raw)) if raw is not None else None
+    except Exception as e:
+        logger.warning(f"Redis cache read failed: {e}")
+        return None
+
+
+def _redis_set(redis_key: str, value, ttl: float):
+    client = _get_redis()
+    if client is None:
+        return
+    try:
+        client.setex(redis_key, int(ttl), zlib.compress(orjson.dumps(value)))
+    except Exception as e:
+        logger.warning(f"Redis cache write failed: {e}")
+
+
+def _freeze(value):
+    """Hashable form of an argument (lists/dicts come from params such as territory_ids)"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def ttl_cache(maxsize: int = 256, ttl: float = 300) -> Callable:
+    """
+    In-memory LRU cache with expiry for idempotent client GET methods
+
+    The key is the method plus its arguments (the client instance is ignored, so every
+    client of the process shares the entries). Parsed responses are cached, so a hit
+    skips both the request and the JSON decoding; callers must not mutate them.
+    Exceptions are not cached.
+
+    With REDIS_URL set, local misses fall back to Redis (SHA-256 of the key, value as
+    zlib-compressed JSON, same TTL), so workers and restarts share fetched pages.
+    """
+    def decorator(method):
+        entries = OrderedDict()
+        lock = threading.Lock()
+        stats = {'hits': 0, 'redis_hits': 0, 'misses': 0}
+
+        def store(key, result):
+            with lock:
+                entries[key] = (time.monotonic() + ttl, result)
+                entries.move_to_end(key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (_freeze(args), _freeze(kwargs))
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] > now:
+                    entries.move_to_end(key)
+                    stats['hits'] += 1
+                    logger.debug(f"{method.__qualname__} cache hit ({stats['hits']} hits, {stats['misses']} misses)")
+                    return entry[1]
+
+            redis_key = REDIS_KEY_PREFIX + hashlib.sha256(
+                repr((method.__qualname__, key)).encode('utf-8')
+            ).hexdigest()
+            result = _redis_get(redis_key)
+            if result is not None:
+                with lock:
+                    stats['redis_hits'] += 1
+                store(key, result)
+                return result
+
+            with lock:
+                stats['misses'] += 1
+
+            result = method(self, *args, **kwargs)
+            _redis_set(redis_key, result, ttl)
+            store(key, result)
+            return result
+
+        def cache_info():
+            with lock:
+                return {**stats, 'size': len(entries)}
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
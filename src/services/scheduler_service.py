@@ -1,20 +1,71 @@
 import logging
 import json
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor as StateThreadPool, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from apscheduler.events import (
+    EVENT_ALL_JOBS_REMOVED, EVENT_JOB_ADDED, EVENT_JOB_ERROR, EVENT_JOB_EXECUTED,
+    EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MODIFIED, EVENT_JOB_REMOVED, EVENT_JOB_SUBMITTED
+)
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_RUNNING
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.jobstores.memory import MemoryJobStore
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor
 import atexit
+from sqlalchemy import text
+
+try:
+    import redis
+    from apscheduler.jobstores.redis import RedisJobStore
+except ImportError:
+    redis = None
 
 from src.services.scraper_integration import ScraperIntegrationService
 from src.services.pdf_integration import PDFIntegrationService
-from src.models.user import db
+from src.models.user import db, no_expire_on_commit
 
 logger = logging.getLogger(__name__)
 
+# Redis para os jobs customizados (sem ele, ficam no banco via SQLAlchemy)
+REDIS_URL = os.getenv('REDIS_URL')
+
+# Eventos que mudam a lista de jobs ou o próximo horário de algum deles
+JOBS_CHANGED_EVENTS = (
+    EVENT_ALL_JOBS_REMOVED | EVENT_JOB_ADDED | EVENT_JOB_REMOVED | EVENT_JOB_MODIFIED
+    | EVENT_JOB_SUBMITTED | EVENT_JOB_MAX_INSTANCES
+)
+
+# Eventos acompanhados por get_scheduler_status (sem consultar o jobstore)
+JOB_STATUS_EVENTS = (
+    EVENT_ALL_JOBS_REMOVED | EVENT_JOB_ADDED | EVENT_JOB_REMOVED | EVENT_JOB_MODIFIED
+    | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
+)
+
+# Segundos que a lista serializada de get_jobs é reaproveitada mesmo sem eventos
+JOBS_CACHE_TTL = 5
+
+# Tabelas limpas pelo job semanal: (tabela, coluna de data). Valores fixos do código,
+# nunca vindos de requisição (entram no SQL por interpolação). Vazio de propósito: ainda
+# não existe tabela de logs, e editais/tenders são dados do produto, não lixo a expirar;
+# até uma tabela ser adicionada aqui, a limpeza semanal não apaga nada
+CLEANUP_TARGETS = ()
+CLEANUP_RETENTION_DAYS = 30
+
+# Linhas apagadas por DELETE na limpeza (lotes curtos não seguram locks por muito tempo)
+CLEANUP_BATCH_SIZE = 10000
+
+# Estados principais para scraping diário
+MAIN_STATES = ('SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'GO', 'PE', 'CE')
+
+# Estados raspados em paralelo (cada um abre seu próprio navegador); limita a carga no PNCP
+SCRAPING_STATE_WORKERS = int(os.getenv('SCRAPING_STATE_WORKERS', 4))
+
 class SchedulerService:
     """Serviço de agendamento para automação de tarefas"""
     
@@ -24,18 +75,42 @@ class SchedulerService:
         self.scraper_service = ScraperIntegrationService()
         self.pdf_service = PDFIntegrationService()
         
+        # Cache de get_jobs: invalidado pelos eventos do scheduler (stamp) ou pelo TTL
+        self._jobs_cache = None
+        self._jobs_cache_stamp = 0
+        # (str(trigger), nome da função) por job id, refeito quando o job é alterado
+        self._job_labels = {}
+        
+        # Estado mantido pelos eventos do scheduler para get_scheduler_status
+        self._job_ids = set()
+        self._last_success_at = None
+        self._last_error = None
+        
         if app:
             self.init_app(app)
     
     def init_app(self, app):
         """Inicializa o scheduler com a aplicação Flask"""
+        global _JOB_APP
         self.app = app
+        # Os jobs estáticos (JOB_SPECS, customizados do jobstore) usam esta aplicação
+        _JOB_APP = app
+        
+        # Configuração do scheduler: os jobs padrão são recriados a cada start, então ficam em
+        # memória; só os customizados precisam sobreviver a reinícios
+        if redis is not None and REDIS_URL:
+            persistent_store = RedisJobStore(connection_pool=redis.ConnectionPool.from_url(REDIS_URL))
+        else:
+            persistent_store = SQLAlchemyJobStore(url=app.config['SQLALCHEMY_DATABASE_URI'])
         
-        # Configuração do scheduler
         jobstores = {
-            'default': SQLAlchemyJobStore(url=app.config['SQLALCHEMY_DATABASE_URI'])
+            'default': MemoryJobStore(),
+            'persistent': persistent_store
         }
         
+        # Todos os jobs rodam em threads: precisam do app context e do pool de conexões
+        # deste processo, e a análise de PDFs já distribui a parte de CPU em processos
+        # próprios (analyze_pdf_files)
         executors = {
             'default': ThreadPoolExecutor(20),
         }
@@ -51,9 +126,31 @@ class SchedulerService:
             job_defaults=job_defaults,
             timezone='America/Sao_Paulo'
         )
+        self.scheduler.add_listener(self._invalidate_jobs_cache, JOBS_CHANGED_EVENTS)
+        self.scheduler.add_listener(self._on_job_event, JOB_STATUS_EVENTS)
         
-        # Registrar shutdown
-        atexit.register(lambda: self.shutdown())
+        # Registrar shutdown: no SIGTERM (antes do interpretador começar a desmontar o
+        # estado do SQLAlchemy) e, como reserva, no atexit; nenhum dos dois espera jobs em curso
+        self._install_sigterm_handler()
+        atexit.register(self.shutdown)
+    
+    def _install_sigterm_handler(self):
+        """Para o scheduler no SIGTERM e repassa o sinal ao handler anterior (ex: gunicorn)"""
+        try:
+            previous = signal.getsignal(signal.SIGTERM)
+            
+            def handle_sigterm(signum, frame):
+                self.shutdown()
+                if callable(previous):
+                    previous(signum, frame)
+                elif previous == signal.SIG_DFL:
+                    signal.signal(signum, signal.SIG_DFL)
+                    os.kill(os.getpid(), signum)
+            
+            signal.signal(signal.SIGTERM, handle_sigterm)
+        except ValueError:
+            # signal.signal só funciona na thread principal
+            logger.warning("Handler de SIGTERM do scheduler não instalado (fora da thread principal)")
     
     def start(self):
         """Inicia o scheduler"""
@@ -62,53 +159,43 @@ class SchedulerService:
                 self.scheduler.start()
                 logger.info("Scheduler iniciado com sucesso")
                 
+                # Jobs persistidos de execuções anteriores não geram EVENT_JOB_ADDED
+                self._job_ids = {job.id for job in self.scheduler.get_jobs()}
+                
                 # Agendar jobs padrão
                 self._schedule_default_jobs()
                 
             except Exception as e:
                 logger.error(f"Erro ao iniciar scheduler: {str(e)}")
     
-    def shutdown(self):
-        """Para o scheduler"""
+    def shutdown(self, wait: bool = False):
+        """Para o scheduler (por padrão sem esperar os jobs em execução)"""
         if self.scheduler and self.scheduler.running:
             try:
-                self.scheduler.shutdown()
+                self.scheduler.shutdown(wait=wait)
                 logger.info("Scheduler parado com sucesso")
             except Exception as e:
                 logger.error(f"Erro ao parar scheduler: {str(e)}")
     
+    def _register_job(self, job_id: str, func=None):
+        """
+        Agenda um job de JOB_SPECS
+        
+        Args:
+            job_id: Chave em JOB_SPECS
+            func: Substitui a função estática do spec (ex: método ligado ao serviço)
+        """
+        spec = dict(JOB_SPECS[job_id])
+        if func is not None:
+            spec['func'] = func
+        
+        self.scheduler.add_job(id=job_id, replace_existing=True, **spec)
+    
     def _schedule_default_jobs(self):
         """Agenda jobs padrão do sistema"""
         try:
-            # Job 1: Scraping diário às 6h da manhã
-            self.scheduler.add_job(
-                func=run_daily_scraping_job,
-                trigger=CronTrigger(hour=6, minute=0),
-                id='daily_scraping',
-                name='Scraping Diário de Licitações',
-                replace_existing=True,
-                misfire_grace_time=3600  # 1 hora de tolerância
-            )
-            
-            # Job 2: Análise de PDFs pendentes a cada 2 horas
-            self.scheduler.add_job(
-                func=run_pdf_analysis_job,
-                trigger=IntervalTrigger(hours=2),
-                id='pdf_analysis',
-                name='Análise de PDFs Pendentes',
-                replace_existing=True,
-                misfire_grace_time=1800  # 30 minutos de tolerância
-            )
-            
-            # Job 3: Limpeza de logs antigos semanalmente
-            self.scheduler.add_job(
-                func=run_cleanup_job,
-                trigger=CronTrigger(day_of_week=6, hour=2, minute=0),  # Domingo
-                id='weekly_cleanup',
-                name='Limpeza Semanal de Dados',
-                replace_existing=True,
-                misfire_grace_time=7200  # 2 horas de tolerância
-            )
+            for job_id in JOB_SPECS:
+                self._register_job(job_id)
             
             logger.info("Jobs padrão agendados com sucesso")
             
@@ -118,16 +205,7 @@ class SchedulerService:
     def schedule_daily_scraping(self):
         """Agenda scraping diário de licitações"""
         try:
-            # Scraping diário às 6h da manhã
-            self.scheduler.add_job(
-                func=self._run_daily_scraping,
-                trigger=CronTrigger(hour=6, minute=0),
-                id='daily_scraping',
-                name='Scraping Diário de Licitações',
-                replace_existing=True,
-                misfire_grace_time=3600  # 1 hora de tolerância
-            )
-            
+            self._register_job('daily_scraping', self._run_daily_scraping)
             logger.info("Job de scraping diário agendado para 06:00")
             
         except Exception as e:
@@ -136,16 +214,7 @@ class SchedulerService:
     def schedule_pdf_analysis(self):
         """Agenda análise de PDFs pendentes"""
         try:
-            # Análise de PDFs a cada 2 horas
-            self.scheduler.add_job(
-                func=self._run_pdf_analysis,
-                trigger=IntervalTrigger(hours=2),
-                id='pdf_analysis',
-                name='Análise de PDFs Pendentes',
-                replace_existing=True,
-                misfire_grace_time=1800  # 30 minutos de tolerância
-            )
-            
+            self._register_job('pdf_analysis', self._run_pdf_analysis)
             logger.info("Job de análise de PDFs agendado a cada 2 horas")
             
         except Exception as e:
@@ -154,16 +223,7 @@ class SchedulerService:
     def schedule_cleanup(self):
         """Agenda limpeza de dados antigos"""
         try:
-            # Limpeza semanal aos domingos às 2h da manhã
-            self.scheduler.add_job(
-                func=self._run_cleanup,
-                trigger=CronTrigger(day_of_week=6, hour=2, minute=0),  # Domingo
-                id='weekly_cleanup',
-                name='Limpeza Semanal de Dados',
-                replace_existing=True,
-                misfire_grace_time=7200  # 2 horas de tolerância
-            )
-            
+            self._register_job('weekly_cleanup', self._run_cleanup)
             logger.info("Job de limpeza semanal agendado para domingos às 02:00")
             
         except Exception as e:
@@ -188,15 +248,7 @@ class SchedulerService:
             # Validar expressão cron
             trigger = CronTrigger.from_crontab(cron_expression)
             
-            self.scheduler.add_job(
-                func=run_custom_scraping_job,
-                trigger=trigger,
-                args=[states],
-                id=job_id,
-                name=f'Scraping Customizado - {", ".join(states)}',
-                replace_existing=True,
-                misfire_grace_time=1800
-            )
+            self._add_custom_scraping_job(states, trigger, job_id)
             
             logger.info(f"Job customizado '{job_id}' agendado para estados {states}")
             return job_id
@@ -205,35 +257,72 @@ class SchedulerService:
             logger.error(f"Erro ao agendar scraping customizado: {str(e)}")
             raise
     
+    def schedule_custom_scraping_bulk(self, specs: List[Dict]) -> List[str]:
+        """
+        Agenda vários scrapings customizados de uma vez
+        
+        Todas as expressões cron são validadas antes de gravar qualquer job, e o
+        processamento do scheduler fica pausado durante as inclusões (o dispatcher
+        acorda uma vez no fim, não a cada job).
+        
+        Args:
+            specs: Dicts com 'states', 'cron_expression' e opcionalmente 'job_id'
+            
+        Returns:
+            IDs dos jobs criados, na ordem de specs
+        """
+        try:
+            triggers = [CronTrigger.from_crontab(spec['cron_expression']) for spec in specs]
+            
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            job_ids = [
+                spec.get('job_id') or f"custom_scraping_{stamp}_{index}"
+                for index, spec in enumerate(specs)
+            ]
+            
+            # Só o scheduler em execução é pausado aqui: com state PAUSED (pausa do operador)
+            # running também é True, e o resume() do fim desfaria essa pausa
+            paused = self.scheduler.state == STATE_RUNNING
+            if paused:
+                self.scheduler.pause()
+            try:
+                for spec, trigger, job_id in zip(specs, triggers, job_ids):
+                    self._add_custom_scraping_job(spec['states'], trigger, job_id)
+            finally:
+                if paused:
+                    self.scheduler.resume()
+            
+            logger.info(f"{len(job_ids)} jobs customizados agendados")
+            return job_ids
+            
+        except Exception as e:
+            logger.error(f"Erro ao agendar scrapings customizados em lote: {str(e)}")
+            raise
+    
+    def _add_custom_scraping_job(self, states: List[str], trigger: CronTrigger, job_id: str):
+        """Grava um job de scraping customizado no jobstore persistente"""
+        self.scheduler.add_job(
+            func=run_custom_scraping_job,
+            trigger=trigger,
+            args=[states],
+            id=job_id,
+            name=f'Scraping Customizado - {", ".join(states)}',
+            replace_existing=True,
+            misfire_grace_time=1800,
+            jobstore='persistent'
+        )
+    
     def _run_daily_scraping(self):
         """Executa scraping diário para todos os estados principais"""
         logger.info("Iniciando scraping diário automático")
         
         try:
             with self.app.app_context():
-                # Estados principais para scraping diário
-                main_states = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'GO', 'PE', 'CE']
-                
-                results = {}
-                for state in main_states:
-                    try:
-                        logger.info(f"Executando scraping para {state}")
-                        result = self.scraper_service.run_scraping(
-                            uf_filter=state,
-                            limit_per_state=10  # Limite para não sobrecarregar
-                        )
-                        results[state] = result
-                        
-                        # Aguardar entre estados para não sobrecarregar o servidor
-                        import time
-                        time.sleep(30)
-                        
-                    except Exception as e:
-                        logger.error(f"Erro no scraping de {state}: {str(e)}")
-                        results[state] = {'error': str(e)}
+                # Limite de 10 por estado para não sobrecarregar
+                editais_data, _ = scrape_states(MAIN_STATES, limit=10, app=self.app)
                 
                 # Log do resultado
-                total_editais = sum(r.get('editais_salvos', 0) for r in results.values() if 'editais_salvos' in r)
+                total_editais = save_scraped_states(editais_data)
                 logger.info(f"Scraping diário concluído. Total de editais coletados: {total_editais}")
                 
                 # Executar análise de PDFs dos novos editais
@@ -248,25 +337,10 @@ class SchedulerService:
         
         try:
             with self.app.app_context():
-                results = {}
-                for state in states:
-                    try:
-                        logger.info(f"Executando scraping customizado para {state}")
-                        result = self.scraper_service.run_scraping(
-                            uf_filter=state,
-                            limit_per_state=20  # Limite maior para scraping customizado
-                        )
-                        results[state] = result
-                        
-                        # Aguardar entre estados
-                        import time
-                        time.sleep(45)
-                        
-                    except Exception as e:
-                        logger.error(f"Erro no scraping customizado de {state}: {str(e)}")
-                        results[state] = {'error': str(e)}
+                # Limite maior para scraping customizado
+                editais_data, _ = scrape_states(states, limit=20, app=self.app)
                 
-                total_editais = sum(r.get('editais_salvos', 0) for r in results.values() if 'editais_salvos' in r)
+                total_editais = save_scraped_states(editais_data)
                 logger.info(f"Scraping customizado concluído. Total de editais: {total_editais}")
                 
         except Exception as e:
@@ -277,7 +351,11 @@ class SchedulerService:
         logger.info("Iniciando análise de PDFs pendentes")
         
         try:
-            with self.app.app_context():
+            with self.app.app_context(), no_expire_on_commit(db.session):
+                if not self.pdf_service.has_pending():
+                    logger.info("Nenhum PDF pendente de análise")
+                    return
+                
                 result = self.pdf_service.analyze_all_pending_files()
                 
                 analyzed = result.get('analyzed', 0)
@@ -294,34 +372,71 @@ class SchedulerService:
         
         try:
             with self.app.app_context():
-                # Limpeza de logs antigos (mais de 30 dias)
-                cutoff_date = datetime.now() - timedelta(days=30)
-                
-                # Aqui você pode implementar limpeza específica
-                # Por exemplo, remover arquivos temporários, logs antigos, etc.
-                
-                logger.info("Limpeza de dados concluída")
+                deleted = cleanup_old_rows()
+                logger.info(f"Limpeza de dados concluída. Linhas removidas: {deleted}")
                 
         except Exception as e:
             logger.error(f"Erro na limpeza: {str(e)}")
     
+    def _on_job_event(self, event):
+        """Listener do scheduler: mantém os ids dos jobs e o resultado da última execução"""
+        if event.code == EVENT_JOB_ADDED:
+            self._job_ids.add(event.job_id)
+            # replace_existing também gera ADDED, possivelmente com outro trigger
+            self._job_labels.pop(event.job_id, None)
+        elif event.code == EVENT_JOB_MODIFIED:
+            self._job_labels.pop(event.job_id, None)
+        elif event.code == EVENT_JOB_REMOVED:
+            self._job_ids.discard(event.job_id)
+            self._job_labels.pop(event.job_id, None)
+        elif event.code == EVENT_ALL_JOBS_REMOVED:
+            self._job_ids = set()
+            self._job_labels = {}
+        elif event.code == EVENT_JOB_EXECUTED:
+            self._last_success_at = datetime.now()
+        elif event.code == EVENT_JOB_ERROR:
+            self._last_error = {
+                'job_id': event.job_id,
+                'error': str(event.exception),
+                'at': datetime.now().isoformat()
+            }
+    
+    def _invalidate_jobs_cache(self, event=None):
+        """Listener do scheduler: a próxima chamada de get_jobs serializa de novo"""
+        self._jobs_cache_stamp += 1
+    
     def get_jobs(self) -> List[Dict]:
         """Retorna lista de jobs agendados"""
         try:
             if not self.scheduler:
                 return []
             
+            cached = self._jobs_cache
+            if cached is not None:
+                stamp, built_at, jobs = cached
+                if stamp == self._jobs_cache_stamp and time.monotonic() - built_at < JOBS_CACHE_TTL:
+                    return list(jobs)
+            
+            stamp = self._jobs_cache_stamp
             jobs = []
             for job in self.scheduler.get_jobs():
+                labels = self._job_labels.get(job.id)
+                if labels is None:
+                    labels = self._job_labels[job.id] = (
+                        str(job.trigger),
+                        job.func.__name__ if hasattr(job.func, '__name__') else str(job.func)
+                    )
+                trigger, func = labels
                 jobs.append({
                     'id': job.id,
                     'name': job.name,
                     'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
-                    'trigger': str(job.trigger),
-                    'func': job.func.__name__ if hasattr(job.func, '__name__') else str(job.func)
+                    'trigger': trigger,
+                    'func': func
                 })
             
-            return jobs
+            self._jobs_cache = (stamp, time.monotonic(), jobs)
+            return list(jobs)
             
         except Exception as e:
             logger.error(f"Erro ao obter jobs: {str(e)}")
@@ -366,20 +481,35 @@ class SchedulerService:
             logger.error(f"Erro ao resumir job '{job_id}': {str(e)}")
             return False
     
-    def run_job_now(self, job_id: str) -> bool:
-        """Executa um job imediatamente"""
+    def run_job_now(self, job_id: str) -> str:
+        """
+        Dispara um job imediatamente
+        
+        O job é antecipado para agora e roda no executor de threads; a chamada retorna sem
+        esperar a execução terminar. Jobs pausados não são disparados: antecipá-los os
+        tiraria da pausa de vez, já que depois da execução o trigger reagenda o próximo horário.
+        
+        Returns:
+            'started', 'not_found', 'paused' (job pausado) ou 'not_running' (scheduler parado ou pausado)
+        """
         try:
-            if self.scheduler:
-                job = self.scheduler.get_job(job_id)
-                if job:
-                    job.func(*job.args, **job.kwargs)
-                    logger.info(f"Job '{job_id}' executado manualmente")
-                    return True
-            return False
+            if not self.scheduler:
+                return 'not_running'
+            job = self.scheduler.get_job(job_id)
+            if not job:
+                return 'not_found'
+            if job.next_run_time is None:
+                return 'paused'
+            if self.scheduler.state != STATE_RUNNING:
+                return 'not_running'
+            
+            self.scheduler.modify_job(job_id, next_run_time=datetime.now(self.scheduler.timezone))
+            logger.info(f"Job '{job_id}' disparado manualmente")
+            return 'started'
             
         except Exception as e:
             logger.error(f"Erro ao executar job '{job_id}': {str(e)}")
-            return False
+            raise
     
     def get_scheduler_status(self) -> Dict:
         """Retorna status do scheduler"""
@@ -389,9 +519,11 @@ class SchedulerService:
             
             return {
                 'status': 'running' if self.scheduler.running else 'stopped',
-                'total_jobs': len(self.scheduler.get_jobs()),
+                'total_jobs': len(self._job_ids),
                 'timezone': str(self.scheduler.timezone),
-                'state': self.scheduler.state
+                'state': self.scheduler.state,
+                'last_success_at': self._last_success_at.isoformat() if self._last_success_at else None,
+                'last_error': self._last_error
             }
             
         except Exception as e:
@@ -401,39 +533,109 @@ class SchedulerService:
 
 
 # Funções estáticas para jobs (evitar problemas de serialização)
-def run_daily_scraping_job():
-    """Função estática para scraping diário"""
-    from flask import current_app
+
+# Serviços reaproveitados entre execuções dos jobs estáticos (criados na primeira)
+_SCRAPER = None
+_PDF_SERVICE = None
+
+# Aplicação Flask dos jobs estáticos (definida em SchedulerService.init_app)
+_JOB_APP = None
+
+def _job_app():
+    """Aplicação para o app context dos jobs estáticos"""
+    if _JOB_APP is None:
+        raise RuntimeError('SchedulerService.init_app não foi chamado: jobs sem aplicação Flask')
+    return _JOB_APP
+
+def _get_scraper_service() -> ScraperIntegrationService:
+    global _SCRAPER
+    if _SCRAPER is None:
+        _SCRAPER = ScraperIntegrationService()
+    return _SCRAPER
+
+def _get_pdf_service() -> PDFIntegrationService:
+    global _PDF_SERVICE
+    if _PDF_SERVICE is None:
+        _PDF_SERVICE = PDFIntegrationService()
+    return _PDF_SERVICE
+
+def _scrape_state(state: str, limit: int, app=None) -> Dict:
+    """Scraping de um estado com um serviço (e navegador) próprio da thread"""
+    logger.info(f"Executando scraping para {state}")
+    scraper_service = ScraperIntegrationService()
+    # init_app localiza e instancia o scraper; o app só é usado para gravar, o que aqui não ocorre
+    scraper_service.init_app(app)
+    # Nada é gravado aqui: os editais de todos os estados vão ao banco juntos (save_scraped_states)
+    return scraper_service.run_scraping(estados=[state], limit=limit, defer_commit=True)
+
+def scrape_states(states: Sequence[str], limit: int, app=None) -> Tuple[List[Dict], Dict[str, str]]:
+    """
+    Executa o scraping dos estados em paralelo (até SCRAPING_STATE_WORKERS por vez)
     
-    logger.info("Iniciando scraping diário automático")
+    Os editais de cada estado são acumulados numa única lista à medida que os estados
+    terminam; só os erros ficam guardados por estado.
     
-    try:
-        # Estados principais para scraping diário
-        main_states = ['SP', 'RJ', 'MG', 'RS', 'PR', 'SC', 'BA', 'GO', 'PE', 'CE']
-        
-        scraper_service = ScraperIntegrationService()
-        results = {}
-        
-        for state in main_states:
+    Returns:
+        Tupla (editais extraídos, erro por estado que falhou)
+    """
+    editais_data = []
+    failures = {}
+    if not states:
+        return editais_data, failures
+    
+    workers = max(1, min(SCRAPING_STATE_WORKERS, len(states)))
+    with StateThreadPool(max_workers=workers) as executor:
+        futures = {executor.submit(_scrape_state, state, limit, app): state for state in states}
+        for future in as_completed(futures):
+            state = futures[future]
             try:
-                logger.info(f"Executando scraping para {state}")
-                result = scraper_service.run_scraping(
-                    uf_filter=state,
-                    limit_per_state=10  # Limite para não sobrecarregar
-                )
-                results[state] = result
-                
-                # Aguardar entre estados para não sobrecarregar o servidor
-                import time
-                time.sleep(30)
-                
+                result = future.result()
             except Exception as e:
-                logger.error(f"Erro no scraping de {state}: {str(e)}")
-                results[state] = {'error': str(e)}
+                result = {'success': False, 'error': str(e)}
+            
+            if result.get('success'):
+                editais_data.extend(result.get('editais', []))
+            else:
+                logger.error(f"Erro no scraping de {state}: {result.get('error')}")
+                failures[state] = result.get('error')
+    
+    return editais_data, failures
+
+def save_scraped_states(editais_data: List[Dict]) -> int:
+    """
+    Grava num único commit os editais extraídos por scrape_states (requer app context)
+    
+    Returns:
+        Número de editais salvos
+    """
+    if not editais_data:
+        return 0
+    
+    try:
+        editais_salvos, erros = _get_scraper_service().save_editais(editais_data)
         
-        # Log do resultado
-        total_editais = sum(r.get('editais_salvos', 0) for r in results.values() if 'editais_salvos' in r)
-        logger.info(f"Scraping diário concluído. Total de editais coletados: {total_editais}")
+        if erros:
+            logger.warning(f"{erros} editais não puderam ser salvos")
+        return editais_salvos
+        
+    except Exception as e:
+        logger.error(f"Erro ao salvar editais do scraping: {str(e)}")
+        db.session.rollback()
+        return 0
+
+def run_daily_scraping_job():
+    """Função estática para scraping diário"""
+    logger.info("Iniciando scraping diário automático")
+    
+    try:
+        app = _job_app()
+        with app.app_context():
+            # Limite de 10 por estado para não sobrecarregar
+            editais_data, _ = scrape_states(MAIN_STATES, limit=10, app=app)
+            
+            # Log do resultado
+            total_editais = save_scraped_states(editais_data)
+            logger.info(f"Scraping diário concluído. Total de editais coletados: {total_editais}")
         
         # Executar análise de PDFs dos novos editais
         run_pdf_analysis_job()
@@ -446,8 +648,14 @@ def run_pdf_analysis_job():
     logger.info("Iniciando análise de PDFs pendentes")
     
     try:
-        pdf_service = PDFIntegrationService()
-        result = pdf_service.analyze_all_pending_files()
+        pdf_service = _get_pdf_service()
+        with _job_app().app_context():
+            if not pdf_service.has_pending():
+                logger.info("Nenhum PDF pendente de análise")
+                return
+            
+            with no_expire_on_commit(db.session):
+                result = pdf_service.analyze_all_pending_files()
         
         analyzed = result.get('analyzed', 0)
         errors = result.get('errors', 0)
@@ -457,18 +665,48 @@ def run_pdf_analysis_job():
     except Exception as e:
         logger.error(f"Erro na análise de PDFs: {str(e)}")
 
+def delete_older_than(table: str, column: str, cutoff: datetime, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
+    """
+    Apaga as linhas de table com column < cutoff em lotes de batch_size (um commit por lote)
+    
+    Returns:
+        Total de linhas apagadas
+    """
+    statement = text(
+        f"DELETE FROM {table} WHERE ctid IN "
+        f"(SELECT ctid FROM {table} WHERE {column} < :cutoff LIMIT :batch_size)"
+    )
+    total = 0
+    while True:
+        deleted = db.session.execute(statement, {'cutoff': cutoff, 'batch_size': batch_size}).rowcount
+        db.session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+def cleanup_old_rows() -> int:
+    """Aplica delete_older_than a CLEANUP_TARGETS com um único corte (requer app context)"""
+    if not CLEANUP_TARGETS:
+        logger.info("Limpeza sem tabelas configuradas (CLEANUP_TARGETS vazio): nada a apagar")
+        return 0
+    
+    cutoff = datetime.now(timezone.utc) - timedelta(days=CLEANUP_RETENTION_DAYS)
+    
+    total = 0
+    for table, column in CLEANUP_TARGETS:
+        deleted = delete_older_than(table, column, cutoff)
+        logger.info(f"{deleted} linhas antigas removidas de {table}")
+        total += deleted
+    return total
+
 def run_cleanup_job():
     """Função estática para limpeza de dados"""
     logger.info("Iniciando limpeza de dados antigos")
     
     try:
-        # Limpeza de logs antigos (mais de 30 dias)
-        cutoff_date = datetime.now() - timedelta(days=30)
-        
-        # Aqui você pode implementar limpeza específica
-        # Por exemplo, remover arquivos temporários, logs antigos, etc.
-        
-        logger.info("Limpeza de dados concluída")
+        with _job_app().app_context():
+            deleted = cleanup_old_rows()
+        logger.info(f"Limpeza de dados concluída. Linhas removidas: {deleted}")
         
     except Exception as e:
         logger.error(f"Erro na limpeza: {str(e)}")
@@ -478,29 +716,41 @@ def run_custom_scraping_job(states):
     logger.info(f"Iniciando scraping customizado para estados: {', '.join(states)}")
     
     try:
-        scraper_service = ScraperIntegrationService()
-        results = {}
-        
-        for state in states:
-            try:
-                logger.info(f"Executando scraping customizado para {state}")
-                result = scraper_service.run_scraping(
-                    uf_filter=state,
-                    limit_per_state=20  # Limite maior para scraping customizado
-                )
-                results[state] = result
-                
-                # Aguardar entre estados
-                import time
-                time.sleep(45)
-                
-            except Exception as e:
-                logger.error(f"Erro no scraping customizado de {state}: {str(e)}")
-                results[state] = {'error': str(e)}
-        
-        total_editais = sum(r.get('editais_salvos', 0) for r in results.values() if 'editais_salvos' in r)
+        app = _job_app()
+        with app.app_context():
+            # Limite maior para scraping customizado
+            editais_data, _ = scrape_states(states, limit=20, app=app)
+            
+            total_editais = save_scraped_states(editais_data)
         logger.info(f"Scraping customizado concluído. Total de editais: {total_editais}")
         
     except Exception as e:
         logger.error(f"Erro no scraping customizado: {str(e)}")
 
+
+# Jobs padrão do sistema (usados por _schedule_default_jobs e pelos schedule_*)
+JOB_SPECS = {
+    # Scraping diário às 6h da manhã
+    'daily_scraping': {
+        'func': run_daily_scraping_job,
+        'trigger': CronTrigger(hour=6, minute=0),
+        'name': 'Scraping Diário de Licitações',
+        'misfire_grace_time': 3600,  # 1 hora de tolerância
+        'coalesce': True  # execuções perdidas durante uma parada viram uma só
+    },
+    # Análise de PDFs pendentes a cada 2 horas
+    'pdf_analysis': {
+        'func': run_pdf_analysis_job,
+        'trigger': IntervalTrigger(hours=2),
+        'name': 'Análise de PDFs Pendentes',
+        'misfire_grace_time': 1800,  # 30 minutos de tolerância
+        'coalesce': True
+    },
+    # Limpeza de logs antigos semanalmente (domingo às 2h)
+    'weekly_cleanup': {
+        'func': run_cleanup_job,
+        'trigger': CronTrigger(day_of_week=6, hour=2, minute=0),
+        'name': 'Limpeza Semanal de Dados',
+        'misfire_grace_time': 7200,  # 2 horas de tolerância
+    },
+}
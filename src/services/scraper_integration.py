@@ -1,22 +1,282 @@
 import os
 import sys
 import asyncio
+import atexit
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
 from decimal import Decimal, InvalidOperation
 from typing import Dict, List, Optional
-import json
+import math
+import re
+
+import orjson
+
+try:
+    import ijson  # Opcional: leitura do JSON de importação em fluxo
+except ImportError:
+    ijson = None
 
 # Adicionar o diretório pai ao path para importações
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(os.path.dirname(current_dir))
 sys.path.insert(0, parent_dir)
 
+from sqlalchemy import insert, tuple_
+
 from src.models.edital import Edital, EditalItem, EditalFile
 from src.models.user import db
+from src.json_provider import dumps_bytes
 
 logger = logging.getLogger(__name__)
 
+# Estados com scraping simultâneo em run_scraping_async (um navegador por estado)
+SCRAPER_CONCURRENCY = int(os.getenv('SCRAPER_CONCURRENCY', '4'))
+
+# Editais gravados (e confirmados) por vez em load_json_to_database
+JSON_IMPORT_CHUNK_SIZE = 500
+
+# Editais gravados (e confirmados) por vez em save_editais
+SAVE_CHUNK_SIZE = 1000
+
+# Pares (título, órgão) sabidamente cadastrados, lembrados por processo
+KNOWN_EDITAIS_MAXSIZE = 50000
+KNOWN_EDITAIS_TTL = 3600
+
+# Textos de valor que significam "sem valor"
+_DECIMAL_SENTINELS = frozenset({'sigiloso', 'sigilosa', 'n/a', 'não informado', ''})
+
+# Tudo que não é dígito, vírgula ou ponto
+_NON_NUMERIC_RE = re.compile(r'[^\d,.]')
+
+# Remove os pontos de milhar de "1.234"
+_DROP_DOTS = str.maketrans('', '', '.')
+
+
+@lru_cache(maxsize=4096)
+def _parse_decimal_text(str_value: str) -> Optional[Decimal]:
+    """
+    Decimal de um valor em texto ("R$ 1.234,56", "1234.56", "Sigiloso"), ou None
+
+    Os mesmos textos se repetem muito entre itens (memoizado; Decimal é imutável).
+    """
+    # Verificar se é "Sigiloso" ou similar
+    if str_value.lower() in _DECIMAL_SENTINELS:
+        return None
+
+    try:
+        # Remover caracteres não numéricos exceto vírgula e ponto
+        clean_value = _NON_NUMERIC_RE.sub('', str_value)
+
+        if ',' in clean_value:
+            if '.' not in clean_value:
+                # Substituir vírgula por ponto
+                clean_value = clean_value.replace(',', '.')
+            else:
+                # Formato brasileiro: 1.234,56
+                parts = clean_value.split(',')
+                if len(parts) == 2:
+                    clean_value = f"{parts[0].translate(_DROP_DOTS)}.{parts[1]}"
+
+        if clean_value:
+            return Decimal(clean_value)
+        else:
+            return None
+
+    except (InvalidOperation, ValueError) as e:
+        logger.warning("Erro ao converter valor '%s' para Decimal: %s", str_value, e)
+        return None
+
+
+def _iter_json_editais(json_path: str):
+    """Editais de um arquivo JSON, um por vez com ijson (ou do arquivo inteiro sem ele)"""
+    with open(json_path, 'rb') as f:
+        if ijson is None:
+            yield from orjson.loads(f.read())
+            return
+        # use_float: números como float, como no orjson.loads (e no raw_data gravado)
+        yield from ijson.items(f, 'item', use_float=True)
+
+
+def _chunked(iterable, size: int):
+    """Listas de até `size` elementos"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# (coluna, chave de origem, padrão) dos campos de texto de cada origem de editais
+_SCRAPED_EDITAL_FIELDS = (
+    ('title', 'titulo', ''),
+    ('description', 'descricao', ''),
+    ('object_description', 'objeto', ''),
+    ('organization_name', 'organizacao', ''),
+    ('municipality_name', 'municipio', ''),
+    ('state_code', 'uf', ''),
+    ('modality', 'modalidade', ''),
+    ('status', 'status', 'Ativo'),
+    ('source_url', 'url_pncp', ''),
+)
+_JSON_EDITAL_FIELDS = tuple(
+    (column, column, default) for column, _, default in _SCRAPED_EDITAL_FIELDS
+)
+
+# (coluna, padrão) dos arquivos (mesmas chaves nas duas origens)
+_FILE_FIELDS = (
+    ('filename', ''),
+    ('original_url', ''),
+    ('local_path', ''),
+    ('file_size', None),
+    ('file_type', ''),
+)
+
+
+_known_editais_expiry = OrderedDict()
+_known_editais_lock = threading.Lock()
+
+
+def _known_editais(keys) -> set:
+    """Pares entre `keys` lembrados como cadastrados e ainda dentro do TTL"""
+    now = time.monotonic()
+    with _known_editais_lock:
+        return {key for key in keys if _known_editais_expiry.get(key, 0) > now}
+
+
+def _remember_editais(keys):
+    """Lembra pares cadastrados por KNOWN_EDITAIS_TTL (descarta os mais antigos acima do limite)"""
+    expiry = time.monotonic() + KNOWN_EDITAIS_TTL
+    with _known_editais_lock:
+        for key in keys:
+            _known_editais_expiry[key] = expiry
+            _known_editais_expiry.move_to_end(key)
+        while len(_known_editais_expiry) > KNOWN_EDITAIS_MAXSIZE:
+            _known_editais_expiry.popitem(last=False)
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop compartilhado rodando numa thread daemon (iniciado na primeira chamada)"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='scraper-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+# Chromium iniciado uma vez no loop de fundo e reaproveitado por todos os estados
+_playwright = None
+_browser = None
+_browser_lock = None
+
+# Mesmos argumentos de lançamento do scraper
+BROWSER_ARGS = ['--no-sandbox', '--disable-dev-shm-usage']
+
+
+async def _shared_browser():
+    """Navegador compartilhado (só no loop de fundo), relançado se tiver caído"""
+    global _playwright, _browser, _browser_lock
+    if _browser_lock is None:
+        _browser_lock = asyncio.Lock()
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            from playwright.async_api import async_playwright
+            if _playwright is None:
+                _playwright = await async_playwright().start()
+            logger.info("Iniciando navegador compartilhado do scraper")
+            _browser = await _playwright.chromium.launch(headless=True, args=BROWSER_ARGS)
+    return _browser
+
+
+async def _close_shared_browser():
+    global _playwright, _browser
+    if _browser is not None:
+        await _browser.close()
+        _browser = None
+    if _playwright is not None:
+        await _playwright.stop()
+        _playwright = None
+
+
+@atexit.register
+def _shutdown_shared_browser():
+    """Fecha o navegador compartilhado ao encerrar o processo"""
+    if _loop is None or _playwright is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_close_shared_browser(), _loop).result(timeout=10)
+    except Exception as e:
+        logger.warning("Erro ao fechar navegador compartilhado: %s", e)
+
+
+def _scraper_candidate_paths() -> List[str]:
+    """Locais onde o arquivo do scraper é procurado, em ordem"""
+    return [
+        # Caminho relativo ao diretório src
+        os.path.join(os.path.dirname(current_dir), 'pncp_scraper_items_only.py'),
+        # Caminho relativo ao diretório raiz do projeto
+        os.path.join(parent_dir, 'pncp_scraper_items_only.py'),
+        # Caminho no diretório atual
+        os.path.join(os.getcwd(), 'pncp_scraper_items_only.py'),
+        # Caminho no diretório do backend
+        os.path.join(parent_dir, 'mvp-licitacoes-backend', 'pncp_scraper_items_only.py')
+    ]
+
+
+@lru_cache(maxsize=1)
+def _find_scraper_path() -> Optional[str]:
+    """
+    Caminho do arquivo do scraper (PNCP_SCRAPER_PATH, se definido, ou o primeiro
+    local existente), resolvido uma vez por processo
+    """
+    configured = os.getenv('PNCP_SCRAPER_PATH')
+    if configured and os.path.exists(configured):
+        return configured
+
+    for path in _scraper_candidate_paths():
+        if os.path.exists(path):
+            # Processos filhos (workers do gunicorn) herdam o caminho resolvido
+            os.environ['PNCP_SCRAPER_PATH'] = path
+            return path
+    return None
+
+
+@lru_cache(maxsize=None)
+def _load_scraper_class(scraper_path: str):
+    """
+    Carrega o módulo do scraper e devolve sua classe (ou None)
+
+    O módulo é executado uma vez por processo e registrado em sys.modules; os
+    serviços criados depois (um por estado no scraping agendado) reaproveitam a
+    mesma classe.
+    """
+    import importlib.util
+    scraper_module = sys.modules.get('pncp_scraper')
+    if scraper_module is None:
+        spec = importlib.util.spec_from_file_location("pncp_scraper", scraper_path)
+        scraper_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(scraper_module)
+        sys.modules['pncp_scraper'] = scraper_module
+
+    # Tentar diferentes nomes de classe
+    for class_name in ['PNCPScraperItemsOnly', 'PNCPScraper']:
+        if hasattr(scraper_module, class_name):
+            return getattr(scraper_module, class_name)
+    return None
+
 
 class ScraperIntegrationService:
     """Serviço de integração do scraper com o sistema"""
@@ -29,55 +289,31 @@ class ScraperIntegrationService:
         """Inicializa o serviço com a aplicação Flask"""
         self.app = app
 
-        # Tentar encontrar o scraper em vários locais possíveis
-        possible_paths = [
-            # Caminho relativo ao diretório src
-            os.path.join(os.path.dirname(os.path.dirname(__file__)), 'pncp_scraper_items_only.py'),
-            # Caminho relativo ao diretório raiz do projeto
-            os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'pncp_scraper_items_only.py'),
-            # Caminho no diretório atual
-            os.path.join(os.getcwd(), 'pncp_scraper_items_only.py'),
-            # Caminho no diretório do backend
-            os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'mvp-licitacoes-backend',
-                         'pncp_scraper_items_only.py')
-        ]
-
-        scraper_path = None
-        for path in possible_paths:
-            if os.path.exists(path):
-                scraper_path = path
-                break
+        # Sem log por comando SQL nas gravações em lote (a menos que já configurado)
+        sql_logger = logging.getLogger('sqlalchemy.engine')
+        if sql_logger.level == logging.NOTSET:
+            sql_logger.setLevel(logging.WARNING)
 
+        scraper_path = _find_scraper_path()
         if scraper_path:
             try:
-                # Carregar o módulo do scraper dinamicamente
-                import importlib.util
-                spec = importlib.util.spec_from_file_location("pncp_scraper", scraper_path)
-                scraper_module = importlib.util.module_from_spec(spec)
-                spec.loader.exec_module(scraper_module)
-
-                # Tentar diferentes nomes de classe
-                scraper_class = None
-                for class_name in ['PNCPScraperItemsOnly', 'PNCPScraper']:
-                    if hasattr(scraper_module, class_name):
-                        scraper_class = getattr(scraper_module, class_name)
-                        break
+                scraper_class = _load_scraper_class(scraper_path)
 
                 if scraper_class:
                     self.scraper = scraper_class(headless=True)
-                    logger.info(f"Scraper inicializado com sucesso: {scraper_path}")
+                    logger.info("Scraper inicializado com sucesso: %s", scraper_path)
                 else:
-                    logger.warning(f"Classe do scraper não encontrada em: {scraper_path}")
+                    logger.warning("Classe do scraper não encontrada em: %s", scraper_path)
                     self.scraper = None
 
             except Exception as e:
-                logger.error(f"Erro ao inicializar scraper: {str(e)}")
+                logger.error("Erro ao inicializar scraper: %s", e)
                 self.scraper = None
         else:
             logger.warning("Arquivo do scraper não encontrado em nenhum local")
             logger.info("Locais verificados:")
-            for path in possible_paths:
-                logger.info(f"  - {path}")
+            for path in _scraper_candidate_paths():
+                logger.info("  - %s", path)
             self.scraper = None
 
     def safe_decimal_conversion(self, value):
@@ -89,40 +325,23 @@ class ScraperIntegrationService:
         if isinstance(value, Decimal):
             return value
 
-        # Converter para string primeiro
-        str_value = str(value).strip()
+        # Números vindos do JSON dispensam a limpeza do texto (bool é int, mas não é valor)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return Decimal(value)
+        if isinstance(value, float):
+            return Decimal(repr(value)) if math.isfinite(value) else None
 
-        # Verificar se é "Sigiloso" ou similar
-        if str_value.lower() in ['sigiloso', 'sigilosa', 'n/a', 'não informado', '']:
-            return None
-
-        try:
-            # Remover caracteres não numéricos exceto vírgula e ponto
-            import re
-            clean_value = re.sub(r'[^\d,.]', '', str_value)
-
-            # Substituir vírgula por ponto se necessário
-            if ',' in clean_value and '.' not in clean_value:
-                clean_value = clean_value.replace(',', '.')
-            elif ',' in clean_value and '.' in clean_value:
-                # Formato brasileiro: 1.234,56
-                parts = clean_value.split(',')
-                if len(parts) == 2:
-                    integer_part = parts[0].replace('.', '')
-                    decimal_part = parts[1]
-                    clean_value = f"{integer_part}.{decimal_part}"
-
-            if clean_value:
-                return Decimal(clean_value)
-            else:
-                return None
+        # Converter para string primeiro
+        return _parse_decimal_text(str(value).strip())
 
-        except (InvalidOperation, ValueError) as e:
-            logger.warning(f"Erro ao converter valor '{value}' para Decimal: {str(e)}")
-            return None
+    async def run_scraping_async(self, estados: List[str] = None, limit: int = 5, defer_commit: bool = False):
+        """
+        Executa o scraping de forma assíncrona
 
-    async def run_scraping_async(self, estados: List[str] = None, limit: int = 5):
-        """Executa o scraping de forma assíncrona"""
+        Sem defer_commit, cada estado é gravado assim que termina (fila consumida por
+        uma tarefa de gravação), enquanto os outros estados ainda estão no navegador.
+        Com defer_commit=True nada é gravado: os dados extraídos voltam em 'editais'
+        """
         if not self.scraper:
             return {
                 'success': False,
@@ -134,116 +353,313 @@ class ScraperIntegrationService:
             estados = ['SP']
 
         try:
-            logger.info(f"Iniciando scraping assíncrono - Estados: {estados}, Limite: {limit}")
-
-            # Executar scraping para o primeiro estado
-            uf = estados[0]
-
-            async with self.scraper:
-                # Navegar e filtrar
-                success = await self.scraper.navigate_and_filter(uf)
-                if not success:
-                    return {
-                        'success': False,
-                        'error': f'Falha ao navegar e filtrar por UF: {uf}',
-                        'timestamp': datetime.now().isoformat()
-                    }
-
-                # Extrair editais
-                editais_data = await self.scraper.extract_editais_from_page(limit)
-
-                # Salvar no banco
-                editais_salvos = 0
-                erros = 0
-
-                with self.app.app_context():
-                    for edital_data in editais_data:
-                        try:
-                            # Verificar se edital já existe
-                            existing = Edital.query.filter_by(
-                                title=edital_data.get('titulo', ''),
-                                organization_name=edital_data.get('organizacao', '')
-                            ).first()
-
-                            if not existing:
-                                edital = Edital(
-                                    title=edital_data.get('titulo', ''),
-                                    description=edital_data.get('descricao', ''),
-                                    object_description=edital_data.get('objeto', ''),
-                                    organization_name=edital_data.get('organizacao', ''),
-                                    municipality_name=edital_data.get('municipio', ''),
-                                    state_code=edital_data.get('uf', ''),
-                                    modality=edital_data.get('modalidade', ''),
-                                    status=edital_data.get('status', 'Ativo'),
-                                    estimated_value=self.safe_decimal_conversion(edital_data.get('valor_estimado')),
-                                    source_url=edital_data.get('url_pncp', ''),
-                                    data_source='PNCP',
-                                    has_items_tab=len(edital_data.get('items', [])) > 0,
-                                    has_files_tab=len(edital_data.get('files', [])) > 0
-                                )
-
-                                # Adicionar itens
-                                for item_data in edital_data.get('items', []):
-                                    item = EditalItem(
-                                        numero=item_data.get('numero_item', ''),
-                                        descricao=item_data.get('descricao', ''),
-                                        quantidade=item_data.get('quantidade'),
-                                        valor_unitario=self.safe_decimal_conversion(item_data.get('valor_unitario')),
-                                        valor_total=self.safe_decimal_conversion(item_data.get('valor_total')),
-                                        raw_data=json.dumps(item_data),
-                                        extraction_method='PNCP_SCRAPER'
-                                    )
-                                    edital.items.append(item)
-
-                                # Adicionar arquivos
-                                for file_data in edital_data.get('files', []):
-                                    file_obj = EditalFile(
-                                        filename=file_data.get('filename', ''),
-                                        original_url=file_data.get('original_url', ''),
-                                        local_path=file_data.get('local_path', ''),
-                                        file_size=file_data.get('file_size'),
-                                        file_type=file_data.get('file_type', '')
-                                    )
-                                    edital.files.append(file_obj)
-
-                                db.session.add(edital)
-                                editais_salvos += 1
-
-                        except Exception as e:
-                            logger.error(f"Erro ao salvar edital: {str(e)}")
-                            erros += 1
-
-                    db.session.commit()
-
-                logger.info(f"Scraping concluído - Salvos: {editais_salvos}, Erros: {erros}")
+            logger.info("Iniciando scraping assíncrono - Estados: %s, Limite: %s", estados, limit)
+
+            # Cada estado abre seu próprio navegador; o semáforo limita quantos ao mesmo tempo
+            semaphore = asyncio.Semaphore(max(1, SCRAPER_CONCURRENCY))
+            queue = None if defer_commit else asyncio.Queue()
+            writer = None if defer_commit else asyncio.create_task(self._save_from_queue(queue))
+
+            async def guarded(uf):
+                async with semaphore:
+                    editais_uf = await self._scrape_one_uf(uf, limit)
+                if queue is not None:
+                    await queue.put(editais_uf)
+                return editais_uf
+
+            results = await asyncio.gather(*(guarded(uf) for uf in estados), return_exceptions=True)
+
+            if writer is not None:
+                await queue.put(None)
+                editais_salvos, erros = await writer
+
+            editais_data = []
+            falhas = {}
+            for uf, result in zip(estados, results):
+                if isinstance(result, BaseException):
+                    logger.error("Erro no scraping de %s: %s", uf, result)
+                    falhas[uf] = str(result)
+                else:
+                    editais_data.extend(result)
+
+            # Estados e páginas se sobrepõem: o mesmo edital (título, órgão) fica uma vez só
+            unicos = {}
+            for edital_data in editais_data:
+                unicos.setdefault((edital_data.get('titulo', ''), edital_data.get('organizacao', '')), edital_data)
+            duplicados_removidos = len(editais_data) - len(unicos)
+            if duplicados_removidos:
+                logger.info("Editais repetidos descartados: %s", duplicados_removidos)
+            editais_data = list(unicos.values())
+
+            if len(falhas) == len(estados):
+                return {
+                    'success': False,
+                    'error': '; '.join(f"{uf}: {erro}" for uf, erro in falhas.items()),
+                    'timestamp': datetime.now().isoformat()
+                }
 
+            if defer_commit:
+                # Quem chama grava os editais de vários estados de uma vez (save_editais)
                 return {
                     'success': True,
-                    'editais_salvos': editais_salvos,
-                    'erros': erros,
+                    'editais': editais_data,
+                    'falhas': falhas,
                     'total_processados': len(editais_data),
                     'timestamp': datetime.now().isoformat()
                 }
 
+            logger.info("Scraping concluído - Salvos: %s, Erros: %s", editais_salvos, erros)
+
+            return {
+                'success': True,
+                'editais_salvos': editais_salvos,
+                'erros': erros,
+                'falhas': falhas,
+                'total_processados': len(editais_data),
+                'timestamp': datetime.now().isoformat()
+            }
+
         except Exception as e:
-            logger.error(f"Erro no scraping: {str(e)}")
+            logger.error("Erro no scraping: %s", e)
             return {
                 'success': False,
                 'error': str(e),
                 'timestamp': datetime.now().isoformat()
             }
 
-    def run_scraping(self, estados: List[str] = None, limit: int = 5):
-        """Executa o scraping (wrapper síncrono)"""
+    async def _save_from_queue(self, queue: asyncio.Queue):
+        """
+        Grava os lotes da fila (um por estado) até receber None
+
+        O save_editais roda no executor padrão para não bloquear o loop; os pares
+        gravados por um lote ficam lembrados, então repetidos nos seguintes nem
+        consultam o banco.
+
+        Returns:
+            Tupla (editais_salvos, erros) somada de todos os lotes
+        """
+        loop = asyncio.get_running_loop()
+        editais_salvos = 0
+        erros = 0
+        while True:
+            editais_uf = await queue.get()
+            if editais_uf is None:
+                return editais_salvos, erros
+            if not editais_uf:
+                continue
+            salvos, erros_lote = await loop.run_in_executor(None, self._save_in_app_context, editais_uf)
+            editais_salvos += salvos
+            erros += erros_lote
+
+    def _save_in_app_context(self, editais_data: List[Dict]):
+        with self.app.app_context():
+            return self.save_editais(editais_data)
+
+    async def _scrape_one_uf(self, uf: str, limit: int) -> List[Dict]:
+        """
+        Editais extraídos de um estado, com uma instância própria do scraper
+
+        O scraper guarda a página no objeto, então não pode ser compartilhado entre
+        estados que rodam ao mesmo tempo. No loop de fundo cada estado abre só um
+        contexto no navegador compartilhado; fora dele, o scraper inicia o seu.
+        """
+        scraper = type(self.scraper)(headless=True)
+        if asyncio.get_running_loop() is not _loop or not hasattr(scraper, 'open_page'):
+            async with scraper:
+                return await self._extract_uf(scraper, uf, limit)
+
+        await scraper.open_page(await _shared_browser())
+        try:
+            return await self._extract_uf(scraper, uf, limit)
+        finally:
+            await scraper.close_page()
+
+    @staticmethod
+    async def _extract_uf(scraper, uf: str, limit: int) -> List[Dict]:
+        # Navegar e filtrar
+        success = await scraper.navigate_and_filter(uf)
+        if not success:
+            raise RuntimeError(f'Falha ao navegar e filtrar por UF: {uf}')
+
+        # Extrair editais
+        return await scraper.extract_editais_from_page(limit)
+
+    def save_editais(self, editais_data: List[Dict]):
+        """
+        Grava editais extraídos pelo scraper (com itens e arquivos), SAVE_CHUNK_SIZE por commit
+
+        Editais já cadastrados (mesmo título e órgão) são ignorados. Um bloco que falha
+        é desfeito e contado em erros, sem perder os blocos já gravados. Requer app context.
+
+        Returns:
+            Tupla (editais_salvos, erros)
+        """
+        editais_salvos = 0
+        erros = 0
+        records = []
+
+        existing = self._existing_edital_keys(
+            (e.get('titulo', ''), e.get('organizacao', '')) for e in editais_data
+        )
+
+        for edital_data in editais_data:
+            try:
+                key = (edital_data.get('titulo', ''), edital_data.get('organizacao', ''))
+                if key in existing:
+                    continue
+                # Também descarta repetidos dentro do próprio lote
+                existing.add(key)
+
+                records.append(self._scraped_edital_record(edital_data))
+
+            except Exception as e:
+                logger.error("Erro ao salvar edital: %s", e)
+                erros += 1
+
+        for chunk in _chunked(records, SAVE_CHUNK_SIZE):
+            if self._commit_records(chunk):
+                editais_salvos += len(chunk)
+            else:
+                erros += len(chunk)
+
+        return editais_salvos, erros
+
+    @staticmethod
+    def _commit_records(records: List[tuple]) -> bool:
+        """Insere e confirma um bloco de editais; em caso de erro desfaz só este bloco"""
         try:
-            # Executar de forma assíncrona
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(self.run_scraping_async(estados, limit))
-            loop.close()
-            return result
+            ScraperIntegrationService._bulk_insert_editais(records)
+            db.session.commit()
+            _remember_editais(
+                (edital_row['title'], edital_row['organization_name']) for edital_row, _, _ in records
+            )
+            return True
         except Exception as e:
-            logger.error(f"Erro ao executar scraping: {str(e)}")
+            db.session.rollback()
+            logger.error("Erro ao gravar bloco de %s editais: %s", len(records), e)
+            return False
+
+    @staticmethod
+    def _existing_edital_keys(keys) -> set:
+        """
+        Pares (título, órgão) já cadastrados em editais, numa consulta só
+
+        Pares vistos cadastrados há menos de KNOWN_EDITAIS_TTL segundos (consultados ou
+        inseridos por este processo) nem chegam à consulta.
+
+        Args:
+            keys: Pares (título, órgão) candidatos (repetidos são ignorados)
+        """
+        keys = list(dict.fromkeys(keys))
+        known = _known_editais(keys)
+        # Só os pares que o processo ainda não viu cadastrados vão ao banco
+        keys = [key for key in keys if key not in known]
+        if not keys:
+            return known
+        # Só leitura: não dispara flush de objetos pendentes de quem chamou
+        with db.session.no_autoflush:
+            existing = set(
+                db.session.query(Edital.title, Edital.organization_name)
+                .filter(tuple_(Edital.title, Edital.organization_name).in_(keys))
+                .all()
+            )
+        _remember_editais(existing)
+        return known | existing
+
+    def _scraped_edital_record(self, edital_data: Dict):
+        """Linhas de editais, edital_items e edital_files para um edital extraído pelo scraper"""
+        return self._edital_record(edital_data, _SCRAPED_EDITAL_FIELDS, 'valor_estimado', 'numero_item',
+                                   data_source='PNCP', extraction_method='PNCP_SCRAPER')
+
+    def _json_edital_record(self, edital_data: Dict):
+        """Linhas de editais, edital_items e edital_files para um edital do JSON de importação"""
+        return self._edital_record(edital_data, _JSON_EDITAL_FIELDS, 'estimated_value', 'numero',
+                                   data_source='JSON_IMPORT', extraction_method='JSON_IMPORT')
+
+    def _edital_record(self, edital_data: Dict, fields: tuple, value_key: str, numero_key: str,
+                       data_source: str, extraction_method: str):
+        """
+        Monta as linhas de um edital a partir da tabela de campos da origem
+
+        Args:
+            fields: Tuplas (coluna, chave de origem, padrão) dos campos de texto do edital
+            value_key: Chave do valor estimado na origem
+            numero_key: Chave do número do item na origem
+        """
+        get = edital_data.get
+        to_decimal = self.safe_decimal_conversion
+        items = get('items', [])
+        files = get('files', [])
+
+        edital_row = {column: get(key, default) for column, key, default in fields}
+        edital_row['estimated_value'] = to_decimal(get(value_key))
+        edital_row['data_source'] = data_source
+        edital_row['has_items_tab'] = len(items) > 0
+        edital_row['has_files_tab'] = len(files) > 0
+
+        item_rows = [{
+            'numero': item_data.get(numero_key, ''),
+            'descricao': item_data.get('descricao', ''),
+            'quantidade': item_data.get('quantidade'),
+            'valor_unitario': to_decimal(item_data.get('valor_unitario')),
+            'valor_total': to_decimal(item_data.get('valor_total')),
+            'raw_data': dumps_bytes(item_data).decode('utf-8'),
+            'extraction_method': extraction_method
+        } for item_data in items]
+
+        file_rows = [
+            {column: file_data.get(column, default) for column, default in _FILE_FIELDS}
+            for file_data in files
+        ]
+
+        return edital_row, item_rows, file_rows
+
+    @staticmethod
+    def _bulk_insert_editais(records: List[tuple]):
+        """
+        Insere editais com seus itens e arquivos sem passar pelo unit of work do ORM
+
+        Um INSERT em lote por tabela: os editais primeiro (RETURNING id preenche cada
+        linha), depois itens e arquivos (insert do Core) com o edital_id correspondente.
+        Não faz commit.
+
+        Args:
+            records: Tuplas (linha do edital, linhas de itens, linhas de arquivos)
+        """
+        if not records:
+            return
+
+        edital_rows = [edital_row for edital_row, _, _ in records]
+        db.session.bulk_insert_mappings(Edital, edital_rows, return_defaults=True)
+
+        item_rows = []
+        file_rows = []
+        for edital_row, items, files in records:
+            for row in items:
+                row['edital_id'] = edital_row['id']
+            for row in files:
+                row['edital_id'] = edital_row['id']
+            item_rows.extend(items)
+            file_rows.extend(files)
+
+        # Filhos direto pelo Core: executemany vira INSERT ... VALUES de várias linhas
+        if item_rows:
+            db.session.execute(insert(EditalItem.__table__), item_rows)
+        if file_rows:
+            db.session.execute(insert(EditalFile.__table__), file_rows)
+
+    def run_scraping(self, estados: List[str] = None, limit: int = 5, defer_commit: bool = False):
+        """
+        Executa o scraping (wrapper síncrono)
+
+        A coroutine roda no loop de fundo do módulo (esta thread só espera), onde o
+        navegador compartilhado continua aberto entre chamadas.
+        """
+        try:
+            coro = self.run_scraping_async(estados, limit, defer_commit)
+            return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
+        except Exception as e:
+            logger.error("Erro ao executar scraping: %s", e)
             return {
                 'success': False,
                 'error': str(e),
@@ -251,75 +667,48 @@ class ScraperIntegrationService:
             }
 
     def load_json_to_database(self, json_path: str):
-        """Carrega dados de um arquivo JSON para o banco"""
-        try:
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+        """
+        Carrega dados de um arquivo JSON (lista de editais) para o banco
 
+        Com ijson instalado o arquivo é lido em fluxo, JSON_IMPORT_CHUNK_SIZE editais
+        por vez (memória constante mesmo para dumps grandes); cada bloco é gravado e
+        confirmado antes de ler o próximo (um bloco que falha é desfeito e contado em erros).
+        """
+        try:
             with self.app.app_context():
                 editais_salvos = 0
+                erros = 0
+                # Pares já vistos, para descartar repetidos dentro do próprio arquivo
+                seen = set()
 
-                for edital_data in data:
-                    # Verificar se edital já existe
-                    existing = Edital.query.filter_by(
-                        title=edital_data.get('title', ''),
-                        organization_name=edital_data.get('organization_name', '')
-                    ).first()
-
-                    if not existing:
-                        edital = Edital(
-                            title=edital_data.get('title', ''),
-                            description=edital_data.get('description', ''),
-                            object_description=edital_data.get('object_description', ''),
-                            organization_name=edital_data.get('organization_name', ''),
-                            municipality_name=edital_data.get('municipality_name', ''),
-                            state_code=edital_data.get('state_code', ''),
-                            modality=edital_data.get('modality', ''),
-                            status=edital_data.get('status', 'Ativo'),
-                            estimated_value=self.safe_decimal_conversion(edital_data.get('estimated_value')),
-                            source_url=edital_data.get('source_url', ''),
-                            data_source='JSON_IMPORT',
-                            has_items_tab=len(edital_data.get('items', [])) > 0,
-                            has_files_tab=len(edital_data.get('files', [])) > 0
-                        )
-
-                        # Adicionar itens
-                        for item_data in edital_data.get('items', []):
-                            item = EditalItem(
-                                numero=item_data.get('numero', ''),
-                                descricao=item_data.get('descricao', ''),
-                                quantidade=item_data.get('quantidade'),
-                                valor_unitario=self.safe_decimal_conversion(item_data.get('valor_unitario')),
-                                valor_total=self.safe_decimal_conversion(item_data.get('valor_total')),
-                                raw_data=json.dumps(item_data),
-                                extraction_method='JSON_IMPORT'
-                            )
-                            edital.items.append(item)
-
-                        # Adicionar arquivos
-                        for file_data in edital_data.get('files', []):
-                            file_obj = EditalFile(
-                                filename=file_data.get('filename', ''),
-                                original_url=file_data.get('original_url', ''),
-                                local_path=file_data.get('local_path', ''),
-                                file_size=file_data.get('file_size'),
-                                file_type=file_data.get('file_type', '')
-                            )
-                            edital.files.append(file_obj)
-
-                        db.session.add(edital)
-                        editais_salvos += 1
-
-                db.session.commit()
+                for chunk in _chunked(_iter_json_editais(json_path), JSON_IMPORT_CHUNK_SIZE):
+                    records = []
+                    existing = self._existing_edital_keys(
+                        (e.get('title', ''), e.get('organization_name', '')) for e in chunk
+                    )
+
+                    for edital_data in chunk:
+                        key = (edital_data.get('title', ''), edital_data.get('organization_name', ''))
+                        if key in existing or key in seen:
+                            continue
+                        seen.add(key)
+
+                        records.append(self._json_edital_record(edital_data))
+
+                    if self._commit_records(records):
+                        editais_salvos += len(records)
+                    else:
+                        erros += len(records)
 
                 return {
                     'success': True,
                     'editais_salvos': editais_salvos,
+                    'erros': erros,
                     'timestamp': datetime.now().isoformat()
                 }
 
         except Exception as e:
-            logger.error(f"Erro ao carregar JSON: {str(e)}")
+            logger.error("Erro ao carregar JSON: %s", e)
             return {
                 'success': False,
                 'error': str(e),